@@ -0,0 +1,59 @@
+## on disk cache of parsed programs
+import gc
+import pickle
+
+from disk_cache import DiskCache, modules_version
+
+#===================================================================================
+# stores the Program tree of a source file, keyed by a hash of the source text
+# and the compiler version, so unchanged files skip the scanner and parser
+
+# modules whose code decides the tree a source parses to
+TREE_MODULES = ("tokens.py", "scanner.py", "parser.py", "parse_tree.py")
+
+def compiler_version():
+    """ hash of the scanner, parser and tree node code, any change to them invalidates the cache """
+    return modules_version(TREE_MODULES)
+
+
+class ASTCache(DiskCache):
+    """ a DiskCache of pickled Program trees """
+    suffix = ".ast"
+
+    def key(self, source):
+        """ cache key of the source text (bytes) """
+        return self.make_key(compiler_version(), str(pickle.HIGHEST_PROTOCOL), source)
+
+    def load(self, key):
+        """ returns the cached Program for key, or None on a miss """
+        data = self.read(key)
+        if data is None:
+            return None
+        # loading allocates a node per tree node, which would trigger the
+        # cyclic garbage collector over and over, for no garbage
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.loads(data)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError, ValueError):
+            # a damaged entry is a miss
+            self.discard(key)
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def store(self, key, program):
+        """ cache a Program under key. returns False if it couldn't be cached """
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            data = pickle.dumps(program, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # pickle recurses through the tree, too deeply nested programs aren't cached
+            return False
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.write(key, data)
+        return True
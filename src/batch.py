@@ -0,0 +1,119 @@
+""" batch compiler: compiles many source files across a pool of worker processes
+
+run from the src folder:  python3 batch.py [-j N] [-o DIR] <file or directory> ...
+"""
+import os
+import sys
+from argparse import ArgumentParser
+from collections import Counter, namedtuple
+from concurrent import futures
+from time import perf_counter
+
+from main import add_compiler_arguments, compile_captured, make_caches, EMIT_SUFFIXES
+
+#===================================================================================
+
+# ok is False when the compiler reported errors or failed, diagnostics is
+# everything the compiler printed for the file. cache_stats is the stats
+# dict of the file's AST and IR caches, None for a cache that wasn't used
+CompileResult = namedtuple("CompileResult", "input output ok diagnostics seconds cache_stats")
+
+def source_files(inputs):
+    """ the .src files given as files or directories """
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in sorted(os.listdir(path))
+                      if name.endswith(".src")]
+        else:
+            files.append(path)
+    return files
+
+def output_names(files, out_dir, suffix=".ll"):
+    """
+    <name><suffix> in out_dir for each file. files that share a name are told
+    apart by their directory, as <directory>_<name><suffix>
+    """
+    names = [os.path.splitext(os.path.basename(f))[0] for f in files]
+    counts = Counter(names)
+    outputs = []
+    for f, name in zip(files, names):
+        if counts[name] > 1:
+            name = "{}_{}".format(os.path.basename(os.path.dirname(os.path.abspath(f))), name)
+        outputs.append(os.path.join(out_dir, name + suffix))
+    return outputs
+
+def compile_task(input_fName, output_fName, args):
+    """ compile one file with its own ProgramBuilder, collecting what it prints """
+    start = perf_counter()
+    builder, ok, diagnostics = compile_captured(input_fName, output_fName, args)
+    seconds = perf_counter() - start
+    caches = (None, None) if builder is None else (builder.ast_cache, builder.ir_cache)
+    cache_stats = tuple(None if cache is None else cache.stats for cache in caches)
+    return CompileResult(input_fName, output_fName, ok, diagnostics, seconds, cache_stats)
+
+def cache_summaries(results, args):
+    """ the summary line of each cache, with the stats of every file's compile added up """
+    lines = []
+    for i, cache in enumerate(make_caches(args)):
+        if cache is None:
+            continue
+        for result in results:
+            for name, count in (result.cache_stats[i] or {}).items():
+                cache.stats[name] += count
+        lines.append(cache.summary())
+    return lines
+
+def compile_batch(files, out_dir, args, jobs=None):
+    """
+    compile files into out_dir (see output_names), across jobs worker processes
+    (os.cpu_count() when None), or in this process when jobs is 0. each
+    worker initializes LLVM once, unless the files are only checked.
+    returns a CompileResult per file, in order
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    outputs = output_names(files, out_dir, EMIT_SUFFIXES[args.emit])
+    initialize_llvm = None
+    if not args.check:
+        from codegen import initialize_llvm
+    if jobs == 0:
+        if initialize_llvm is not None:
+            initialize_llvm()
+        return [compile_task(f, o, args) for f, o in zip(files, outputs)]
+
+    jobs = jobs or os.cpu_count()
+    # hand out files in chunks, a few per worker, to save round trips on small files
+    chunksize = max(1, len(files) // (jobs * 4))
+    with futures.ProcessPoolExecutor(max_workers=jobs, initializer=initialize_llvm) as pool:
+        return list(pool.map(compile_task, files, outputs, [args] * len(files), chunksize=chunksize))
+
+def main():
+    ap = ArgumentParser()
+    ap.add_argument("inputs", nargs="+", help="source files, or directories of .src files")
+    ap.add_argument("-o", "--out-dir", default=".", help="directory for the output files")
+    ap.add_argument("-j", "--jobs", type=int, default=None,
+                    help="worker processes, defaults to the cpu count. 0 compiles in this process")
+    add_compiler_arguments(ap)
+    args = ap.parse_args()
+
+    files = source_files(args.inputs)
+    start = perf_counter()
+    results = compile_batch(files, args.out_dir, args, jobs=args.jobs)
+    elapsed = perf_counter() - start
+
+    failed = 0
+    for result in results:
+        status = "ok" if result.ok else "FAILED"
+        print("{}: {} ({:.3f}s)".format(result.input, status, result.seconds))
+        if not result.ok:
+            failed += 1
+            print("    " + result.diagnostics.strip().replace("\n", "\n    "))
+    print("{} {} files in {:.3f}s, {} failed".format("checked" if args.check else "compiled",
+                                                     len(results), elapsed, failed))
+    if args.cache_stats:
+        for line in cache_summaries(results, args):
+            print(line)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1052 @@
+""" benchmarks for the compiler pipeline
+
+run from the src folder:  python3 bench.py <benchmark> [options]
+"""
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import io
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import contextmanager, redirect_stdout
+from time import perf_counter, sleep
+
+from tokens import tkn_type as tkn
+from tokens import Token
+from scanner import Scanner, ENGINES, tokenize
+from incremental import IncrementalLexer
+from ast_cache import ASTCache
+from ir_cache import IRCache
+from parser import Parser, EXPR_ENGINES, STMT_ENGINES
+
+# ================================================================================
+#  synthetic inputs
+# ================================================================================
+
+def synthesize_program(n_procs, name="bench"):
+    """ build the source text of a valid program with n_procs procedures """
+    lines = [
+        "program {} is".format(name),
+        "",
+        "global variable total : integer;",
+        "variable out : bool;",
+        "",
+    ]
+    for i in range(n_procs):
+        lines += [
+            "/* procedure {} /* nested */ */".format(i),
+            "procedure proc{} : integer(variable n : integer)".format(i),
+            "\tvariable acc : integer;",
+            "\tvariable msg : string;",
+            "\tvariable tmp : integer[4];",
+            "begin",
+            "\tacc := 0; // running sum",
+            "\tmsg := \"proc {}\";".format(i),
+            "\tfor(acc := n; acc < {} * 10)".format(i),
+            "\t\ttmp[1] := acc * 2 + n - 1;",
+            "\t\tif(tmp[1] >= 100) then",
+            "\t\t\tacc := acc + 1;",
+            "\t\telse",
+            "\t\t\tacc := acc + 2;",
+            "\t\tend if;",
+            "\tend for;",
+            "\treturn acc;",
+            "end procedure;",
+            "",
+        ]
+    lines.append("begin")
+    lines += ["total := proc{}(total);".format(i) for i in range(n_procs)]
+    lines += ["out := putInteger(total);", "end program.", ""]
+    return "\n".join(lines)
+
+@contextmanager
+def temp_program(text, name="bench.src"):
+    """ write source text to a temp file, yield its path and clean up after """
+    tmp_dir = tempfile.mkdtemp(prefix="compiler_bench_")
+    try:
+        fName = os.path.join(tmp_dir, name)
+        with open(fName, "w") as fd:
+            fd.write(text)
+        yield fName
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def program_of_size(size_mb):
+    """ synthesize a program of roughly size_mb megabytes """
+    per_proc = len(synthesize_program(1)) - len(synthesize_program(0))
+    return synthesize_program(max(1, int(size_mb * 1e6 / per_proc)))
+
+def timed(func, repeat=3):
+    """ call func repeat times, returns (result, best time in seconds) """
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def report(label, count, unit, seconds):
+    print("{:<28} {:>10} {}  {:8.3f}s  {:12.0f} {}/sec".format(
+        label, count, unit, seconds, count / seconds, unit))
+
+# ================================================================================
+#  scanner
+# ================================================================================
+
+class _ReadPerCharScanner(Scanner):
+    """ the original character stream, one fd.read(1) call per source char """
+    def __init__(self, fName, tabsize=4):
+        Scanner.__init__(self, fName, tabsize)
+        self.fd = open(fName, "r")
+        self._next_char = self.fd.read(1)
+
+    def getNextChar(self):
+        this_char = self._next_char
+        if this_char == '\n':
+            self.line += 1
+            self.col = 0
+        elif this_char == '\t':
+            self.col += self.tabsize
+        else:
+            self.col += 1
+        self._next_char = self.fd.read(1)
+        return this_char
+
+def count_tokens(scanner):
+    count = 1
+    while scanner.getToken().type != tkn.EOF:
+        count += 1
+    return count
+
+def bench_scanner(args):
+    """ tokens/sec of the buffered character stream vs per char reads """
+    with temp_program(program_of_size(args.size_mb)) as fName:
+        print("scanning {:.1f} MB".format(os.path.getsize(fName) / 1e6))
+        for label, scanner_cls in [("read(1) per char", _ReadPerCharScanner),
+                                   ("buffered", Scanner)]:
+            count, seconds = timed(lambda: count_tokens(scanner_cls(fName)), args.repeat)
+            report(label, count, "tokens", seconds)
+
+def bench_engines(args):
+    """ tokens/sec of each scanner tokenizer engine """
+    with temp_program(program_of_size(args.size_mb)) as fName:
+        print("scanning {:.1f} MB".format(os.path.getsize(fName) / 1e6))
+        for engine in ENGINES:
+            count, seconds = timed(lambda: count_tokens(Scanner(fName, engine=engine)), args.repeat)
+            report("{} engine".format(engine), count, "tokens", seconds)
+
+class _DictToken():
+    """ the original token layout, with a per instance __dict__ """
+    def __init__(self, t_type, location, val=None):
+        self.type = t_type
+        self.value = val
+        self.line = location[0]
+        self.col = location[1]
+
+def token_list(scanner, token_cls):
+    tokens = []
+    token = scanner.getToken()
+    while token.type != tkn.EOF:
+        tokens.append(token_cls(token.type, (token.line, token.col), token.value))
+        token = scanner.getToken()
+    return tokens
+
+def traced_size(build):
+    """ bytes still allocated by build() while its result is alive """
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def bench_token_memory(args):
+    """ memory of a scanned token stream per token representation """
+    with temp_program(program_of_size(args.size_mb)) as fName:
+        source_size = os.path.getsize(fName)
+        print("source: {:.1f} MB".format(source_size / 1e6))
+        representations = [
+            ("list of dict Tokens", lambda: token_list(Scanner(fName, engine="regex"), _DictToken)),
+            ("list of slot Tokens", lambda: token_list(Scanner(fName, engine="regex"), Token)),
+            ("TokenBuffer", lambda: tokenize(fName, engine="regex")),
+        ]
+        for label, build in representations:
+            tokens, size = traced_size(build)
+            print("{:<28} {:>10} tokens  {:8.1f} MB  {:6.1f} bytes/token  {:5.2f}x source".format(
+                label, len(tokens), size / 1e6, size / len(tokens), size / source_size))
+            del tokens
+
+def program_of_lines(n_lines):
+    """ synthesize a program of roughly n_lines lines """
+    per_proc = synthesize_program(1).count("\n") - synthesize_program(0).count("\n")
+    return synthesize_program(max(1, n_lines // per_proc))
+
+def bench_incremental(args):
+    """ single char edits: incremental re-lexing vs a full rescan """
+    text = program_of_lines(args.lines)
+    print("source: {} lines, {:.1f} MB".format(text.count("\n"), len(text) / 1e6))
+    rng = random.Random(0)
+    lexer = IncrementalLexer(text, engine=args.engine)
+
+    # alternate inserting and deleting a char at random offsets, the edits
+    # include chars that open strings and comments
+    start = perf_counter()
+    for i in range(args.edits):
+        if i % 2 == 0:
+            offset = rng.randrange(len(lexer.text))
+            lexer.edit(offset, 0, rng.choice('x 1"/*\n'))
+        else:
+            lexer.edit(offset, 1, "")
+    incremental = (perf_counter() - start) / args.edits
+
+    _, full = timed(lambda: tokenize(text=lexer.text, engine=args.engine), args.repeat)
+    print("{:<28} {:10.3f} ms/edit".format("incremental", incremental * 1e3))
+    print("{:<28} {:10.3f} ms/edit".format("full rescan", full * 1e3))
+    print("speedup: {:.0f}x".format(full / incremental))
+
+# ================================================================================
+#  parser
+# ================================================================================
+
+def expression_of_terms(n_terms):
+    """ an expression of n_terms operands, using operators of every precedence """
+    operators = ["+", "*", "-", "<", "/", "&", "+", "==", "|"]
+    parts = ["x0"]
+    for i in range(1, n_terms):
+        parts.append(operators[i % len(operators)])
+        parts.append("-{}".format(i) if i % 7 == 0 else "x{}".format(i % 10))
+    return " ".join(parts)
+
+def parse_statements(tokens, engine):
+    """ parse the statements of a program, returns how many were parsed """
+    parser = Parser(tokens=tokens, expr_engine=engine)
+    parser.parse_program_header()
+    parser.parse_top_level_declaration()
+    count = 0
+    while parser.parse_top_level_statement() != tkn.EOF:
+        count += 1
+    return count
+
+def bench_expressions(args):
+    """ expression parsing: operator precedence parser vs the recursive rules """
+    cases = [
+        ("{} short expressions".format(args.statements), args.statements, args.short_terms),
+        ("one {}-term expression".format(args.terms), 1, args.terms),
+    ]
+    for label, n_statements, n_terms in cases:
+        statement = "y := {};\n".format(expression_of_terms(n_terms))
+        text = "program bench is\nbegin\n{}end program.\n".format(statement * n_statements)
+        tokens = tokenize(text=text, engine="regex")
+        print(label)
+        for engine in EXPR_ENGINES:
+            try:
+                _, seconds = timed(lambda: parse_statements(tokens, engine), args.repeat)
+            except RecursionError:
+                print("  {:<26} RecursionError".format(engine))
+                continue
+            report("  " + engine, n_statements * n_terms, "terms", seconds)
+
+def nested_blocks(kind, depth, copies=1):
+    """ a program with copies of if, for or procedure blocks nested depth levels deep """
+    if kind == "procedure":
+        header = "procedure p : integer(variable a : integer)\n"
+        footer = "begin\nreturn a;\nend procedure;\n"
+        declarations = (header * depth + footer * depth) * copies
+        return "program bench is\n{}begin\nend program.\n".format(declarations)
+    header, footer = {
+        "if": ("if (x < 1) then\n", "end if;\n"),
+        "for": ("for (i := 0; i < 3)\n", "end for;\n"),
+    }[kind]
+    statements = (header * depth + "x := 1;\n" + footer * depth) * copies
+    return "program bench is\nbegin\n{}end program.\n".format(statements)
+
+def bench_nesting(args):
+    """ deeply nested blocks: explicit stack parser vs the recursive rules """
+    for kind in ("if", "for", "procedure"):
+        # the shallow case repeats its blocks to parse as many levels
+        for depth, copies in [(args.shallow_depth, max(1, args.depth // args.shallow_depth)),
+                              (args.depth, 1)]:
+            tokens = tokenize(text=nested_blocks(kind, depth, copies), engine="regex")
+            print("{} blocks {} levels deep x {}".format(kind, depth, copies))
+            for engine in STMT_ENGINES:
+                parse = lambda: Parser(tokens=tokens, stmt_engine=engine).parse_program()
+                try:
+                    _, seconds = timed(parse, args.repeat)
+                except RecursionError:
+                    print("  {:<26} RecursionError".format(engine))
+                    continue
+                report("  " + engine, depth * copies, "levels", seconds)
+
+def nested_lookup_program(depth, n_globals, n_statements):
+    """ procedures nested depth levels deep, each assigning expressions of its own locals and globals """
+    lines = ["program lookups is"]
+    lines += ["global variable g{} : integer;".format(i) for i in range(n_globals)]
+    for level in range(depth):
+        lines += ["procedure p{0} : integer(variable n{0} : integer)".format(level),
+                  "variable v{} : integer;".format(level)]
+    for level in reversed(range(depth)):
+        lines.append("begin")
+        lines += ["v{0} := v{0} + n{0} * g{1} - g{2};".format(level, (level + k) % n_globals, k % n_globals)
+                  for k in range(n_statements)]
+        lines += ["return v{};".format(level), "end procedure;"]
+    lines += ["begin", "g0 := p0(1);", "end program.", ""]
+    return "\n".join(lines)
+
+def bench_symbols(args):
+    """ symbol table lookups under deeply nested scopes, and compiling nested procedures """
+    from symbol_table import SymbolTable, Symbol
+    from codegen import ProgramBuilder
+
+    table = SymbolTable()
+    table.add(Symbol("global", None, tkn.INT_TYPE), is_global=True)
+    for level in range(args.depth):
+        table.pushLocal("p{}".format(level))
+        for i in range(args.names):
+            table.add(Symbol("v{}_{}".format(level, i), None, tkn.INT_TYPE))
+    print("{} scopes of {} names".format(args.depth, args.names))
+    for label, name in [("innermost local", "v{}_0".format(args.depth - 1)), ("outermost local", "v0_0"),
+                        ("global", "global"), ("undefined", "missing")]:
+        def lookups():
+            get = table.get
+            for _ in range(args.lookups):
+                get(name)
+        _, seconds = timed(lookups, args.repeat)
+        report("  get " + label, args.lookups, "lookups", seconds)
+
+    text = nested_lookup_program(args.depth, args.globals, args.statements)
+    with temp_program(text) as path:
+        def compile_program():
+            builder = ProgramBuilder(path, None, stmt_engine="iterative")
+            with redirect_stdout(io.StringIO()):
+                builder.compile()
+            return builder
+        builder, seconds = timed(compile_program, args.repeat)
+        if builder.ir_text is None:
+            print("nested program failed to compile")
+            return
+        references = args.depth * args.statements * 5
+        print("procedures nested {} deep, {} statements each".format(args.depth, args.statements))
+        report("  compile", references, "references", seconds)
+
+def bench_analyze(args):
+    """ compile time with and without the semantic pass annotating the tree for codegen """
+    from codegen import ProgramBuilder
+    from semantic import Checker
+
+    def compile_program(path, analyze):
+        builder = ProgramBuilder(path, None, stmt_engine="iterative", analyze=analyze)
+        with redirect_stdout(io.StringIO()):
+            builder.compile()
+        return builder
+
+    def check_program(program):
+        checker = Checker()
+        for node in program.declarations + program.statements:
+            checker.check_node(node)
+
+    print("{:<28} {:>11} {:>11} {:>8} {:>11}".format("program", "compile", "analyzed", "", "check only"))
+    def measure(name, path):
+        builder, plain = timed(lambda: compile_program(path, False), args.repeat)
+        analyzed_builder, analyzed = timed(lambda: compile_program(path, True), args.repeat)
+        if builder.ir_text != analyzed_builder.ir_text:
+            print("{:<28} IR differs with the semantic pass".format(name))
+            return
+        with redirect_stdout(io.StringIO()):
+            program = Parser(path, stmt_engine="iterative").parse_program()
+        _, check = timed(lambda: check_program(program), args.repeat)
+        print("{:<28} {:>9.1f}ms {:>9.1f}ms {:>7.2f}x {:>9.1f}ms".format(
+            name, plain * 1000, analyzed * 1000, plain / analyzed, check * 1000))
+
+    for path in sorted(p for p in os.listdir(CORPUS_DIR) if p.endswith(".src")):
+        measure(os.path.splitext(path)[0], os.path.join(CORPUS_DIR, path))
+    for n in args.procs:
+        with temp_program(synthesize_program(n)) as path:
+            measure("synthetic x{}".format(n), path)
+    with temp_program(nested_lookup_program(args.depth, 50, args.statements)) as path:
+        measure("nested {} deep".format(args.depth), path)
+
+def bench_ast_memory(args):
+    """ memory of the parsed program tree per source line """
+    text = program_of_lines(args.lines)
+    n_lines = text.count("\n")
+    tokens = tokenize(text=text, engine="regex")
+    program, size = traced_size(lambda: Parser(tokens=tokens).parse_program())
+    print("source: {} lines, {:.1f} MB".format(n_lines, len(text) / 1e6))
+    print("{:<28} {:8.1f} MB  {:6.1f} bytes/line".format("Program tree", size / 1e6, size / n_lines))
+
+# ================================================================================
+#  compile caches
+# ================================================================================
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test", "correct")
+
+@contextmanager
+def scaled_corpus(copies, synthetic_procs):
+    """
+    write copies of the test/correct programs, each a distinct source, plus
+    one synthesized program. yields the list of paths
+    """
+    sources = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if name.endswith(".src"):
+            with open(os.path.join(CORPUS_DIR, name)) as fd:
+                sources.append((name[:-4], fd.read()))
+    sources.append(("synthetic", synthesize_program(synthetic_procs)))
+    tmp_dir = tempfile.mkdtemp(prefix="compiler_bench_")
+    try:
+        paths = []
+        for i in range(copies):
+            for name, text in sources:
+                path = os.path.join(tmp_dir, "{}_{}.src".format(name, i))
+                with open(path, "w") as fd:
+                    fd.write("// copy {}\n{}".format(i, text))
+                paths.append(path)
+        yield tmp_dir, paths
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def compile_files(paths, out_dir, **options):
+    """ compile each file with ProgramBuilder, compiler output is discarded """
+    from codegen import ProgramBuilder # llvmlite is only needed by the compile benchmarks
+    with redirect_stdout(io.StringIO()):
+        for path in paths:
+            out_fName = os.path.join(out_dir, os.path.basename(path) + ".ll")
+            builder = ProgramBuilder(path, out_fName, **options)
+            if not builder.load_cached_ir():
+                builder.generate_program_code(builder.load_program())
+
+def bench_ast_cache(args):
+    """ compile time of a scaled test/correct corpus with a cold and a warm AST cache """
+    with scaled_corpus(args.copies, args.synthetic_procs) as (tmp_dir, paths):
+        size = sum(os.path.getsize(path) for path in paths)
+        print("corpus: {} files, {:.1f} MB".format(len(paths), size / 1e6))
+        cache_dir = os.path.join(tmp_dir, "ast_cache")
+
+        def parse_all(cache):
+            from codegen import ProgramBuilder
+            with redirect_stdout(io.StringIO()):
+                for path in paths:
+                    ProgramBuilder(path, None, ast_cache=cache).load_program()
+
+        def cold(func):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            return func(ASTCache(cache_dir))
+
+        for label, func in [("parse", parse_all),
+                            ("full compile", lambda cache: compile_files(paths, tmp_dir, ast_cache=cache))]:
+            _, no_cache = timed(lambda: func(None), args.repeat)
+            _, cold_time = timed(lambda: cold(func), args.repeat)
+            _, warm_time = timed(lambda: func(ASTCache(cache_dir)), args.repeat)
+            print("{}".format(label))
+            print("  {:<26} {:8.3f}s".format("no cache", no_cache))
+            print("  {:<26} {:8.3f}s".format("cold cache", cold_time))
+            print("  {:<26} {:8.3f}s  {:5.1f}x".format("warm cache", warm_time, no_cache / warm_time))
+
+def bench_ir_cache(args):
+    """ compile time of a scaled test/correct corpus with a cold and a warm IR cache """
+    with scaled_corpus(args.copies, args.synthetic_procs) as (tmp_dir, paths):
+        size = sum(os.path.getsize(path) for path in paths)
+        print("corpus: {} files, {:.1f} MB".format(len(paths), size / 1e6))
+        cache_dir = os.path.join(tmp_dir, "ir_cache")
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+        _, no_cache = timed(lambda: compile_files(paths, tmp_dir), args.repeat)
+        cache = IRCache(cache_dir)
+        start = perf_counter()
+        compile_files(paths, tmp_dir, ir_cache=cache)
+        cold_time = perf_counter() - start
+        _, warm_time = timed(lambda: compile_files(paths, tmp_dir, ir_cache=cache), args.repeat)
+        print("  {:<26} {:8.3f}s".format("no cache", no_cache))
+        print("  {:<26} {:8.3f}s".format("cold cache", cold_time))
+        print("  {:<26} {:8.3f}s  {:5.1f}x".format("warm cache", warm_time, no_cache / warm_time))
+        print(cache.summary())
+
+# ================================================================================
+#  batch compiler
+# ================================================================================
+
+def instruction_count(llvm_module):
+    """ number of instructions in the functions defined by a parsed module """
+    return sum(1 for function in llvm_module.functions
+                 for block in function.blocks
+                 for _ in block.instructions)
+
+def bench_opt(args):
+    """ instruction counts and optimization time per test program at -O0 to -O3 """
+    from llvmlite import binding
+    from codegen import ProgramBuilder, optimize, target_machine
+    from main import OPT_LEVELS
+
+    print("{:<28} {}".format("program", "".join("{:>16}".format("-O{}".format(level)) for level in OPT_LEVELS)))
+    for path in sorted(p for p in os.listdir(CORPUS_DIR) if p.endswith(".src")):
+        builder = ProgramBuilder(os.path.join(CORPUS_DIR, path), None)
+        with redirect_stdout(io.StringIO()):
+            builder.compile()
+        name = os.path.splitext(path)[0]
+        try:
+            binding.parse_assembly(builder.ir_text or "").verify()
+        except RuntimeError:
+            print("{:<28} {:>16}".format(name, "invalid IR"))
+            continue
+
+        cells = []
+        for level in OPT_LEVELS:
+            def run():
+                llvm_module = binding.parse_assembly(builder.ir_text)
+                llvm_module.data_layout = str(target_machine(level).target_data)
+                if level > 0:
+                    optimize(llvm_module, level)
+                return llvm_module
+            llvm_module, seconds = timed(run, args.repeat)
+            cells.append("{:>6} {:>7.1f}ms".format(instruction_count(llvm_module), seconds * 1000))
+        print("{:<28} {}".format(name, "".join("{:>16}".format(cell) for cell in cells)))
+
+def arithmetic_program(n_statements, seed=1):
+    """ a program of assignments mixing constant subexpressions, identities and variables """
+    rng = random.Random(seed)
+    forms = [
+        "x := (x + {a}) * {b} - {c} * 2;",
+        "x := x * 1 + 0 - ({a} + {b}) / {c};",
+        "x := - - x + {a} * ({b} - {c}) * 0;",
+        "y := y * 1.0 + {a}.5 * 2.0 - {b}.25;",
+        "y := y / 1 - 0 + x * ({a} - {b});",
+        "b := (x < {a} * {b}) & true | false;",
+        "b := NOT NOT b & (({a} + 1) > {b});",
+        "b := \"abc\" == \"abc\" & b;",
+        "x := x + (NOT {a}) - -{b};",
+    ]
+    lines = [
+        "program arith is",
+        "variable x : integer;",
+        "variable y : float;",
+        "variable b : bool;",
+        "begin",
+        "x := getInteger();",
+    ]
+    for _ in range(n_statements):
+        lines.append(rng.choice(forms).format(a=rng.randint(1, 99), b=rng.randint(1, 99), c=rng.randint(1, 9)))
+    lines += ["b := putInteger(x);", "b := putFloat(y);", "b := putBool(b);", "end program.", ""]
+    return "\n".join(lines)
+
+def bench_fold(args):
+    """ parse tree nodes and IR instructions removed by constant folding, and its compile time """
+    from llvmlite import binding
+    from codegen import ProgramBuilder
+    from constant_fold import ConstantFolder, count_nodes
+
+    def compile_ir(path, fold):
+        builder = ProgramBuilder(path, None, fold_constants=fold)
+        with redirect_stdout(io.StringIO()):
+            builder.compile()
+        return builder.ir_text
+
+    print("{:<28} {:>8} {:>8} {:>8} {:>8} {:>11} {:>11}".format(
+        "program", "nodes", "folded", "instrs", "folded", "compile", "folded"))
+    def measure(name, path):
+        with redirect_stdout(io.StringIO()):
+            program = Parser(path).parse_program()
+        if program is None:
+            return
+        nodes = count_nodes(program)
+        ConstantFolder().fold_program(program)
+        counts, times = [], []
+        for fold in (False, True):
+            ir_text, seconds = timed(lambda: compile_ir(path, fold), args.repeat)
+            try:
+                counts.append(instruction_count(binding.parse_assembly(ir_text or "")))
+            except RuntimeError:
+                counts.append("invalid")
+            times.append("{:.1f}ms".format(seconds * 1000))
+        print("{:<28} {:>8} {:>8} {:>8} {:>8} {:>11} {:>11}".format(
+            name, nodes, count_nodes(program), counts[0], counts[1], *times))
+
+    for path in sorted(p for p in os.listdir(CORPUS_DIR) if p.endswith(".src")):
+        measure(os.path.splitext(path)[0], os.path.join(CORPUS_DIR, path))
+    for n in args.statements:
+        with temp_program(arithmetic_program(n)) as path:
+            measure("arithmetic x{}".format(n), path)
+
+def repeated_strings_program(n_calls, n_distinct):
+    """ a program printing n_calls string literals, cycling through n_distinct messages """
+    lines = ["program strings is", "variable out : bool;", "begin"]
+    lines += ["out := putString(\"message {}\");".format(i % n_distinct) for i in range(n_calls)]
+    lines += ["end program.", ""]
+    return "\n".join(lines)
+
+def bench_strings(args):
+    """ module size, globals and emission time of programs repeating string literals """
+    from llvmlite import binding
+    from codegen import ProgramBuilder
+
+    def compile_to(path, emit):
+        builder = ProgramBuilder(path, None, emit=emit)
+        with redirect_stdout(io.StringIO()):
+            builder.compile()
+        return builder
+
+    print("{:<20} {:>10} {:>10} {:>12} {:>12}".format("puts x messages", "globals", "IR bytes", "to IR", "to object"))
+    for n_calls in args.calls:
+        with temp_program(repeated_strings_program(n_calls, args.distinct)) as path:
+            builder, ir_seconds = timed(lambda: compile_to(path, "llvm"), args.repeat)
+            _, obj_seconds = timed(lambda: compile_to(path, "obj"), args.repeat)
+            n_globals = len(list(binding.parse_assembly(builder.ir_text).global_variables))
+            print("{:<20} {:>10} {:>10} {:>10.1f}ms {:>10.1f}ms".format(
+                "{} x {}".format(n_calls, args.distinct), n_globals, len(builder.ir_text),
+                ir_seconds * 1000, obj_seconds * 1000))
+
+ARRAYS_PROGRAM = """program arrays is
+variable a : integer[{n}];
+global variable g : float[{n}];
+variable s : string[{n}];
+variable out : bool;
+
+procedure flags : integer(variable n : integer)
+    variable b : bool[{n}];
+begin
+    b[1] := true;
+    return n;
+end procedure;
+
+begin
+    a[1] := flags(5);
+    out := putInteger(a[1] + a[2]);
+    out := putFloat(g[3]);
+    out := putString(s[4]);
+    out := putBool(s[4] == "");
+end program.
+"""
+
+def bench_arrays(args):
+    """ compile time and output size of array declarations, by array bound """
+    from codegen import ProgramBuilder
+
+    def compile_to(path, emit):
+        builder = ProgramBuilder(path, path + "." + emit, emit=emit)
+        with redirect_stdout(io.StringIO()):
+            builder.compile()
+        return os.path.getsize(path + "." + emit)
+
+    print("{:<12} {:>12} {:>12} {:>12} {:>12}".format("bound", "IR bytes", "to IR", "obj bytes", "to object"))
+    for bound in args.bounds:
+        with temp_program(ARRAYS_PROGRAM.format(n=bound)) as path:
+            ir_size, ir_seconds = timed(lambda: compile_to(path, "llvm"), args.repeat)
+            obj_size, obj_seconds = timed(lambda: compile_to(path, "obj"), args.repeat)
+            print("{:<12} {:>12} {:>10.1f}ms {:>12} {:>10.1f}ms".format(
+                bound, ir_size, ir_seconds * 1000, obj_size, obj_seconds * 1000))
+
+COUNTER_PROGRAM = """program counter is
+variable r : integer;
+
+procedure count : integer(variable n : integer)
+    variable out : bool;
+begin
+    if (n == 0) then
+        return 0;
+    end if;
+    out := putInteger(n);
+    return count(n - 1);
+end procedure;
+
+begin
+    r := count({});
+end program.
+"""
+
+def bench_run(args):
+    """ compile, jit and run time of programs run in process, and the cost of output per runtime """
+    from codegen import ProgramBuilder
+    from runtime import Runtime, jit_compile, run_linked
+
+    class _UnbufferedRuntime(Runtime):
+        """ writes out each put call as it is made """
+        def putinteger(self, value):
+            self.stdout.write("{}\n".format(value))
+            self.stdout.flush()
+
+    def run(builder, runtime_cls=Runtime):
+        stdin = io.StringIO(args.input + "\n")
+        with open(os.devnull, "w") as stdout:
+            runtime = runtime_cls(stdin, stdout)
+            runtime.bind()
+            start = perf_counter()
+            engine, main = jit_compile(builder.ir_text, args.opt_level)
+            jit_seconds = perf_counter() - start
+            start = perf_counter()
+            main()
+            runtime.flush()
+            del engine
+            return jit_seconds, perf_counter() - start
+
+    with temp_program(COUNTER_PROGRAM.format(args.count), "counter.src") as counter:
+        programs = [os.path.join(CORPUS_DIR, name + ".src") for name in args.programs] + [counter]
+        print("{:<28} {:>12} {:>12} {:>12}".format("program (-O{})".format(args.opt_level), "compile", "jit", "run"))
+        for path in programs:
+            builder = ProgramBuilder(path, None)
+            with redirect_stdout(io.StringIO()):
+                _, compile_seconds = timed(builder.compile, 1)
+            name = os.path.splitext(os.path.basename(path))[0]
+            if builder.has_errors():
+                print("{:<28} {:>12}".format(name, "errors"))
+                continue
+            try:
+                (jit_seconds, run_seconds), _ = timed(lambda: run(builder), 1)
+            except RuntimeError:
+                print("{:<28} {:>12}".format(name, "invalid IR"))
+                continue
+            print("{:<28} {:>10.1f}ms {:>10.1f}ms {:>10.1f}ms".format(
+                name, compile_seconds * 1000, jit_seconds * 1000, run_seconds * 1000))
+
+        builder = ProgramBuilder(counter, None)
+        with redirect_stdout(io.StringIO()):
+            builder.compile()
+        for label, runtime_cls in (("buffered output", Runtime), ("output per call", _UnbufferedRuntime)):
+            _, seconds = timed(lambda: run(builder, runtime_cls)[1], args.repeat)
+            report(label, args.count, "puts", seconds)
+
+        # the linked runtime writes to file descriptor 1, point it at /dev/null meanwhile
+        sys.stdout.flush()
+        saved_stdout = os.dup(1)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        try:
+            os.dup2(devnull, 1)
+            _, seconds = timed(lambda: run_linked(builder.ir_text, args.opt_level), args.repeat)
+        finally:
+            os.dup2(saved_stdout, 1)
+            os.close(saved_stdout)
+            os.close(devnull)
+        report("linked IR runtime, with jit", args.count, "puts", seconds)
+
+def bench_batch(args):
+    """ files/sec of the batch compiler as workers are added, vs one interpreter per file """
+    from batch import compile_batch
+    from main import add_compiler_arguments
+    ap = ArgumentParser()
+    add_compiler_arguments(ap)
+    options = ap.parse_args([])
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+
+    with scaled_corpus(args.copies, args.synthetic_procs) as (tmp_dir, paths):
+        out_dir = os.path.join(tmp_dir, "out")
+        print("corpus: {} files, {} cpus".format(len(paths), os.cpu_count()))
+
+        sample = paths[:args.cli_files]
+        start = perf_counter()
+        for path in sample:
+            subprocess.run([sys.executable, "main.py", path, os.path.join(tmp_dir, "cli.ll")],
+                           cwd=src_dir, stdout=subprocess.DEVNULL, check=False)
+        report("main.py per file", len(sample), "files", perf_counter() - start)
+
+        jobs = [0] + [2 ** i for i in range(args.max_jobs.bit_length()) if 2 ** i <= args.max_jobs]
+        for n_jobs in jobs:
+            label = "in process" if n_jobs == 0 else "{} workers".format(n_jobs)
+            _, seconds = timed(lambda: compile_batch(paths, out_dir, options, jobs=n_jobs), args.repeat)
+            report(label, len(paths), "files", seconds)
+
+def bench_check(args):
+    """ checking test/correct and test/incorrect without llvmlite vs a full compile, per process and per file """
+    from check import ProgramChecker
+    from codegen import ProgramBuilder
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    test_dir = os.path.dirname(CORPUS_DIR)
+    paths = [os.path.join(test_dir, corpus, name) for corpus in ("correct", "incorrect")
+             for name in sorted(os.listdir(os.path.join(test_dir, corpus))) if name.endswith(".src")]
+    print("corpus: {} files".format(len(paths)))
+
+    # a process per file pays the interpreter start and the imports each time
+    print("one process per file")
+    with tempfile.TemporaryDirectory(prefix="compiler_bench_") as tmp_dir:
+        for label, options in [("main.py", [os.path.join(tmp_dir, "out.ll")]), ("main.py --check", ["--check"])]:
+            def run_all():
+                for path in paths:
+                    subprocess.run([sys.executable, "main.py", path] + options,
+                                   cwd=src_dir, stdout=subprocess.DEVNULL, check=False)
+            _, seconds = timed(run_all, args.repeat)
+            print("  {:<26} {:8.1f}ms per file".format(label, seconds * 1000 / len(paths)))
+
+    def compile_all(make):
+        with redirect_stdout(io.StringIO()):
+            for path in paths:
+                make(path).compile()
+    _, full = timed(lambda: compile_all(lambda path: ProgramBuilder(path, None)), args.repeat)
+    _, check = timed(lambda: compile_all(ProgramChecker), args.repeat)
+    print("in process")
+    print("  {:<26} {:8.2f}ms per file".format("compile", full * 1000 / len(paths)))
+    print("  {:<26} {:8.2f}ms per file  {:5.1f}x".format("check", check * 1000 / len(paths), full / check))
+
+# entry points, the modules they import and their budget of import time in ms
+STARTUP_RUNS = [
+    ("scan",    "scanner.py",      ["scanner"],         "scan_budget"),
+    ("parse",   "parser.py",       ["parser"],          "parse_budget"),
+    ("check",   "main.py --check", ["main"],            "check_budget"),
+    ("compile", "main.py",         ["main", "codegen"], None),
+]
+
+def import_times(modules, src_dir):
+    """
+    import modules in a fresh interpreter under python -X importtime. returns
+    the cumulative import time of modules in ms, and the names of every
+    module that was imported
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+                            cwd=src_dir, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    total, names = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        names.add(name.strip())
+        # modules imported by the statement are the ones that aren't indented
+        if name.strip() in modules and name == " " + name.strip():
+            total += int(cumulative)
+    return total / 1000, names
+
+def bench_importtime(args):
+    """ cold start import time of the scan, parse and check entry points, fails over budget or if they load llvmlite """
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    def interpreter():
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+    _, seconds = timed(interpreter, args.repeat)
+    print("{:<10} {:<18} {:>10} {:>10} {:>10}".format("run", "entry point", "imports", "budget", "llvmlite"))
+    print("{:<10} {:<18} {:>8.1f}ms".format("python", "-c pass", seconds * 1000))
+
+    failures = []
+    for label, entry, modules, budget_option in STARTUP_RUNS:
+        runs = [import_times(modules, src_dir) for _ in range(args.repeat)]
+        milliseconds = min(ms for ms, _ in runs)
+        loads_llvmlite = any(name.startswith("llvmlite") for name in runs[0][1])
+        budget = getattr(args, budget_option) if budget_option else None
+        print("{:<10} {:<18} {:>8.1f}ms {:>10} {:>10}".format(
+            label, entry, milliseconds, "{:.0f}ms".format(budget) if budget else "-",
+            "yes" if loads_llvmlite else "no"))
+        if budget is None:
+            continue
+        if milliseconds > budget:
+            failures.append("{} imports take {:.1f}ms, over the {:.0f}ms budget".format(label, milliseconds, budget))
+        if loads_llvmlite:
+            failures.append("{} imports llvmlite".format(label))
+    for failure in failures:
+        print("FAILED: " + failure)
+    if failures:
+        sys.exit(1)
+
+def bench_procedures(args):
+    """ compile time with the top level procedures generated in worker processes, by procedure and worker count """
+    from codegen import ProgramBuilder
+
+    def compile_program(path, jobs):
+        builder = ProgramBuilder(path, None, procedure_jobs=jobs)
+        with redirect_stdout(io.StringIO()):
+            builder.compile(parse_first=True)
+        return builder
+
+    jobs = [0] + [2 ** i for i in range(args.max_jobs.bit_length()) if 2 ** i <= args.max_jobs]
+    print("{} cpus".format(os.cpu_count()))
+    print("{:<12} {:>11}".format("procedures", "one module") +
+          "".join("{:>18}".format("in process" if n == 0 else "{} workers".format(n)) for n in jobs))
+    for n_procs in args.procs:
+        with temp_program(synthesize_program(n_procs)) as path:
+            builder, serial = timed(lambda: compile_program(path, None), args.repeat)
+            if builder.has_errors():
+                print("synthetic program failed to compile")
+                return
+            line = "{:<12} {:>9.0f}ms".format(n_procs, serial * 1000)
+            for n_jobs in jobs:
+                _, seconds = timed(lambda: compile_program(path, n_jobs), args.repeat)
+                line += " {:>9.0f}ms {:>5.2f}x".format(seconds * 1000, serial / seconds)
+            print(line)
+
+def latency_report(label, seconds):
+    """ mean and percentiles of per request latencies """
+    seconds = sorted(seconds)
+    def percentile(p):
+        return seconds[min(len(seconds) - 1, int(p * len(seconds)))] * 1000
+    print("{:<28} {:>6} requests  mean {:8.2f}ms  p50 {:8.2f}ms  p95 {:8.2f}ms".format(
+        label, len(seconds), sum(seconds) / len(seconds) * 1000, percentile(0.5), percentile(0.95)))
+
+def bench_server(args):
+    """ per request latency of the compile server, vs a main.py process per compile """
+    from server import CompileClient
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+
+    with scaled_corpus(args.copies, args.synthetic_procs) as (tmp_dir, paths):
+        output = os.path.join(tmp_dir, "out.ll")
+        sample = paths[:args.requests]
+        print("corpus: {} files".format(len(sample)))
+
+        def cold(command, path):
+            start = perf_counter()
+            subprocess.run([sys.executable] + command + [path, output],
+                           cwd=src_dir, stdout=subprocess.DEVNULL, check=False)
+            return perf_counter() - start
+
+        latency_report("main.py per compile", [cold(["main.py"], p) for p in sample])
+
+        sock_path = os.path.join(tmp_dir, "compiler.sock")
+        server = subprocess.Popen([sys.executable, "server.py", "serve", "--socket", sock_path], cwd=src_dir)
+        try:
+            start = perf_counter()
+            while not os.path.exists(sock_path):
+                sleep(0.005)
+            print("server ready in {:.3f}s".format(perf_counter() - start))
+
+            latency_report("server.py client per compile",
+                           [cold(["server.py", "client", "--socket", sock_path], p) for p in sample])
+
+            with CompileClient(sock_path) as conn:
+                conn.compile(sample[0], output) # first request after startup
+                for label, out in (("server, output file", output), ("server, IR in response", None)):
+                    seconds = []
+                    for path in sample:
+                        start = perf_counter()
+                        response = conn.compile(path, out)
+                        seconds.append(perf_counter() - start)
+                        assert response["ok"], response
+                    latency_report(label, seconds)
+                conn.shutdown()
+            server.wait(timeout=10)
+        finally:
+            if server.poll() is None:
+                server.kill()
+
+# ================================================================================
+
+def main():
+    ap = ArgumentParser()
+    sub = ap.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("scanner", help=bench_scanner.__doc__)
+    p.add_argument("--size-mb", type=float, default=4.0)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_scanner)
+
+    p = sub.add_parser("engines", help=bench_engines.__doc__)
+    p.add_argument("--size-mb", type=float, default=4.0)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_engines)
+
+    p = sub.add_parser("token-memory", help=bench_token_memory.__doc__)
+    p.add_argument("--size-mb", type=float, default=4.0)
+    p.set_defaults(func=bench_token_memory)
+
+    p = sub.add_parser("incremental", help=bench_incremental.__doc__)
+    p.add_argument("--lines", type=int, default=50000)
+    p.add_argument("--edits", type=int, default=200)
+    p.add_argument("--engine", choices=ENGINES, default="regex")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_incremental)
+
+    p = sub.add_parser("expressions", help=bench_expressions.__doc__)
+    p.add_argument("--terms", type=int, default=100000)
+    p.add_argument("--statements", type=int, default=20000)
+    p.add_argument("--short-terms", type=int, default=8)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_expressions)
+
+    p = sub.add_parser("nesting", help=bench_nesting.__doc__)
+    p.add_argument("--depth", type=int, default=5000)
+    p.add_argument("--shallow-depth", type=int, default=50)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_nesting)
+
+    p = sub.add_parser("symbols", help=bench_symbols.__doc__)
+    p.add_argument("--depth", type=int, default=100, help="scope nesting levels")
+    p.add_argument("--names", type=int, default=20, help="names declared in each scope")
+    p.add_argument("--lookups", type=int, default=200000)
+    p.add_argument("--globals", type=int, default=50)
+    p.add_argument("--statements", type=int, default=50, help="assignments in each nested procedure")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_symbols)
+
+    p = sub.add_parser("analyze", help=bench_analyze.__doc__)
+    p.add_argument("--procs", type=int, nargs="+", default=[100, 1000],
+                   help="sizes of the synthesized programs")
+    p.add_argument("--depth", type=int, default=100, help="nesting of the nested procedures program")
+    p.add_argument("--statements", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_analyze)
+
+    p = sub.add_parser("ast-memory", help=bench_ast_memory.__doc__)
+    p.add_argument("--lines", type=int, default=50000)
+    p.set_defaults(func=bench_ast_memory)
+
+    p = sub.add_parser("ast-cache", help=bench_ast_cache.__doc__)
+    p.add_argument("--copies", type=int, default=20)
+    p.add_argument("--synthetic-procs", type=int, default=500)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_ast_cache)
+
+    p = sub.add_parser("ir-cache", help=bench_ir_cache.__doc__)
+    p.add_argument("--copies", type=int, default=20)
+    p.add_argument("--synthetic-procs", type=int, default=500)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_ir_cache)
+
+    p = sub.add_parser("opt", help=bench_opt.__doc__)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_opt)
+
+    p = sub.add_parser("fold", help=bench_fold.__doc__)
+    p.add_argument("--statements", type=int, nargs="+", default=[100, 1000],
+                   help="sizes of the synthetic arithmetic programs")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_fold)
+
+    p = sub.add_parser("strings", help=bench_strings.__doc__)
+    p.add_argument("--calls", type=int, nargs="+", default=[100, 1000, 10000])
+    p.add_argument("--distinct", type=int, default=10, help="different messages among the calls")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_strings)
+
+    p = sub.add_parser("arrays", help=bench_arrays.__doc__)
+    p.add_argument("--bounds", type=int, nargs="+", default=[10 ** k for k in range(1, 8)])
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_arrays)
+
+    p = sub.add_parser("run", help=bench_run.__doc__)
+    p.add_argument("--programs", nargs="+", default=["test2", "math", "recursiveFib", "iterativeFib"],
+                   help="test/correct programs to run")
+    p.add_argument("--input", default="1000", help="input line for programs that read one")
+    p.add_argument("--count", type=int, default=100000, help="puts made by the counter program")
+    p.add_argument("-O", dest="opt_level", type=int, default=2)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_run)
+
+    p = sub.add_parser("batch", help=bench_batch.__doc__)
+    p.add_argument("--copies", type=int, default=20)
+    p.add_argument("--synthetic-procs", type=int, default=20)
+    p.add_argument("--cli-files", type=int, default=24)
+    p.add_argument("--max-jobs", type=int, default=max(4, os.cpu_count() or 1))
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("check", help=bench_check.__doc__)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_check)
+
+    p = sub.add_parser("importtime", help=bench_importtime.__doc__)
+    p.add_argument("--scan-budget", type=float, default=30, help="ms of imports for scanning")
+    p.add_argument("--parse-budget", type=float, default=60, help="ms of imports for parsing")
+    p.add_argument("--check-budget", type=float, default=80, help="ms of imports for main.py --check")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_importtime)
+
+    p = sub.add_parser("procedures", help=bench_procedures.__doc__)
+    p.add_argument("--procs", type=int, nargs="+", default=[10, 100, 500, 1000])
+    p.add_argument("--max-jobs", type=int, default=max(4, os.cpu_count() or 1))
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_procedures)
+
+    p = sub.add_parser("server", help=bench_server.__doc__)
+    p.add_argument("--copies", type=int, default=4)
+    p.add_argument("--synthetic-procs", type=int, default=20)
+    p.add_argument("--requests", type=int, default=40)
+    p.set_defaults(func=bench_server)
+
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
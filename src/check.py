@@ -0,0 +1,123 @@
+## checks programs for errors without generating code
+from tokens import tkn_type as tkn
+# no name in module is a bug with pylint? Parser definitely exists.
+from parser import Parser # pylint: disable=no-name-in-module
+from semantic import Checker
+
+#===================================================================================
+# scanning, parsing and the semantic pass only. nothing here imports
+# llvmlite, so checking a file costs the front end and the interpreter start
+
+class ProgramChecker():
+    """ reports the errors of a program, the front end ProgramBuilder generates code from """
+
+    def __init__(self, input_fName, scanner_engine="char", compact_tokens=False,
+                 stmt_engine="recursive", ast_cache=None):
+        self.input_fName = input_fName
+        self._parser_options = dict(engine=scanner_engine, compact=compact_tokens, stmt_engine=stmt_engine)
+        self._parser = None
+        self.ast_cache = ast_cache # an ASTCache, or None to always parse
+        self.ir_cache = None
+        self._source = None
+        self.ir_text = None # never built here
+        self.checker = Checker()
+        self._has_errors = False
+
+    @property
+    def parser(self):
+        """ parser for the input file, only created when it is used so AST cache hits never scan """
+        if self._parser is None:
+            self._parser = Parser(self.input_fName, **self._parser_options)
+        return self._parser
+
+    def has_errors(self):
+        """ checks the flags for scanner, parser or semantic errors"""
+        if self._parser is None:
+            return self._has_errors
+        return self._has_errors or self._parser._has_errors or self._parser.has_scan_errors()
+
+    def load_program(self):
+        """
+        parses the input file into a Program. with an AST cache the tree of
+        an unchanged file is loaded instead, and programs that parse without
+        errors or warnings are added to the cache
+        """
+        if self.ast_cache is None:
+            return self.parser.parse_program()
+
+        key = self.ast_cache.key(self.read_source())
+        program = self.ast_cache.load(key)
+        if program == None:
+            program = self.parser.parse_program()
+            # only clean parses are cached, a hit can't repeat the messages
+            if program != None and not (self.has_errors() or self.parser._has_warnings):
+                self.ast_cache.store(key, program)
+        return program
+
+    def read_source(self):
+        """ the bytes of the input file, for the cache keys """
+        if self._source is None:
+            with open(self.input_fName, "rb") as fd:
+                self._source = fd.read()
+        return self._source
+
+    def compile(self, parse_first=False):
+        """
+        checks the input file, reporting every error found. the whole program
+        is parsed first when asked to or when there is an AST cache
+        """
+        if parse_first or self.ast_cache is not None:
+            self.check_program(self.load_program())
+        else:
+            self.check_module()
+
+    def check_module(self):
+        """ runs the parse loop and checks each top level node as it is parsed """
+        moduleName = self.parser.parse_program_header()
+        if not moduleName:
+            print("could not parse module header")
+            return
+        print("checking module: {}".format(moduleName))
+        res = self.parser.parse_top_level_declaration()
+        while res != tkn.BEGIN:
+            if res != None:
+                self.check_node(res)
+            res = self.parser.parse_top_level_declaration()
+        res = self.parser.parse_top_level_statement()
+        while res != tkn.EOF:
+            if res != None:
+                self.check_node(res)
+            res = self.parser.parse_top_level_statement()
+        self.finish_check()
+
+    def check_program(self, program):
+        """ checks a whole Program from Parser.parse_program """
+        if program == None:
+            print("could not parse module header")
+            return
+        print("checking module: {}".format(program.name))
+        for node in program.declarations + program.statements:
+            self.check_node(node)
+        self.finish_check()
+
+    def check_node(self, node):
+        """ checks a top level declaration or statement, False when it failed """
+        if self.checker.check_node(node):
+            return True
+        self._has_errors = True
+        if node.errList:
+            print("\n".join(node.getErrors()))
+        return False
+
+    def finish_check(self):
+        print("errors detected" if self.has_errors() else "no errors found")
+
+if __name__ == '__main__':
+    import glob
+    import sys
+
+    # llvmlite stays unloaded through checking every test program
+    for fName in sorted(glob.glob("../test/*/*.src")):
+        print(fName)
+        ProgramChecker(fName).compile()
+    print("llvmlite imported: {}".format("llvmlite" in sys.modules))
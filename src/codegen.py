@@ -1,32 +1,124 @@
+import os
+import pickle
+
 from llvmlite import ir, binding
-import llvmlite.binding as llvm
 
 from symbol_table import SymbolTable, Symbol
-from token import tkn_type as tkn
-# no name in module is a bug with pylint? Parser definitely exists.
-from parser import Parser # pylint: disable=no-name-in-module
+from tokens import tkn_type as tkn
+from runtime_lib import link_runtime
+from parse_tree import function_body, functionNode
+from constant_fold import ConstantFolder
+from semantic import Checker, BUILTINS
+from check import ProgramChecker
+
+# builtin get and put functions, the put functions return true
+# name returnType Param
+_ir_type = SymbolTable().get_ir_type
+builtins = [(name, _ir_type(ret), [_ir_type(param) for param in params]) for name, ret, params in BUILTINS]
+
+def builtins_signature():
+    """ the builtin declarations as text, part of the IR cache key """
+    return "\n".join("{} {}({})".format(ret, name, ", ".join(str(p) for p in params))
+                     for name, ret, params in builtins)
+
+_llvm_initialized = False
+
+def initialize_llvm():
+    """
+    llvm setup, done once per process. only target machines need it, building
+    and parsing IR don't, so it is left to new_target_machine
+    """
+    global _llvm_initialized
+    if not _llvm_initialized:
+        binding.initialize()
+        binding.initialize_native_target()
+        binding.initialize_native_asmprinter()
+        _llvm_initialized = True
+
+# inliner thresholds clang uses at -O2 and -O3
+_inlining_thresholds = {2: 225, 3: 275}
+
+def optimize(llvm_module, opt_level):
+    """
+    runs the standard LLVM pass pipeline for opt_level over a parsed module:
+    mem2reg, instcombine, GVN, LICM, loop unrolling and, from -O2, inlining
+    """
+    pmb = binding.PassManagerBuilder()
+    pmb.opt_level = opt_level
+    if opt_level in _inlining_thresholds:
+        pmb.inlining_threshold = _inlining_thresholds[opt_level]
+    function_passes = binding.FunctionPassManager(llvm_module)
+    module_passes = binding.ModulePassManager()
+    pmb.populate(function_passes)
+    pmb.populate(module_passes)
+
+    function_passes.initialize()
+    for function in llvm_module.functions:
+        function_passes.run(function)
+    function_passes.finalize()
+    module_passes.run(llvm_module)
+
+def new_target_machine(opt_level=0):
+    """ a TargetMachine for the host, for users that take ownership of it like MCJIT """
+    initialize_llvm()
+    target = binding.Target.from_triple(binding.get_default_triple())
+    return target.create_target_machine(opt=opt_level, reloc="pic", codemodel="default")
+
+_target_machines = {}
+
+def target_machine(opt_level=0):
+    """ TargetMachine for the host at an optimization level, made once per process """
+    machine = _target_machines.get(opt_level)
+    if machine is None:
+        machine = new_target_machine(opt_level)
+        _target_machines[opt_level] = machine
+    return machine
 
 # ========================= #
 # IR Builder                #
 # ========================= #
 
-class ProgramBuilder():
+class ProgramBuilder(ProgramChecker):
     """ manages the in memory IR for LLVM """ 
     
-    def __init__(self, input_fName, output_fName):
+    def __init__(self, input_fName, output_fName, scanner_engine="char", compact_tokens=False,
+                 stmt_engine="recursive", ast_cache=None, ir_cache=None, emit="llvm", opt_level=0,
+                 link_runtime=False, fold_constants=False, analyze=False, procedure_jobs=None):
+        ProgramChecker.__init__(self, input_fName, scanner_engine, compact_tokens, stmt_engine, ast_cache)
         self.symbolTable = SymbolTable()
-        self.parser = Parser(input_fName)
-        self.output_fName = output_fName
-        self._has_errors = False
+        self.ir_cache = ir_cache # an IRCache, or None to always generate the IR
+        self.output_fName = output_fName # None to only keep the IR in ir_text
+        self.emit_kind = emit # llvm, asm or obj, see main.EMIT_SUFFIXES
+        self.opt_level = opt_level
+        self.link_runtime = link_runtime # link in the builtins from runtime_lib
+        self.folder = ConstantFolder() if fold_constants else None
+        # worker processes generating the top level procedures, see generate_parallel_code.
+        # None generates them in the main module, 0 in their own modules but in this process
+        self.procedure_jobs = procedure_jobs
+        self.checker = Checker() if analyze or procedure_jobs is not None else None
 
-        # llvm setup
-        binding.initialize()
-        binding.initialize_native_target()
-        binding.initialize_native_asmprinter()
-    
-    def has_errors(self):
-        """ checks the flags for scanner, parser or codegen errors"""
-        return self._has_errors or self.parser._has_errors or self.parser.scanner._has_errors
+    def _ir_key(self):
+        options = []
+        if self.folder is not None:
+            options.append("fold")
+        if self.procedure_jobs is not None:
+            options.append("procedures")
+        return self.ir_cache.key(self.read_source(), builtins_signature(), binding.get_default_triple(),
+                                 " ".join(options))
+
+    def load_cached_ir(self):
+        """
+        writes out the IR cached for an unchanged input file, without parsing
+        or building the module. returns False when there is none
+        """
+        if self.ir_cache is None:
+            return False
+        output = self.ir_cache.load(self._ir_key())
+        if output is None:
+            return False
+        print("writing cached IR to LLVM assembly\n")
+        self.emit(output)
+        return True
 
     def initialize_module(self, name):
         # create module
@@ -39,7 +131,7 @@ class ProgramBuilder():
         # create main function
         func_type = ir.FunctionType(ir.VoidType(), [], False)
         base_func = ir.Function(self.module, func_type, name="main")
-        block = base_func.append_basic_block(name="entry")
+        block = function_body(base_func)
 
         # create llvm ir builder and set at start of the main block
         self.builder = ir.IRBuilder(block)
@@ -47,33 +139,83 @@ class ProgramBuilder():
 
     def load_builtins(self):
         """ create builtin get and put functions (empty for now)"""
-        # name returnType Param
-        builtins = [
-            ("putbool",           ir.VoidType(),    [ir.IntType(1)]),
-            ("putstring",         ir.VoidType(),    [ir.PointerType(ir.IntType(8))]),
-            ("putinteger",        ir.VoidType(),    [ir.IntType(32)]),
-            ("putfloat",          ir.VoidType(),    [ir.FloatType()]),
-            ("getbool",           ir.IntType(1),    []),
-            ("getinteger",        ir.IntType(32),   []),
-            ("getfloat",          ir.FloatType(),   []),
-            ("main.StringEquals", ir.IntType(1),    [ir.PointerType(ir.IntType(8)),
-                                                     ir.PointerType(ir.IntType(8))]),
-            ("getstring",         ir.PointerType(ir.IntType(8)), [])                                        
-        ]
-
         for entry in builtins:
             fType = ir.FunctionType(entry[1], entry[2])
             func = ir.Function(self.module, fType, name=entry[0])
-            symbol = Symbol(entry[0], func, fType, id_type='function')
+            symbol = Symbol(entry[0], func, self.symbolTable.get_data_type(entry[1]), id_type='function')
             self.symbolTable.add(symbol)
+            if self.checker is not None:
+                self.checker.bind_builtin(entry[0], func)
 
-    def output_ir(self):
+    def output_ir(self, procedures=()):
         # signal return from main function
-        # self.builder.ret_void()
+        if not self.builder.block.is_terminated:
+            self.builder.ret_void()
         output = str(self.module)
-        with open(self.output_fName, "w") as fd:
-            fd.write(output)
+        if procedures:
+            from parallel import link
+            output = link(output, procedures)
+        # like the AST cache, only cache output whose compile printed nothing to repeat
+        if self.ir_cache is not None and not (self._parser is not None and self._parser._has_warnings):
+            self.ir_cache.store(self._ir_key(), output)
+        self.emit(output)
+
+    def emit(self, ir_text):
+        """
+        writes the IR as LLVM assembly, or parses and verifies it, links in
+        the runtime library if asked to, optimizes it at opt_level, and writes
+        it out as LLVM assembly, native assembly or an object file for the host
+        """
+        self.ir_text = ir_text
+        if self.emit_kind == "llvm" and self.opt_level == 0 and not self.link_runtime:
+            self.write_output(ir_text)
+            return
+        try:
+            llvm_module = binding.parse_assembly(ir_text)
+            llvm_module.verify()
+        except RuntimeError as e:
+            self._has_errors = True
+            print("invalid IR, no {} output: {}".format(self.emit_kind, str(e).strip()))
+            return
+        llvm_module.name = os.path.basename(self.input_fName)
+        machine = target_machine(self.opt_level)
+        llvm_module.data_layout = str(machine.target_data)
+        if self.link_runtime:
+            link_runtime(llvm_module)
+        if self.opt_level > 0:
+            optimize(llvm_module, self.opt_level)
+        if self.emit_kind == "llvm":
+            print("writing {} IR to LLVM assembly\n".format("optimized" if self.opt_level > 0 else "linked"))
+            self.write_output(str(llvm_module))
+        elif self.emit_kind == "asm":
+            print("writing native assembly\n")
+            self.write_output(machine.emit_assembly(llvm_module))
+        else:
+            print("writing object file\n")
+            self.write_output(machine.emit_object(llvm_module))
+
+    def write_output(self, output):
+        """ writes the output file, if there is one. output is str or bytes """
+        if self.output_fName is not None:
+            with open(self.output_fName, "wb" if isinstance(output, bytes) else "w") as fd:
+                fd.write(output)
         
+    def compile(self, parse_first=False):
+        """
+        compiles the input file to the output file. the IR cache is tried
+        first, and the whole program is parsed before codegen when asked
+        to, when there is an AST cache or when procedures are generated in
+        their own modules
+        """
+        if self.load_cached_ir():
+            return
+        if self.procedure_jobs is not None:
+            self.generate_parallel_code(self.load_program())
+        elif parse_first or self.ast_cache is not None:
+            self.generate_program_code(self.load_program())
+        else:
+            self.generate_module_code()
+
     def generate_module_code(self):
         """ runs the parse loop and calls codegen functions for the input program"""
 
@@ -88,24 +230,104 @@ class ProgramBuilder():
         res = self.parser.parse_top_level_declaration()
         while res != tkn.BEGIN:
             if res != None: # and (not self.has_errors()):
-                ir = res.codegen(self.builder, self.symbolTable, self.module)
-                if ir == None:
-                    self._has_errors = True
-                    print("\n".join(res.getErrors()))
+                self.generate_node_code(res)
             res = self.parser.parse_top_level_declaration()
         # parse and generate top level statements
         res = self.parser.parse_top_level_statement()
         while res != tkn.EOF:
             if res != None: #and (not self.has_errors()):
-                ir = res.codegen(self.builder, self.symbolTable, self.module)
-                if ir == None:
-                    self._has_errors = True
-                    print("\n".join(res.getErrors()))
+                self.generate_node_code(res)
             res = self.parser.parse_top_level_statement()
+        self.finish_module()
+
+    def generate_program_code(self, program):
+        """ calls the codegen functions for a whole Program from Parser.parse_program """
+        if program == None:
+            print("could not parse module header")
+            return None
+        self.initialize_module(program.name)
+        print("generating module: {}".format(program.name))
+        for node in program.declarations + program.statements:
+            self.generate_node_code(node)
+        self.finish_module()
+
+    def generate_parallel_code(self, program):
+        """
+        calls the codegen functions for a whole Program, except for the bodies
+        of the top level procedures, which are only declared in the main
+        module. they are generated in procedure_jobs worker processes, each
+        into a module of its own, and linked into the main module
+        """
+        if program == None:
+            print("could not parse module header")
+            return None
+        self.initialize_module(program.name)
+        print("generating module: {}".format(program.name))
+        procedures = []
+        for node in program.declarations + program.statements:
+            if isinstance(node, functionNode):
+                data = self.declare_procedure_node(node)
+                if data != None:
+                    procedures.append(data)
+            else:
+                self.generate_node_code(node)
+
+        modules = []
+        if procedures and not self.has_errors():
+            from parallel import generate_procedures, program_externals
+            results = generate_procedures(procedures, program.name, self.module.triple,
+                                          program_externals(self.symbolTable), self.procedure_jobs)
+            for bitcode, errors in results:
+                if bitcode == None:
+                    self._has_errors = True
+                    print("\n".join(errors))
+                modules.append(bitcode)
+        self.finish_module(modules)
+
+    def declare_procedure_node(self, node):
+        """
+        checks a top level procedure and declares it in the main module.
+        returns it pickled for a worker, None after an error or when it
+        was generated here
+        """
+        if self.folder is not None:
+            node = self.folder.fold_node(node)
+        try:
+            # before the checker annotates it with symbols, which come to hold IR values
+            data = pickle.dumps(node, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            data = None # too deeply nested to pickle, like in the AST cache
+        if not self.check_node(node) or self._has_errors:
+            return None
+        if data == None:
+            self.codegen_node(node)
+            return None
+        if node.declare(self.symbolTable, self.module) == None:
+            self._has_errors = True
+            print("\n".join(node.getErrors()))
+            return None
+        return data
+
+    def generate_node_code(self, node):
+        """ codegen for a top level declaration or statement """
+        if self.folder is not None:
+            node = self.folder.fold_node(node)
+        # after an error nodes are only checked, their code could use declarations that failed
+        if self.checker is not None and (not self.check_node(node) or self._has_errors):
+            return
+        self.codegen_node(node)
+
+    def codegen_node(self, node):
+        ir = node.codegen(self.builder, self.symbolTable, self.module)
+        if ir == None:
+            self._has_errors = True
+            print("\n".join(node.getErrors()))
 
+    def finish_module(self, procedures=()):
+        """ writes out the IR unless errors were found, with the procedure modules linked in """
         if not self.has_errors():
             print("writing IR to LLVM assembly\n")
-            self.output_ir()
+            self.output_ir(procedures)
         else:
             print("errors detected, compilation aborted")
 
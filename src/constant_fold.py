@@ -0,0 +1,347 @@
+## constant folding and algebraic simplification over the parse tree
+import math
+import struct
+
+from tokens import tkn_type as tkn
+from parse_tree import parseTreeNode, exprNode, BinOpExpr, UnaryOpExpr, VariableExpr, LiteralExpr, \
+    CallExpr, returnExpr, AssignmentNode, declarationNode, IfNode, LoopNode, functionNode
+from semantic import NUMERIC_TYPES, binary_result_type
+
+#===================================================================================
+# runs between parsing and codegen. an operation on literals is replaced by
+# a literal of its value, computed the way the generated code would: 32 bit
+# wrapping integers and single precision floats. identities are only applied
+# where they keep the type and the value of the expression, and operations
+# codegen rejects are left in place for codegen to report
+
+INT_MIN = -2**31
+INT_MAX = 2**31 - 1
+
+def wrap_i32(value):
+    """ value wrapped to a 32 bit signed integer """
+    return (value - INT_MIN) % 2**32 + INT_MIN
+
+def to_f32(value):
+    """ value rounded to single precision """
+    try:
+        return struct.unpack("f", struct.pack("f", value))[0]
+    except OverflowError:
+        return math.copysign(math.inf, value)
+
+def sdiv(a, b):
+    """ integer division rounding towards zero, like sdiv """
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+_int_ops = {
+    tkn.OP_ADD: lambda a, b: a + b,
+    tkn.OP_SUB: lambda a, b: a - b,
+    tkn.OP_MUL: lambda a, b: a * b,
+    tkn.OP_DIV: sdiv,
+    tkn.BOOL_AND: lambda a, b: a & b,
+    tkn.BOOL_OR: lambda a, b: a | b,
+}
+_float_ops = {
+    tkn.OP_ADD: lambda a, b: a + b,
+    tkn.OP_SUB: lambda a, b: a - b,
+    tkn.OP_MUL: lambda a, b: a * b,
+    tkn.OP_DIV: lambda a, b: a / b,
+}
+_relations = {
+    tkn.OP_LT: lambda a, b: a < b,
+    tkn.OP_GE: lambda a, b: a >= b,
+    tkn.OP_LE: lambda a, b: a <= b,
+    tkn.OP_GT: lambda a, b: a > b,
+    tkn.OP_EQ: lambda a, b: a == b,
+    tkn.OP_NE: lambda a, b: a != b,
+}
+
+def literal_value(node):
+    """ python value of a LiteralExpr, None for an integer codegen wouldn't take as an i32 """
+    if node.data_type == tkn.INT_TYPE:
+        value = int(node.value)
+        return value if INT_MIN <= value <= INT_MAX else None
+    elif node.data_type == tkn.FLOAT_TYPE:
+        return to_f32(float(node.value))
+    elif node.data_type == tkn.BOOL_TYPE:
+        return node.value != "false"
+    elif node.data_type == tkn.STRING_TYPE:
+        return node.value[1:-1] # without the quotes
+    return None
+
+def make_literal(value, data_type, line):
+    """ LiteralExpr holding value, in the form the scanner gives literals """
+    if data_type == tkn.BOOL_TYPE:
+        text = "true" if value else "false"
+    else:
+        text = repr(value) if data_type == tkn.FLOAT_TYPE else str(value)
+    return LiteralExpr(text, data_type, line)
+
+def fold_binary(Op, left, right):
+    """ value of a binary operation on two literals, None when it isn't folded """
+    a, b = literal_value(left), literal_value(right)
+    result_type = binary_result_type(Op, left.data_type, right.data_type)
+    if a is None or b is None or result_type is None:
+        return None
+    if left.data_type == right.data_type == tkn.INT_TYPE:
+        if Op in _relations:
+            return _relations[Op](a, b)
+        # division by zero and INT_MIN / -1 trap at run time, keep them there
+        if Op == tkn.OP_DIV and (b == 0 or (a == INT_MIN and b == -1)):
+            return None
+        return wrap_i32(_int_ops[Op](a, b))
+    elif left.data_type == tkn.STRING_TYPE:
+        return a == b
+    # the integer side of a mixed operation goes through sitofp to single precision
+    if left.data_type == tkn.INT_TYPE and right.data_type == tkn.FLOAT_TYPE:
+        a = to_f32(float(a))
+    elif left.data_type == tkn.FLOAT_TYPE and right.data_type == tkn.INT_TYPE:
+        b = to_f32(float(b))
+    if Op in _relations:
+        # fcmp_unordered, true when either side is NaN
+        if math.isnan(a) or math.isnan(b):
+            return True
+        return _relations[Op](a, b)
+    elif result_type == tkn.FLOAT_TYPE:
+        if Op == tkn.OP_DIV and b == 0:
+            return None
+        return to_f32(_float_ops[Op](a, b))
+    return (a and b) if Op == tkn.BOOL_AND else (a or b)
+
+def fold_unary(Op, operand):
+    """ value of a unary operation on a literal, None when it isn't folded """
+    a = literal_value(operand)
+    if a is None:
+        return None
+    if Op == tkn.OP_SUB and operand.data_type == tkn.INT_TYPE:
+        return wrap_i32(-a)
+    elif Op == tkn.OP_SUB and operand.data_type == tkn.FLOAT_TYPE:
+        return -a
+    elif Op == tkn.BOOL_NOT and operand.data_type == tkn.INT_TYPE:
+        return ~a
+    elif Op == tkn.BOOL_NOT and operand.data_type == tkn.BOOL_TYPE:
+        return not a
+    return None
+
+def count_nodes(node):
+    """ number of parse tree nodes in node and its children """
+    if isinstance(node, parseTreeNode):
+        return 1 + sum(count_nodes(getattr(node, field, None))
+                       for cls in type(node).__mro__ for field in getattr(cls, "__slots__", ())
+                       if field != "_errList")
+    elif isinstance(node, list):
+        return sum(count_nodes(item) for item in node)
+    return 0
+
+def has_calls(node):
+    """ True if evaluating the expression calls a procedure, which may have side effects """
+    if isinstance(node, CallExpr):
+        return True
+    elif isinstance(node, BinOpExpr):
+        return has_calls(node.LHS) or has_calls(node.RHS)
+    elif isinstance(node, UnaryOpExpr):
+        return has_calls(node.expr)
+    elif isinstance(node, VariableExpr):
+        return node.array_index is not None and has_calls(node.array_index)
+    return False
+
+
+class ConstantFolder():
+    """
+    folds the expressions of a program's nodes in place, in program order.
+    declarations are tracked like the symbol table does, to know the type
+    of variables. removed counts the nodes taken out of the tree
+    """
+
+    def __init__(self):
+        self.globals = {}
+        self.scopes = [{}] # name: (data type, id type), the program body, then each open procedure
+        self.removed = 0
+        self.folded = 0
+
+    def fold_program(self, program):
+        """ folds a whole Program from Parser.parse_program """
+        program.declarations = [self.fold_node(node) for node in program.declarations]
+        program.statements = [self.fold_node(node) for node in program.statements]
+        return program
+
+    def fold_node(self, node):
+        """ folds the expressions of a declaration or statement, returns the node """
+        if isinstance(node, declarationNode):
+            if node.array_size is not None:
+                node.array_size = self.fold_expr(node.array_size)[0]
+            scope = self.globals if node.is_global else self.scopes[-1]
+            scope[node.name] = (node.type, "variable" if node.array_size is None else "array")
+        elif isinstance(node, functionNode):
+            self.scopes[-1][node.name] = (node.retType, "function")
+            self.scopes.append({param.name: (param.type, "variable") for param in node.params})
+            node.body = [self.fold_node(statement) for statement in node.body]
+            self.scopes.pop()
+        elif isinstance(node, AssignmentNode):
+            node.dest = self.fold_expr(node.dest)[0]
+            node.expr = self.fold_expr(node.expr)[0]
+        elif isinstance(node, IfNode):
+            node.condition = self.fold_expr(node.condition)[0]
+            node.thenBlock = [self.fold_node(statement) for statement in node.thenBlock]
+            if node.elseBlock is not None:
+                node.elseBlock = [self.fold_node(statement) for statement in node.elseBlock]
+        elif isinstance(node, LoopNode):
+            node.start = self.fold_node(node.start)
+            node.end = self.fold_expr(node.end)[0]
+            node.body = [self.fold_node(statement) for statement in node.body]
+        elif isinstance(node, returnExpr):
+            node.expr = self.fold_expr(node.expr)[0]
+        elif isinstance(node, exprNode):
+            node = self.fold_expr(node)[0]
+        return node
+
+    def replace(self, node, new):
+        """ new, counted as replacing node """
+        self.removed += count_nodes(node) - count_nodes(new)
+        self.folded += 1
+        return new
+
+    def variable_type(self, node):
+        """ type of a variable expression, None when codegen would reject it """
+        for scope in reversed(self.scopes):
+            if node.name in scope:
+                # locals of an enclosing scope aren't visible
+                entry = scope[node.name] if scope is self.scopes[-1] else None
+                break
+        else:
+            entry = self.globals.get(node.name)
+        if entry is None or entry[1] == "function" or (entry[1] == "array") != (node.array_index is not None):
+            return None
+        return entry[0]
+
+    def function_type(self, node):
+        """ return type of the procedure a CallExpr calls, None if it isn't one of the program's """
+        for scope in reversed(self.scopes):
+            if node.name in scope:
+                entry = scope[node.name]
+                return entry[0] if entry[1] == "function" else None
+        return None
+
+    def fold_expr(self, node):
+        """ (folded expression, its type), the type is None when it isn't known """
+        if isinstance(node, LiteralExpr):
+            return node, node.data_type
+        elif isinstance(node, VariableExpr):
+            if node.array_index is not None:
+                node.array_index = self.fold_expr(node.array_index)[0]
+            return node, self.variable_type(node)
+        elif isinstance(node, CallExpr):
+            node.params = [self.fold_expr(param)[0] for param in node.params]
+            return node, self.function_type(node)
+        elif isinstance(node, UnaryOpExpr):
+            return self.fold_unary(node)
+        elif isinstance(node, BinOpExpr):
+            return self.fold_binary(node)
+        return node, None
+
+    def fold_unary(self, node):
+        node.expr, expr_type = self.fold_expr(node.expr)
+        if isinstance(node.expr, LiteralExpr):
+            value = fold_unary(node.Op, node.expr)
+            if value is not None:
+                return self.replace(node, make_literal(value, expr_type, node.line)), expr_type
+
+        if not (node.Op == tkn.OP_SUB and expr_type in NUMERIC_TYPES or
+                node.Op == tkn.BOOL_NOT and expr_type in (tkn.INT_TYPE, tkn.BOOL_TYPE)):
+            return node, None
+        # - - x and NOT NOT x are x, which has the type of NOT x or - x
+        if isinstance(node.expr, UnaryOpExpr) and node.expr.Op == node.Op:
+            return self.replace(node, node.expr.expr), expr_type
+        return node, expr_type
+
+    def fold_binary(self, node):
+        node.LHS, left_type = self.fold_expr(node.LHS)
+        node.RHS, right_type = self.fold_expr(node.RHS)
+        result_type = binary_result_type(node.Op, left_type, right_type)
+        left_literal = isinstance(node.LHS, LiteralExpr)
+        right_literal = isinstance(node.RHS, LiteralExpr)
+        if left_literal and right_literal:
+            value = fold_binary(node.Op, node.LHS, node.RHS)
+            if value is not None:
+                return self.replace(node, make_literal(value, result_type, node.line)), result_type
+        elif (left_literal or right_literal) and result_type is not None:
+            if left_literal:
+                literal, other, other_type, literal_on_left = node.LHS, node.RHS, right_type, True
+            else:
+                literal, other, other_type, literal_on_left = node.RHS, node.LHS, left_type, False
+            simplified = self.identity(node.Op, literal, other, literal_on_left, other_type, result_type)
+            if simplified is not None:
+                return self.replace(node, simplified), result_type
+        return node, result_type
+
+    def identity(self, Op, literal, other, literal_on_left, other_type, result_type):
+        """
+        the operation simplified, when it has a literal operand that makes it
+        an identity or a constant, None otherwise. other has to have the type
+        of the result, so no conversion is lost
+        """
+        value = literal_value(literal)
+        if value is None or other_type != result_type:
+            return None
+        line = literal.line
+        if result_type == tkn.INT_TYPE:
+            if (Op == tkn.OP_ADD and value == 0) or \
+               (Op in (tkn.OP_SUB, tkn.OP_DIV) and not literal_on_left and value == (0 if Op == tkn.OP_SUB else 1)) or \
+               (Op == tkn.OP_MUL and value == 1):
+                return other
+            if Op == tkn.OP_MUL and value == 0 and not has_calls(other):
+                return make_literal(0, tkn.INT_TYPE, line)
+        elif result_type == tkn.FLOAT_TYPE:
+            # only the exact ones: x + 0 is 0 for x = -0, x * 0 is NaN for infinite x
+            if (Op == tkn.OP_MUL and value == 1) or \
+               (Op in (tkn.OP_SUB, tkn.OP_DIV) and not literal_on_left and value == (0 if Op == tkn.OP_SUB else 1)):
+                return other
+        elif result_type == tkn.BOOL_TYPE and Op in (tkn.BOOL_AND, tkn.BOOL_OR):
+            if value == (Op == tkn.BOOL_AND):
+                return other # x & true, x | false
+            if not has_calls(other):
+                return make_literal(value, tkn.BOOL_TYPE, line) # x & false, x | true
+        return None
+
+def fold_text(Op, left, right):
+    """ text of the literal an operation on two literals folds to, None when it isn't folded """
+    def literal(text):
+        data_type = tkn.FLOAT_TYPE if "." in text else tkn.INT_TYPE
+        return LiteralExpr(text, data_type, 0)
+    left, right = literal(left), literal(right)
+    value = fold_binary(Op, left, right)
+    if value is None:
+        return None
+    return make_literal(value, binary_result_type(Op, left.data_type, right.data_type), 0).value
+
+# (operation, operands, the literal the generated code computes)
+SELF_CHECKS = [
+    (tkn.OP_GT, "16777217", "16777216.0", "false"), # 16777217 is 16777216 as a float
+    (tkn.OP_EQ, "16777217", "16777216.0", "true"),
+    (tkn.OP_LT, "16777216.0", "16777217", "false"),
+    (tkn.OP_MUL, "16777217", "1.5", "25165824.0"),
+    (tkn.OP_ADD, "2147483647", "1", "-2147483648"),
+    (tkn.OP_DIV, "-7", "2", "-3"),
+    (tkn.OP_DIV, "1", "0", None),
+]
+
+if __name__ == '__main__':
+    import sys
+    from parser import Parser
+
+    failed = 0
+    for Op, left, right, expected in SELF_CHECKS:
+        got = fold_text(Op, left, right)
+        if got != expected:
+            print("{} {} {} folded to {}, expected {}".format(left, Op.name, right, got, expected))
+            failed += 1
+
+    fName = "../test/correct/math.src"
+    program = Parser(fName).parse_program()
+    before = count_nodes(program)
+    folder = ConstantFolder()
+    folder.fold_program(program)
+    print(program)
+    print("{} nodes, {} after folding, {} expressions folded".format(before, count_nodes(program), folder.folded))
+    print("{} of {} self checks failed".format(failed, len(SELF_CHECKS)))
+    sys.exit(1 if failed else 0)
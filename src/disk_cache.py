@@ -0,0 +1,127 @@
+## content addressed on disk caches
+import hashlib
+import os
+import tempfile
+
+#===================================================================================
+# a directory of cache entries named by key. entries are written atomically
+# and the least recently used ones are evicted past a size limit. the AST and
+# IR caches are built on this
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_module_hashes = {}
+
+def modules_version(names):
+    """ hash of the code of the given src modules, a change to any invalidates cached results """
+    names = tuple(names)
+    version = _module_hashes.get(names)
+    if version is None:
+        digest = hashlib.sha256()
+        for name in names:
+            with open(os.path.join(SRC_DIR, name), "rb") as fd:
+                digest.update(fd.read())
+        version = digest.hexdigest()[:16]
+        _module_hashes[names] = version
+    return version
+
+
+class DiskCache:
+    """
+    entries are files named <key><suffix> in directory. the modification
+    time of an entry is its last use, and once the directory grows past
+    max_bytes the least recently used entries are evicted. stats counts
+    this process's hits, misses, stores and evictions
+    """
+    suffix = ".cache"
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def make_key(self, *parts):
+        """ sha256 of the key parts, each str or bytes """
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode()
+            # length prefix, so parts can't run into each other
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def read(self, key):
+        """ returns the bytes cached under key, or None on a miss """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fd:
+                data = fd.read()
+            os.utime(path) # mark as recently used
+        except OSError:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return data
+
+    def write(self, key, data):
+        """ atomically cache data under key, then evict down to the size limit """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.stats["stores"] += 1
+        self.evict()
+
+    def discard(self, key):
+        """ remove an entry that turned out to be unusable, counting its hit as a miss """
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+        self.stats["hits"] -= 1
+        self.stats["misses"] += 1
+
+    def entries(self):
+        """ (mtime, size, path) of every entry """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue # evicted by another compiler process
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """ remove least recently used entries until the cache fits in max_bytes """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                self.stats["evictions"] += 1
+            except FileNotFoundError:
+                pass # removed by another compiler process
+            total -= size
+
+    def summary(self):
+        """ one line report of the stats and the size of the cache """
+        entries = self.entries()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return "{}: {} hits, {} misses ({:.0%} hit rate), {} stores, {} evictions, {} entries, {:.1f} of {:.1f} MB".format(
+            self.directory, self.stats["hits"], self.stats["misses"],
+            self.stats["hits"] / lookups if lookups else 0,
+            self.stats["stores"], self.stats["evictions"], len(entries),
+            sum(size for _, size, _ in entries) / 1e6, self.max_bytes / 1e6)
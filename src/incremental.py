@@ -0,0 +1,189 @@
+## Incremental Scanner
+from array import array
+from bisect import bisect_left
+
+from scanner import Scanner
+from tokens import TokenBuffer
+#===================================================================================
+# keeps a token buffer in sync with a source text as it is edited, re-scanning
+# only the tokens around each edit
+
+
+class IncrementalLexer:
+    """
+    a TokenBuffer for an editable source text.
+
+    shifting the text offset of every token after an edit would make each
+    edit cost O(tokens), so offsets are shifted lazily like a gap buffer:
+    the starts/ends of tokens from index self._gap on are stored without
+    self._shift added. span() gives exact offsets, and flush() applies the
+    pending shift to the whole buffer
+    """
+    def __init__(self, text, tabsize=4, engine="regex"):
+        self.text = text
+        self.tabsize = tabsize
+        self.engine = engine
+        # the number of scan errors reported for each token, errors in the
+        # comments before a token included, so splicing in re-scanned tokens
+        # replaces the errors of the tokens they replace
+        self.errors = array('i')
+        self._error_count = 0
+        self.buffer = TokenBuffer()
+        scanner = Scanner(tabsize=tabsize, engine=engine, text=text)
+        reported = 0
+        for token in scanner.tokens():
+            self.buffer.append(token.type, (token.line, token.col), token.value, scanner.tokenSpan())
+            self.errors.append(scanner.error_count - reported)
+            reported = scanner.error_count
+        self._error_count = reported
+        self.buffer.has_errors = reported > 0
+        self._gap = len(self.buffer)
+        self._shift = 0
+
+    def span(self, index):
+        """ start and end index of a token in the current text """
+        shift = self._shift if index >= self._gap else 0
+        return self.buffer.starts[index] + shift, self.buffer.ends[index] + shift
+
+    def flush(self):
+        """ make the offsets stored in the buffer exact """
+        self._move_gap(len(self.buffer))
+
+    def _move_gap(self, index):
+        """ apply the pending shift so that the offsets before index are exact """
+        buf = self.buffer
+        if self._shift and index != self._gap:
+            if index < self._gap:
+                lo, hi, shift = index, self._gap, -self._shift
+            else:
+                lo, hi, shift = self._gap, index, self._shift
+            buf.starts[lo:hi] = array('i', map(shift.__add__, buf.starts[lo:hi]))
+            buf.ends[lo:hi] = array('i', map(shift.__add__, buf.ends[lo:hi]))
+        self._gap = index
+
+    def edit(self, offset, deleted, inserted):
+        """
+        replace deleted chars at offset with the inserted text, and update the
+        token buffer to match. returns (index, removed, added): the index of
+        the first token that changed, how many old tokens were removed there
+        and how many new tokens replaced them. every other token is kept, with
+        its location shifted past the edit
+        """
+        buf = self.buffer
+        text = self.text[:offset] + inserted + self.text[offset + deleted:]
+        self.text = text
+        delta = len(inserted) - deleted
+        edit_end = offset + len(inserted) # end of the edit in the new text
+
+        # tokens always start outside of comments and strings, so scanning can
+        # restart at any token. the scanner looks one char past the end of a
+        # token, so the last token that ends before the edit can't have been
+        # changed by it. scanning restarts from that token
+        gap = self._gap
+        if gap > 0 and buf.ends[gap - 1] >= offset:
+            restart = bisect_left(buf.ends, offset, 0, gap) - 1
+        else:
+            restart = bisect_left(buf.ends, offset - self._shift, gap) - 1
+        first = max(restart, 0)
+        self._move_gap(first)
+        shift = self._shift
+
+        # the errors of the full scan were printed, re-scans only count theirs
+        scanner = Scanner(tabsize=self.tabsize, engine=self.engine, text=text, quiet=True)
+        if restart >= 0:
+            scanner.seek(buf.starts[restart] + shift, buf.lines[restart], buf.cols[restart] - 1)
+
+        # scan until a new token starts where an old token started in the
+        # unchanged text after the edit. the scanner is in the same state at
+        # both, so every token from there on is the same, only shifted
+        types, lines, cols, values, starts, ends = [], [], [], [], [], []
+        errors = array('i')
+        reported = 0
+        resync = len(buf)
+        for token in scanner.tokens():
+            start, end = scanner.tokenSpan()
+            if start >= edit_end:
+                old_start = start - delta - shift # as stored in the buffer
+                old = bisect_left(buf.starts, old_start, first)
+                if old < len(buf) and buf.starts[old] == old_start:
+                    resync = old
+                    break
+            types.append(token.type.value)
+            lines.append(token.line)
+            cols.append(token.col)
+            values.append(buf.intern(token.value))
+            starts.append(start)
+            ends.append(end)
+            errors.append(scanner.error_count - reported)
+            reported = scanner.error_count
+
+        # the resync token itself was scanned again, and the comments before it
+        # may have changed
+        if resync < len(buf):
+            self._error_count += scanner.error_count - reported - self.errors[resync]
+            self.errors[resync] = scanner.error_count - reported
+        self._error_count += sum(errors) - sum(self.errors[first:resync])
+        self.errors[first:resync] = errors
+        buf.has_errors = self._error_count > 0
+
+        # shift the tokens after the resync point. line numbers move by the
+        # newlines the edit added or removed, and columns only move for the
+        # rest of the line the edit was on
+        if resync < len(buf):
+            old_line = buf.lines[resync]
+            line_shift = token.line - old_line
+            col_shift = token.col - buf.cols[resync]
+            if col_shift:
+                index = resync
+                while index < len(buf) and buf.lines[index] == old_line:
+                    buf.cols[index] += col_shift
+                    index += 1
+            if line_shift:
+                buf.lines[resync:] = array('i', map(line_shift.__add__, buf.lines[resync:]))
+
+        # splice in the re-scanned tokens, which have exact offsets. the
+        # tokens after them carry the edit's shift as part of the gap
+        buf.types[first:resync] = array('i', types)
+        buf.lines[first:resync] = array('i', lines)
+        buf.cols[first:resync] = array('i', cols)
+        buf.values[first:resync] = array('i', values)
+        buf.starts[first:resync] = array('i', starts)
+        buf.ends[first:resync] = array('i', ends)
+        self._gap = first + len(types)
+        self._shift = shift + delta
+        return first, resync - first, len(types)
+
+if __name__ == '__main__':
+    import io
+    import random
+    import sys
+    from contextlib import redirect_stdout
+    from scanner import tokenize
+
+    def contents(buf):
+        return (list(buf.types), list(buf.lines), list(buf.cols), [buf.value_table[v] for v in buf.values],
+                list(buf.starts), list(buf.ends), buf.has_errors)
+
+    # random edits to a test program, each checked against a full rescan after each
+    with open("../test/correct/test1b.src") as fd:
+        text = fd.read()
+    rng = random.Random(0)
+    failed = False
+    for engine in ("char", "regex"):
+        disagree = 0
+        with redirect_stdout(io.StringIO()): # the scan errors of the edited texts
+            lexer = IncrementalLexer(text, engine=engine)
+            for i in range(1500):
+                # edits are undone by the next one, so errors they cause go away again
+                if i % 2 == 0:
+                    offset = rng.randrange(len(lexer.text) + 1)
+                    inserted = "".join(rng.choice('x 1"\\/*\n;') for _ in range(rng.randint(1, 2)))
+                    lexer.edit(offset, 0, inserted)
+                else:
+                    lexer.edit(offset, len(inserted), "")
+                lexer.flush()
+                if contents(lexer.buffer) != contents(tokenize(text=lexer.text, engine=engine)):
+                    disagree += 1
+        print("{} engine: {} of 1500 edits disagree with a full rescan".format(engine, disagree))
+        failed = failed or disagree > 0
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,35 @@
+## on disk cache of generated LLVM IR
+from disk_cache import DiskCache, modules_version
+
+#===================================================================================
+# stores the .ll text compiled from a source file. the key covers everything
+# the IR depends on: the source text, the compiler code, the builtin function
+# set and the target triple, so a hit can skip parsing and module building
+
+# modules whose code decides the IR a source compiles to
+IR_MODULES = ("tokens.py", "scanner.py", "parser.py", "parse_tree.py", "symbol_table.py", "constant_fold.py",
+              "semantic.py", "check.py", "codegen.py", "parallel.py")
+
+def compiler_version():
+    """ hash of the compiler code, any change to it invalidates the cache """
+    return modules_version(IR_MODULES)
+
+
+class IRCache(DiskCache):
+    """ a DiskCache of LLVM assembly text """
+    suffix = ".ll"
+
+    def key(self, source, builtins, triple, options=""):
+        """ cache key of the source text (bytes), builtin signatures, target triple and codegen options """
+        return self.make_key(compiler_version(), builtins, triple, options, source)
+
+    def load(self, key):
+        """ returns the IR text cached for key, or None on a miss """
+        data = self.read(key)
+        if data is None:
+            return None
+        return data.decode()
+
+    def store(self, key, ir_text):
+        """ cache the IR text under key """
+        self.write(key, ir_text.encode())
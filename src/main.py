@@ -1,13 +1,144 @@
+import io
+import os
+import sys
 from argparse import ArgumentParser
-from codegen import ProgramBuilder
+from contextlib import redirect_stdout
+from scanner import ENGINES
+from parser import STMT_ENGINES
+from check import ProgramChecker
+
+# output kinds, and the file suffix of each
+EMIT_SUFFIXES = {"llvm": ".ll", "asm": ".s", "obj": ".o"}
+OPT_LEVELS = (0, 1, 2, 3)
+
+def add_compiler_arguments(ap):
+    """ options shared by the single file and batch compilers """
+    ap.add_argument("--scanner", choices=ENGINES, default="char",
+                    help="tokenizer engine used by the scanner")
+    ap.add_argument("--compact-tokens", action="store_true",
+                    help="scan into a compact token buffer before parsing")
+    ap.add_argument("--parser", choices=STMT_ENGINES, default="recursive",
+                    help="parse nested statements and declarations recursively or on an explicit stack")
+    ap.add_argument("--parse-first", action="store_true",
+                    help="parse the whole program before generating code")
+    ap.add_argument("--ast-cache", metavar="DIR",
+                    help="cache parsed programs in DIR, implies --parse-first")
+    ap.add_argument("--ast-cache-mb", type=float, default=64,
+                    help="size limit of the AST cache in MB")
+    ap.add_argument("--ir-cache", metavar="DIR",
+                    help="cache the generated IR in DIR, unchanged sources skip compiling")
+    ap.add_argument("--ir-cache-mb", type=float, default=256,
+                    help="size limit of the IR cache in MB")
+    ap.add_argument("--cache-stats", action="store_true",
+                    help="print hit and miss statistics of the caches")
+    ap.add_argument("--emit", choices=EMIT_SUFFIXES, default="llvm",
+                    help="write LLVM assembly, or native assembly or an object file for this machine")
+    ap.add_argument("-O", dest="opt_level", type=int, choices=OPT_LEVELS, default=0,
+                    help="optimization level, runs the LLVM pass pipeline over the IR and for native code")
+    ap.add_argument("--link-runtime", action="store_true",
+                    help="link in the builtins written in IR, so they can be inlined")
+    ap.add_argument("--fold-constants", action="store_true",
+                    help="fold constant expressions and simplify identities before generating code")
+    ap.add_argument("--analyze", action="store_true",
+                    help="resolve names and check types in a pass before codegen, which then uses its annotations")
+    ap.add_argument("--procedure-jobs", metavar="N", type=int, nargs="?", const=os.cpu_count(),
+                    help="generate the top level procedures in N worker processes, the cpu count without N, "
+                         "each into its own module linked into the program. 0 splits them in this process")
+    ap.add_argument("--check", action="store_true",
+                    help="only scan, parse and check the program and report every error, without llvmlite")
+
+def make_caches(args):
+    """ the AST and IR caches of the compiler options, None for each that isn't used """
+    # the caches are only imported by the runs that use them
+    ast_cache = ir_cache = None
+    if args.ast_cache:
+        from ast_cache import ASTCache
+        ast_cache = ASTCache(args.ast_cache, max_bytes=int(args.ast_cache_mb * 1024 * 1024))
+    if args.ir_cache and not args.check:
+        from ir_cache import IRCache
+        ir_cache = IRCache(args.ir_cache, max_bytes=int(args.ir_cache_mb * 1024 * 1024))
+    return ast_cache, ir_cache
+
+def cache_summaries(builder):
+    """ the summary line of each cache a builder used """
+    if builder is None:
+        return []
+    return [cache.summary() for cache in (builder.ast_cache, builder.ir_cache) if cache is not None]
+
+def make_builder(input_fName, output_fName, args):
+    """ a ProgramBuilder set up from the compiler options, or a ProgramChecker with --check """
+    # llvmlite is only imported by the runs that build IR
+    ast_cache, ir_cache = make_caches(args)
+    if args.check:
+        return ProgramChecker(input_fName,
+                              scanner_engine=args.scanner,
+                              compact_tokens=args.compact_tokens,
+                              stmt_engine=args.parser,
+                              ast_cache=ast_cache)
+    from codegen import ProgramBuilder
+    return ProgramBuilder(input_fName, output_fName,
+                          scanner_engine=args.scanner,
+                          compact_tokens=args.compact_tokens,
+                          stmt_engine=args.parser,
+                          ast_cache=ast_cache,
+                          ir_cache=ir_cache,
+                          emit=args.emit,
+                          opt_level=args.opt_level,
+                          link_runtime=args.link_runtime,
+                          fold_constants=args.fold_constants,
+                          analyze=args.analyze,
+                          procedure_jobs=args.procedure_jobs)
+
+def compile_captured(input_fName, output_fName, args):
+    """
+    compile one file, collecting what the compiler prints instead of printing
+    it. returns (builder, ok, diagnostics), ok is False when the compiler
+    reported errors or failed
+    """
+    builder = None
+    out = io.StringIO()
+    with redirect_stdout(out):
+        try:
+            builder = make_builder(input_fName, output_fName, args)
+            builder.compile(parse_first=args.parse_first)
+            ok = not builder.has_errors()
+        except Exception as e: # pylint: disable=broad-except
+            # a compiler bug on one file shouldn't take down a batch or server
+            print("internal compiler error: {}: {}".format(type(e).__name__, e))
+            ok = False
+    return builder, ok, out.getvalue()
 
 def main():
     ap = ArgumentParser()
     ap.add_argument("inputFile")
-    ap.add_argument("outputFile")
+    ap.add_argument("outputFile", nargs="?", help="may be left out with --run")
+    add_compiler_arguments(ap)
+    ap.add_argument("--run", action="store_true",
+                    help="run the compiled program in process with the JIT")
     args = ap.parse_args()
-    codegen = ProgramBuilder(args.inputFile, args.outputFile)
-    codegen.generate_module_code()
+    if args.check and args.run:
+        ap.error("a program that is only checked cannot be run")
+    if args.outputFile is None and not (args.run or args.check):
+        ap.error("an output file is needed unless the program is run or checked")
+    codegen = make_builder(args.inputFile, args.outputFile, args)
+    codegen.compile(parse_first=args.parse_first)
+    if args.check and codegen.has_errors():
+        return 1
+    if args.run and not codegen.has_errors():
+        from runtime import run_ir, run_linked
+        try:
+            if args.link_runtime:
+                run_linked(codegen.ir_text, opt_level=args.opt_level)
+            else:
+                runtime = run_ir(codegen.ir_text, opt_level=args.opt_level)
+                if runtime.has_errors:
+                    return 1
+        except RuntimeError as e:
+            print("invalid IR, cannot run: {}".format(str(e).strip()))
+            return 1
+    if args.cache_stats:
+        for line in cache_summaries(codegen):
+            print(line)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
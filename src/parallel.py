@@ -0,0 +1,101 @@
+## generates the top level procedures of a program in worker processes, see ProgramBuilder(procedure_jobs)
+import pickle
+from concurrent import futures
+
+from llvmlite import ir, binding
+
+from symbol_table import SymbolTable, Symbol
+
+#===================================================================================
+# once a program is checked, the signature of every procedure is known, and a
+# top level procedure only depends on the globals and procedures declared in
+# the main module. runs of procedures are generated into modules of their own,
+# which declare what they use, and the modules are linked into the main module
+
+# name: (id_type, data type, IR name, IR type) of each global, procedure and
+# builtin of the main module, set in each worker by init_worker
+_externals = None
+_module_info = None # (module name, target triple)
+
+def program_externals(symbolTable):
+    """ the externals of the main module's symbol table, to pass to init_worker """
+    externals = {}
+    for symbol in symbolTable.top_level():
+        if symbol.id_type == 'function':
+            ir_type = symbol.value.function_type
+        else:
+            ir_type = symbol.value.value_type
+        externals[symbol.name] = (symbol.id_type, symbol.type, symbol.value.name, ir_type)
+    return externals
+
+
+class ExternalSymbols(SymbolTable):
+    """
+    symbol table of a procedure module. the globals, procedures and builtins
+    of the main module are declared in the module when they are first looked up
+    """
+
+    def __init__(self, module, externals):
+        SymbolTable.__init__(self)
+        self.module = module
+        self.externals = externals
+
+    def get(self, name):
+        symbol = SymbolTable.get(self, name)
+        if symbol == None and name in self.externals:
+            id_type, data_type, ir_name, ir_type = self.externals[name]
+            if id_type == 'function':
+                value = ir.Function(self.module, ir_type, name=ir_name)
+            else:
+                value = ir.GlobalVariable(self.module, ir_type, ir_name)
+            symbol = Symbol(name, value, data_type, id_type)
+            self.add(symbol, is_global=True)
+        return symbol
+
+def init_worker(module_name, triple, externals):
+    global _externals, _module_info
+    _externals = externals
+    _module_info = (module_name, triple)
+
+def generate_module(procedures):
+    """
+    generates pickled top level procedures, in order, into a module of their
+    own. returns (bitcode, errors), the bitcode is None when codegen reported errors
+    """
+    module = ir.Module(name=_module_info[0])
+    module.triple = _module_info[1]
+    symbolTable = ExternalSymbols(module, _externals)
+    errors = []
+    for data in procedures:
+        node = pickle.loads(data)
+        # a procedure makes its own builder, there is no enclosing function
+        if node.codegen(None, symbolTable, module) == None:
+            errors += node.getErrors()
+    if errors:
+        return None, errors
+    # parsed here rather than in the main process, which links the modules one at a time
+    return binding.parse_assembly(str(module)).as_bitcode(), []
+
+def generate_procedures(procedures, module_name, triple, externals, jobs):
+    """
+    generate_module for runs of consecutive pickled procedures, across jobs
+    worker processes, or in this process when jobs is 0. returns the results in order
+    """
+    # a few modules per worker, like the batch compiler's chunks. each module
+    # costs a parse and a link, so procedures don't get one each
+    n_modules = min(len(procedures), max(1, jobs) * 4)
+    runs = [procedures[len(procedures) * i // n_modules:len(procedures) * (i + 1) // n_modules]
+            for i in range(n_modules)]
+    if jobs == 0:
+        init_worker(module_name, triple, externals)
+        return [generate_module(run) for run in runs]
+    with futures.ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                     initargs=(module_name, triple, externals)) as pool:
+        return list(pool.map(generate_module, runs))
+
+def link(main_ir, modules):
+    """ LLVM assembly of the main module with the procedure modules, given as bitcode, linked in """
+    main = binding.parse_assembly(main_ir)
+    for bitcode in modules:
+        binding.link_modules(main, binding.parse_bitcode(bitcode))
+    return str(main)
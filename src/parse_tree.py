@@ -1,35 +1,167 @@
 ## this module builds a parse tree from the token stream
 
-## llvm codegen utils
-from llvmlite import ir
+## llvmlite is imported by the functions that build IR, parsing and checking never load it
 
 ## scanner and token code
-from token import tkn_type as tkn
-from token import Token
+from tokens import tkn_type as tkn
+from tokens import Token
 from scanner import Scanner
 from symbol_table import Symbol
 # ===========================================================================
 # define parse tree nodes
+# nodes use __slots__ instead of a per instance __dict__, and only allocate
+# their error list when an error is recorded, most nodes never have one
 class parseTreeNode():
+    __slots__ = ('line', '_errList')
+
     def __init__(self, line):
         self.line = line
-        self.errList = []
+        self._errList = None
+
+    @property
+    def errList(self):
+        """ list of (line, error) for this node and its children """
+        if self._errList is None:
+            self._errList = []
+        return self._errList
+
+    @errList.setter
+    def errList(self, errors):
+        self._errList = errors
 
     def getErrors(self):
         """ returns error string for this node and its children"""
-        return ["Error L{}: {}".format(line, error) for line, error in self.errList]
+        return ["Error L{}: {}".format(line, error) for line, error in self._errList or ()]
+
+    # pickled state is a tuple of the slot values, without the field names
+    # pickle would otherwise store for each node. error lists aren't kept
+    def __getstate__(self):
+        return tuple([getattr(self, field, None) for field in _state_fields(type(self))])
+
+    def __setstate__(self, state):
+        for field, value in zip(_state_fields(type(self)), state):
+            setattr(self, field, value)
+        self._errList = None
+
+_node_fields = {}
+
+def _state_fields(cls):
+    """ slots of a node class and its bases that are pickled """
+    fields = _node_fields.get(cls)
+    if fields is None:
+        fields = tuple(field for base in reversed(cls.__mro__)
+                       for field in getattr(base, "__slots__", ()) if field != "_errList")
+        _node_fields[cls] = fields
+    return fields
+
+# ===========================================================================
+# codegen helpers
+# variables live in memory: an alloca in the entry block of their function,
+# or a module global. every use loads and every assignment stores, and
+# mem2reg turns the allocas into SSA registers when optimizing
+
+# arrays with more elements are not allocas: in the program body they are
+# module globals, in procedures they are allocated on the heap on entry
+LARGE_ARRAY = 16384
+
+def function_body(func, entry_name="entry"):
+    """
+    adds an entry block, which only holds allocas and branches on to the
+    body block returned. code is built in the body, so allocas can be added
+    to the entry block at any time
+    """
+    from llvmlite import ir
+    entryBB = func.append_basic_block(name=entry_name)
+    bodyBB = func.append_basic_block(name="body")
+    ir.IRBuilder(entryBB).branch(bodyBB)
+    return bodyBB
+
+def entry_alloca(builder, ir_type, name):
+    """ alloca in the entry block of the current function, see function_body """
+    from llvmlite import ir
+    entry = builder.function.entry_basic_block
+    alloca_builder = ir.IRBuilder(entry)
+    alloca_builder.position_before(entry.terminator)
+    return alloca_builder.alloca(ir_type, name=name)
+
+def libc_function(module, name, ret, params):
+    """ the declaration of a libc function in module, added on first use """
+    from llvmlite import ir
+    func = module.globals.get(name)
+    if func == None:
+        func = ir.Function(module, ir.FunctionType(ret, params), name=name)
+    return func
+
+def entry_calloc(builder, module, ir_type, name):
+    """
+    zeroed heap memory for an array, allocated in the entry block of the
+    current function. free_heap_arrays frees it before each return
+    """
+    from llvmlite import ir
+    char_ptr = ir.PointerType(ir.IntType(8))
+    calloc = libc_function(module, "calloc", char_ptr, [ir.IntType(64), ir.IntType(64)])
+    entry = builder.function.entry_basic_block
+    entry_builder = ir.IRBuilder(entry)
+    entry_builder.position_before(entry.terminator)
+    size = ir.Constant(ir_type.element.as_pointer(), None).gep([ir.Constant(ir.IntType(32), 1)])
+    mem = entry_builder.call(calloc, [ir.Constant(ir.IntType(64), ir_type.count), size.ptrtoint(ir.IntType(64))])
+    return entry_builder.bitcast(mem, ir_type.as_pointer(), name=name)
+
+def free_heap_arrays(func, module):
+    """ frees the arrays entry_calloc allocated in func before each of its returns """
+    from llvmlite import ir
+    arrays = [instr for instr in func.entry_basic_block.instructions
+              if isinstance(instr, ir.CallInstr) and instr.callee.name == "calloc"]
+    if not arrays:
+        return
+    char_ptr = ir.PointerType(ir.IntType(8))
+    free = libc_function(module, "free", ir.VoidType(), [char_ptr])
+    for block in func.blocks:
+        if isinstance(block.terminator, ir.Ret):
+            builder = ir.IRBuilder(block)
+            builder.position_before(block.terminator)
+            for mem in arrays:
+                builder.call(free, [mem])
+
+def zero_fill(builder, module, ptr):
+    """ memset what ptr points to to zero, with its size as a constant expression """
+    from llvmlite import ir
+    char_ptr = ir.PointerType(ir.IntType(8))
+    memset = module.declare_intrinsic("llvm.memset", [char_ptr, ir.IntType(64)])
+    size = ir.Constant(ptr.type, None).gep([ir.Constant(ir.IntType(32), 1)]).ptrtoint(ir.IntType(64))
+    builder.call(memset, [builder.bitcast(ptr, char_ptr), ir.Constant(ir.IntType(8), 0), size,
+                          ir.Constant(ir.IntType(1), 0)])
+
+def convert(builder, value, from_type, to_type):
+    """ value of type from_type converted to to_type, None if there is no conversion """
+    from llvmlite import ir
+    if from_type == to_type:
+        return value
+    if from_type == tkn.INT_TYPE and to_type == tkn.FLOAT_TYPE:
+        return builder.sitofp(value, ir.FloatType(), name="floatTmp")
+    if from_type == tkn.FLOAT_TYPE and to_type == tkn.INT_TYPE:
+        return builder.fptosi(value, ir.IntType(32), name="intTmp")
+    if from_type == tkn.BOOL_TYPE and to_type == tkn.INT_TYPE:
+        return builder.zext(value, ir.IntType(32), name="intTmp")
+    if from_type == tkn.INT_TYPE and to_type == tkn.BOOL_TYPE:
+        return builder.icmp_signed("!=", value, ir.Constant(ir.IntType(32), 0), name="boolTmp")
+    return None
 
 class exprNode(parseTreeNode):
+    __slots__ = ('data_type',)
+
     def __init__(self):
         self.data_type = None
 
 class BinOpExpr(exprNode):
+    __slots__ = ('LHS', 'RHS', 'Op')
+
     def __init__(self, LHS, RHS, Op, line):
         self.LHS = LHS
         self.RHS = RHS
         self.Op = Op
         self.line = line
-        self.errList = []
+        self._errList = None
         self.data_type = None
 
     def __str__(self):
@@ -43,10 +175,6 @@ class BinOpExpr(exprNode):
         out += self.RHS.toString(level=level+1) if self.RHS else "None"
         return out
 
-    def _check_operand_types(self):
-        """ type check operands """
-        return True
-
     def codegen(self, builder, symbolTable, module=None):
         # codegen each operand and check for errors
         LHS_val = self.LHS.codegen(builder, symbolTable, module)
@@ -56,20 +184,8 @@ class BinOpExpr(exprNode):
 
         RHS_val = self.RHS.codegen(builder, symbolTable, module)
         if not RHS_val:
-            self.errList += self.LHS.errList
+            self.errList += self.RHS.errList
             return None
-        # handle array element extraction
-        if isinstance(self.LHS, VariableExpr):
-            if self.LHS.array_index != None:
-                index_val = self.LHS.array_index.codegen(builder, symbolTable, module)
-                LHS_ptr = builder.gep(LHS_val, [index_val], name="indexPtr")
-                LHS_val = builder.load(LHS_ptr, name="arrayElement")
-
-        if isinstance(self.RHS, VariableExpr):
-            if self.RHS.array_index != None:
-                index_val = self.RHS.array_index.codegen(builder, symbolTable, module)
-                RHS_ptr = builder.gep(RHS_val, [index_val], name="indexPtr")
-                RHS_val = builder.load(RHS_ptr, name="arrayElement")
 
         # check operands for type compatability, then
         # call llvm codegen for given operator and operand types
@@ -112,7 +228,7 @@ class BinOpExpr(exprNode):
 
             if self.RHS.data_type == tkn.INT_TYPE:
                 ir_type = symbolTable.get_ir_type(tkn.FLOAT_TYPE)  
-                RHS_val = builder.sitofp(LHS_val, ir_type, name="floatTmp")
+                RHS_val = builder.sitofp(RHS_val, ir_type, name="floatTmp")
             # FLOAT Operations
             self.data_type = tkn.FLOAT_TYPE
             if self.Op == tkn.OP_ADD:
@@ -120,7 +236,7 @@ class BinOpExpr(exprNode):
             elif self.Op == tkn.OP_SUB:
                 return builder.fsub(LHS_val, RHS_val, name="floatTmp")
             elif self.Op == tkn.OP_MUL:
-                return builder.fMul(LHS_val, RHS_val, name="floatTmp")
+                return builder.fmul(LHS_val, RHS_val, name="floatTmp")
             elif self.Op == tkn.OP_DIV:
                 return builder.fdiv(LHS_val, RHS_val, name="floatTmp")
             elif self.Op in relation_ops.keys():
@@ -137,18 +253,8 @@ class BinOpExpr(exprNode):
             # strings are basically character arrays.
             if self.Op == tkn.OP_EQ:
                 self.data_type = tkn.BOOL_TYPE
-                args = []
-                # parse params for string comparison function
-                for param, p_val in [(self.LHS, LHS_val), (self.RHS, RHS_val)]:
-                    if isinstance(param, LiteralExpr) and param.data_type == tkn.STRING_TYPE:
-                        # create a tmp variable to pass the string literal
-                        varName = symbolTable.get_unique_name()
-                        valuePtr = ir.GlobalVariable(module, ir.IntType(8), varName)
-                        valuePtr.initializer = p_val
-                        p_val = valuePtr
-                    args.append(p_val)
                 func = symbolTable.get("main.StringEquals").value
-                return builder.call(func, args, name="boolTmp")
+                return builder.call(func, [LHS_val, RHS_val], name="boolTmp")
 
         elif self.LHS.data_type == tkn.BOOL_TYPE and \
              self.RHS.data_type == tkn.BOOL_TYPE:
@@ -170,11 +276,13 @@ class BinOpExpr(exprNode):
         return None
 
 class UnaryOpExpr(exprNode):
+    __slots__ = ('Op', 'expr')
+
     def __init__(self, Op, expr, line):
         self.Op = Op
         self.expr = expr
         self.line = line
-        self.errList = []
+        self._errList = None
         self.data_type = None
 
     def toString(self, level=0):
@@ -189,14 +297,6 @@ class UnaryOpExpr(exprNode):
         if expr_val == None:
             self.errList += self.expr.errList
             return None
-        
-        # handle array element extraction
-        if isinstance(self.expr, VariableExpr):
-            if self.expr.array_index != None:
-                index_val = self.expr.array_index.codegen(builder, symbolTable, module)
-                expr_ptr = builder.gep(expr_val, [index_val], name="indexPtr")
-                expr_val = builder.load(expr_ptr, name="arrayElement")
-                # expr_val = builder.extract_value(expr_val, int(self.expr.array_index.value), name="itemTmp")
 
         # check types and codegen
         self.data_type = self.expr.data_type
@@ -206,7 +306,7 @@ class UnaryOpExpr(exprNode):
             elif self.expr.data_type == tkn.FLOAT_TYPE:
                 return builder.fneg(expr_val, name="floatTmp")
             else:
-                self.errList.append(self.line, "non numeric types cannot be negative")
+                self.errList.append((self.line, "non numeric types cannot be negative"))
                 return None
         elif self.Op == tkn.BOOL_NOT:
             if self.expr.data_type == tkn.INT_TYPE:
@@ -214,17 +314,20 @@ class UnaryOpExpr(exprNode):
             elif self.expr.data_type == tkn.BOOL_TYPE:
                 return builder.not_(expr_val, name="boolTmp")
             else:
-                self.errList.append(self.line, "operation 'NOT' must have operand of type integer or bool")
+                self.errList.append((self.line, "operation 'NOT' must have operand of type integer or bool"))
                 return None
 
 class VariableExpr(exprNode):
+    __slots__ = ('name', 'array_index', 'has_negative', 'symbol')
+
     def __init__(self, name, data_type, line, array_index=None, has_negative=False):
         self.name = name
         self.array_index = array_index
         self.has_negative = has_negative
         self.line = line
-        self.errList = []
+        self._errList = None
         self.data_type = None
+        self.symbol = None # set by semantic.Checker
 
     def __str__(self):
         return self.toString()
@@ -235,19 +338,46 @@ class VariableExpr(exprNode):
             out += " index={}".format(self.array_index)
         return out
 
-    def codegen(self, builder, symbolTable, module=None):
-        res = symbolTable.get(self.name)
+    def address(self, builder, symbolTable, module=None):
+        """ pointer to the variable, or to the element of an array variable """
+        from llvmlite import ir
+        res = self.symbol
         if res == None:
-            self.errList.append((self.line, "variable {} is undefined".format(self.name)))
+            res = symbolTable.get(self.name)
+            if res == None or res.id_type == 'function':
+                self.errList.append((self.line, "variable {} is undefined".format(self.name)))
+                return None
+            # locals of an enclosing procedure or the program body live in another function's frame
+            if res.function is not None and res.function is not builder.function:
+                self.errList.append((self.line, "variable {} is not visible in this procedure".format(self.name)))
+                return None
+            self.data_type = res.type
+        ptr = res.value
+
+        if self.array_index != None:
+            if res.id_type != 'array':
+                self.errList.append((self.line, "variable {} is not an array".format(self.name)))
+                return None
+            index_val = self.array_index.codegen(builder, symbolTable, module)
+            if index_val == None:
+                self.errList += self.array_index.errList
+                return None
+            ptr = builder.gep(ptr, [ir.Constant(ir.IntType(32), 0), index_val], name="indexPtr")
+        return ptr
+
+    def codegen(self, builder, symbolTable, module=None):
+        ptr = self.address(builder, symbolTable, module)
+        if ptr == None:
             return None
-        self.data_type = res.type
-        return res.value
+        return builder.load(ptr, name=self.name)
 
 class LiteralExpr(exprNode):
+    __slots__ = ('value',)
+
     def __init__(self, value, data_type, line):
         self.value = value
         self.line = line
-        self.errList = []
+        self._errList = None
         self.data_type = data_type
 
     def __str__(self):
@@ -257,6 +387,7 @@ class LiteralExpr(exprNode):
         return "Literal {}: value={}".format(self.data_type, self.value)
 
     def codegen(self, builder, symbolTable, module=None):
+        from llvmlite import ir
 
         ir_type = symbolTable.get_ir_type(self.data_type)
         if self.data_type == tkn.INT_TYPE:
@@ -266,19 +397,26 @@ class LiteralExpr(exprNode):
         elif self.data_type == tkn.BOOL_TYPE:
             val = 0 if self.value == "false" else 1
         elif self.data_type == tkn.STRING_TYPE:
-            val = self.value
+            # a constant nul terminated char array, the value is a pointer to its start
+            data = self.value[1:-1].encode() + b"\0" # without the quotes
+            var = symbolTable.get_string_constant(module, data)
+            zero = ir.Constant(ir.IntType(32), 0)
+            return var.gep([zero, zero])
         else:
             self.errList.append((self.line, "literal value has an undefined type"))
             return None
         return ir.Constant(ir_type, val)
         
 class CallExpr(exprNode):
+    __slots__ = ('name', 'params', 'symbol')
+
     def __init__(self, name, line):
         self.name = name
         self.params = []
         self.line = line
-        self.errList = []
+        self._errList = None
         self.data_type = None
+        self.symbol = None # set by semantic.Checker
 
     def __str__(self):
         return self.toString()
@@ -292,44 +430,50 @@ class CallExpr(exprNode):
 
     def codegen(self, builder, symbolTable, module=None):
         
-        # get function ref
-        func = symbolTable.get(self.name)
-        if func == None or func.value == None:
-            self.errList.append((self.line, "function {} is undefined".format(self.name)))
+        # get function ref, checked already when the call is annotated
+        if self.symbol != None:
+            func = self.symbol.value
+        else:
+            func = symbolTable.get(self.name)
+            if func == None or func.value == None:
+                self.errList.append((self.line, "function {} is undefined".format(self.name)))
+                return None
+            self.data_type = func.type
+            func = func.value
+        if len(self.params) != len(func.args):
+            self.errList.append((
+                self.line,
+                "passed {} arguments to function {}, expected {}".format(
+                    len(self.params),
+                    self.name,
+                    len(func.args))))
             return None
-        self.data_type = func.type
-        func = func.value
+
         args = []
-        for param in self.params:
-            # check type of arg matches expected type
+        for param, arg in zip(self.params, func.args):
             p_val = param.codegen(builder, symbolTable, module)
-            if isinstance(param, LiteralExpr) and param.data_type == tkn.STRING_TYPE:
-                # create a tmp variable to pass the string literal
-                varName = symbolTable.get_unique_name()
-                valuePtr = ir.GlobalVariable(module, ir.IntType(8), varName)
-                valuePtr.initializer = p_val
-                p_val = valuePtr
-
             if p_val == None:
                 self.errList += param.errList
                 return None
+            # check type of arg matches expected type
+            arg_type = symbolTable.get_data_type(arg.type)
+            if arg_type != None:
+                p_val = convert(builder, p_val, param.data_type, arg_type)
+                if p_val == None:
+                    self.errList.append((self.line, "argument {} of {} should be of type {}, not {}".format(
+                        arg.name, self.name, arg_type, param.data_type)))
+                    return None
             args.append(p_val)
-    
-        if len(args) != len(func.args):
-            self.errList.append(
-                self.line, 
-                "passed {} arguments to function {}, expected {}".format(
-                    len(args),
-                    self.name,
-                    len(func.args)))
 
         return builder.call(func, args, name="res")
 
 class returnExpr(exprNode):
+    __slots__ = ('expr',)
+
     def __init__(self, expr, line):
         self.expr = expr
         self.line = line
-        self.errList = []
+        self._errList = None
 
     def __str__(self):
         return self.toString()
@@ -347,17 +491,25 @@ class returnExpr(exprNode):
             return None
         
         if builder.block.is_terminated:
-            self.errList.append(self.line, "return after termination of code block")
+            self.errList.append((self.line, "return after termination of code block"))
             return None
 
-        return builder.ret(expr_val)
+        ret_type = symbolTable.get_data_type(builder.function.function_type.return_type)
+        ret_val = convert(builder, expr_val, self.expr.data_type, ret_type)
+        if ret_val == None:
+            self.errList.append((self.line, "cannot return {} from a procedure of type {}".format(
+                self.expr.data_type, ret_type)))
+            return None
+        return builder.ret(ret_val)
 
 class AssignmentNode(parseTreeNode):
+    __slots__ = ('expr', 'dest')
+
     def __init__(self, destination, expression, line):
         self.expr = expression
         self.dest = destination
         self.line = line
-        self.errList = []
+        self._errList = None
 
     def __str__(self):
         return self.toString()
@@ -371,51 +523,36 @@ class AssignmentNode(parseTreeNode):
         return out
 
     def codegen(self, builder, symbolTable, module=None):
-        # check that dest is defined
-        dest_val = self.dest.codegen(builder, symbolTable, module)
-        dest_name = self.dest.name
-        if dest_val == None:
+        # check that dest is defined, and get the address to store to
+        dest_ptr = self.dest.address(builder, symbolTable, module)
+        if dest_ptr == None:
             self.errList += self.dest.errList
             return None
-        
+
         # evaluate expr
         expr_val = self.expr.codegen(builder, symbolTable, module)
         if expr_val == None:
             self.errList += self.expr.errList
             return None
 
-        # handle case that expr is an element of an array
-        if isinstance(self.expr, VariableExpr):
-            if self.expr.array_index != None:
-                index_val = self.expr.array_index.codegen(builder, symbolTable, module)
-                expr_ptr = builder.gep(expr_val, [index_val], name="indexPtr")
-                expr_val = builder.load(expr_ptr, name="arrayElement")
-                # expr_val = builder.extract_value(expr_val, int(self.expr.array_index.value), name="itemTmp")
-
-        # handle case that dest is an element of an array
-        if isinstance(self.dest, VariableExpr):
-            if self.dest.array_index != None:
-                # dest_val does not get overwritten here bc the array pointer hasn't changed
-                index_val = self.dest.array_index.codegen(builder, symbolTable, module)
-                dest_ptr = builder.gep(dest_val, [index_val], name="destIndexPtr")
-                builder.store(expr_val, dest_ptr)
-                # dest_val = builder.insert_value(dest_val, expr_val, int(self.dest.array_index.value), name="arrayTmp")
-
-        symbol = Symbol(dest_name, expr_val, self.dest.data_type)
-        if not symbolTable.update(symbol):
-            self.errList.append((self.line, "could not update symbol {}".format(dest_name)))
+        value = convert(builder, expr_val, self.expr.data_type, self.dest.data_type)
+        if value == None or value.type != dest_ptr.type.pointee:
+            self.errList.append((self.line, "cannot assign {} to variable {} of type {}".format(
+                self.expr.data_type, self.dest.name, self.dest.data_type)))
             return None
-        else:
-            return expr_val
+        return builder.store(value, dest_ptr)
 
 class declarationNode(parseTreeNode):
+    __slots__ = ('name', 'type', 'is_global', 'array_size', 'symbol')
+
     def __init__(self, name, data_type, line, is_global=False, array_size=None):
         self.name = name
         self.type = data_type
         self.is_global = is_global
         self.array_size = array_size # None if var is not an array
         self.line = line
-        self.errList = []
+        self._errList = None
+        self.symbol = None # set by semantic.Checker
 
     def __str__(self):
         return self.toString()
@@ -427,43 +564,61 @@ class declarationNode(parseTreeNode):
         return out
 
     def codegen(self, builder, symbolTable, module=None):
+        from llvmlite import ir
 
         ir_type = symbolTable.get_ir_type(self.type)
-        if self.type == tkn.STRING_TYPE:
-            val = ""
-            if self.array_size == None:
-                # all strings are arrays O_O join us.
-                self.array_size = LiteralExpr(1, tkn.INT_TYPE, self.line)
-        else:
-            val = 0
-
         id_type = "variable"
-        initial_val = ir.Constant(ir_type, val)
-        
         if self.array_size != None:
+            # arrays start out as all zero bits, whatever their size. for strings
+            # that is the null pointer, which the builtins read as the empty string
             id_type = "array"
             array_size = int(self.array_size.value)
-            arr_val = ir.Constant.literal_array([initial_val for _ in range(int(self.array_size.value))])
-            initial_val = builder.alloca(ir_type, array_size, name="arrayPtr")
-            initial_tmp_ptr = builder.bitcast(initial_val, ir.PointerType(ir.ArrayType(ir_type, array_size)))
-            builder.store(arr_val, initial_tmp_ptr)
+            ir_type = ir.ArrayType(ir_type, array_size)
+            initial_val = ir.Constant(ir_type, None)
+        elif self.type == tkn.STRING_TYPE:
+            # strings are char pointers, and start out as the empty string
+            initial_val = LiteralExpr('""', tkn.STRING_TYPE, self.line).codegen(builder, symbolTable, module)
+        else:
+            initial_val = ir.Constant(ir_type, 0)
+
+        # globals are module variables, and so are large arrays of the program
+        # body, which only runs once. large arrays of procedures go on the heap,
+        # so deep frames can't overflow the stack. everything else is stored in its function's frame
+        if self.is_global:
+            ptr = ir.GlobalVariable(module, ir_type, module.get_unique_name("global." + self.name))
+            ptr.initializer = initial_val
+        elif id_type == "array" and array_size > LARGE_ARRAY and builder.function.name == "main":
+            ptr = ir.GlobalVariable(module, ir_type, module.get_unique_name("main." + self.name))
+            ptr.linkage = "private"
+            ptr.initializer = initial_val
+        elif id_type == "array" and array_size > LARGE_ARRAY:
+            ptr = entry_calloc(builder, module, ir_type, self.name)
+        else:
+            ptr = entry_alloca(builder, ir_type, self.name)
+            if id_type == "array":
+                zero_fill(builder, module, ptr)
+            else:
+                builder.store(initial_val, ptr)
+        if self.symbol != None:
+            self.symbol.value = ptr
 
-        symbol = Symbol(self.name, initial_val, self.type, id_type)
-        
+        symbol = Symbol(self.name, ptr, self.type, id_type, function=None if self.is_global else builder.function)
         if symbolTable.add(symbol, is_global=self.is_global):
-            return initial_val
+            return ptr
         else:
             err_msg = "duplicate declaration of variable '{}'".format(self.name)
             self.errList.append((self.line, err_msg))
             return None
 
 class IfNode(parseTreeNode):
+    __slots__ = ('condition', 'thenBlock', 'elseBlock')
+
     def __init__(self, condition, line):
         self.condition = condition
         self.thenBlock = []
         self.elseBlock = None
         self.line = line
-        self.errList = []
+        self._errList = None
 
     def __str__(self):
         return self.toString()
@@ -487,18 +642,24 @@ class IfNode(parseTreeNode):
         if cond_val == None:
             self.errList += self.condition.errList
             return None
+        cond_val = convert(builder, cond_val, self.condition.data_type, tkn.BOOL_TYPE)
+        if cond_val == None:
+            self.errList.append((self.line, "if condition must be a bool or an integer"))
+            return None
 
         thenBB = builder.append_basic_block(name="thenBlock")
         mergeBB = builder.append_basic_block(name="mergeBlock")
+        has_errors = False
         if self.elseBlock != None:
             # create else block and add branch
             elseBB = builder.append_basic_block(name="elseblock")
             builder.cbranch(cond_val, thenBB, elseBB)
             # codegen else block
-            builder.position_at_start(elseBB)
+            builder.position_at_end(elseBB)
             for statement in self.elseBlock: # pylint: disable=not-an-iterable
                 res = statement.codegen(builder, symbolTable, module)
                 if res == None:
+                    has_errors = True
                     self.errList += statement.errList
             # branch to merge block at end of else
             if not builder.block.is_terminated: 
@@ -507,25 +668,28 @@ class IfNode(parseTreeNode):
             # add branch that without else block
             builder.cbranch(cond_val, thenBB, mergeBB)
         # codegen for then block
-        builder.position_at_start(thenBB)
+        builder.position_at_end(thenBB)
         for statement in self.thenBlock: # pylint: disable=not-an-iterable
             res = statement.codegen(builder, symbolTable, module)
             if res == None:
+                has_errors = True
                 self.errList += statement.errList
         # branch to merge block at end of then block
         # check in case a return statement terminates the block
         if not builder.block.is_terminated: 
             builder.branch(mergeBB)
-        builder.position_at_start(mergeBB)
-        return cond_val
+        builder.position_at_end(mergeBB)
+        return None if has_errors else cond_val
 
 class LoopNode(parseTreeNode):
+    __slots__ = ('start', 'end', 'body')
+
     def __init__(self, start, end, line):
         self.start = start
         self.end = end
         self.body = []
         self.line = line
-        self.errList = []
+        self._errList = None
 
     def __str__(self):
         return self.toString()
@@ -542,47 +706,59 @@ class LoopNode(parseTreeNode):
         return out
 
     def codegen(self, builder, symbolTable, module=None):
-        # evaluate start and end statements
+        # evaluate the start statement once
         start_val = self.start.codegen(builder, symbolTable, module)
         if start_val == None:
             self.errList += self.start.errList
             return None
-        
-        end_val = self.end.codegen(builder, symbolTable, module)
-        if end_val == None:
-            self.errList += self.end.errList
-            return None
 
-        # create loop blocks  
+        # create loop blocks
+        condBB = builder.append_basic_block(name="loopCond")
         loopBB = builder.append_basic_block(name="loopBody")
         mergeBB = builder.append_basic_block(name="loopMerge")
+        builder.branch(condBB)
 
-        # add initial loop condition
+        # the condition is evaluated again before every iteration
+        builder.position_at_end(condBB)
+        end_val = self.end.codegen(builder, symbolTable, module)
+        if end_val == None:
+            self.errList += self.end.errList
+            return None
+        end_val = convert(builder, end_val, self.end.data_type, tkn.BOOL_TYPE)
+        if end_val == None:
+            self.errList.append((self.line, "loop condition must be a bool or an integer"))
+            return None
         builder.cbranch(end_val, loopBB, mergeBB)
 
         # codegen for loop block
-        builder.position_at_start(loopBB)
-
+        builder.position_at_end(loopBB)
+        has_errors = False
         for statement in self.body:
             res = statement.codegen(builder, symbolTable, module)
             if res == None:
+                has_errors = True
                 self.errList += statement.errList
 
-        # add branch and move to block outside of loop
-        builder.cbranch(end_val, loopBB, mergeBB)
-        builder.position_at_start(mergeBB)
+        # branch back to the condition and move to block outside of loop
+        if not builder.block.is_terminated:
+            builder.branch(condBB)
+        builder.position_at_end(mergeBB)
 
-        return start_val
+        return None if has_errors else start_val
 
 
 class functionNode(parseTreeNode):
+    __slots__ = ('name', 'retType', 'params', 'body', 'is_global', 'symbol')
+
     def __init__(self, name, retType, params, line):
         self.name = name
         self.retType = retType
         self.params = params
         self.body = []
+        self.is_global = False
         self.line = line
-        self.errList = []
+        self._errList = None
+        self.symbol = None # set by semantic.Checker
 
     def __str__(self):
         return self.toString()
@@ -597,7 +773,9 @@ class functionNode(parseTreeNode):
             out += statement.toString(level+2) if statement else "None"
         return out
 
-    def codegen(self, builder, symbolTable, module):
+    def declare(self, symbolTable, module):
+        """ adds the function, without a body, to the module and the symbol table. None for a duplicate """
+        from llvmlite import ir
 
         # generate function unique identifier (qualified by namespace) 
         ns = symbolTable.getNameSpace()
@@ -608,24 +786,41 @@ class functionNode(parseTreeNode):
         func = ir.Function(module, fType, name=unique_name)
         for i in range(len(self.params)):
             func.args[i].name = self.params[i].name
+        if self.symbol != None:
+            self.symbol.value = func
         
         # add func to symboltable
         symbol = Symbol(self.name, func, self.retType, id_type='function', unique_name=unique_name)
         if not symbolTable.add(symbol):
-            self.errList.append(self.line, "duplicate declaration")
+            self.errList.append((self.line, "duplicate declaration"))
+            return None
+        return func
+
+    def codegen(self, builder, symbolTable, module):
+        from llvmlite import ir
+
+        func = self.declare(symbolTable, module)
+        if func == None:
             return None
+        unique_name = func.name
+
+        # make new function builder and add entry
+        func_builder = ir.IRBuilder(function_body(func, "funcEntry"))
 
-        # add function's local scope and populate with params
+        # add function's local scope and populate with params, which are
+        # copied into the frame so they can be assigned like other locals
         symbolTable.pushLocal(unique_name)
         for i, var in enumerate(func.args):
-            symbol = Symbol(self.params[i].name, var, self.params[i].type)
+            ptr = entry_alloca(func_builder, var.type, var.name + ".addr")
+            func_builder.store(var, ptr)
+            if self.params[i].symbol != None:
+                self.params[i].symbol.value = ptr
+            symbol = Symbol(self.params[i].name, ptr, self.params[i].type, function=func)
             if not symbolTable.add(symbol):
-                self.errList.append(self.line, "duplicate parameter declaration")
+                symbolTable.popLocal()
+                self.errList.append((self.line, "duplicate parameter declaration"))
                 return None
 
-        # make new function builder and add entry
-        entryBB = func.append_basic_block(name="funcEntry")
-        func_builder = ir.IRBuilder(entryBB) 
         has_errors = False
         for statement in self.body:
             res = statement.codegen(func_builder, symbolTable, module)
@@ -636,8 +831,32 @@ class functionNode(parseTreeNode):
         # remove local scope and handle errors
         symbolTable.popLocal()
         if has_errors:
-            self.errList += statement.errList
             return None
         elif not func_builder.block.is_terminated:
             self.errList.append((self.line, "expected return statement before end of function"))
-        return func
\ No newline at end of file
+            return None
+        free_heap_arrays(func, module)
+        return func
+
+class Program(parseTreeNode):
+    """ a whole program: its name, top level declarations and statements """
+    __slots__ = ('name', 'declarations', 'statements')
+
+    def __init__(self, name, line):
+        self.name = name
+        self.declarations = []
+        self.statements = []
+        self.line = line
+        self._errList = None
+
+    def __str__(self):
+        return self.toString()
+
+    def toString(self, level=0):
+        out = "program {}".format(self.name)
+        for declaration in self.declarations:
+            out += "\n" + (level+1) * (7*" ") + declaration.toString(level+1)
+        out += "\n" + level * (7*" ") + "begin"
+        for statement in self.statements:
+            out += "\n" + (level+1) * (7*" ") + statement.toString(level+1)
+        return out
@@ -1,17 +1,97 @@
-from token import tkn_type as tkn
-from token import Token
-from scanner import Scanner
+from tokens import tkn_type as tkn
+import os
+from collections import deque
+from tokens import Token, TokenBuffer
+from scanner import Scanner, tokenize
 from parse_tree import * # pylint: disable=unused-wildcard-import
 # ================================================================================
 #  Parser Module
 # ================================================================================
 # builds the parse tree data structure from the token stream
+
+# binding power of the binary operators for the operator precedence expression
+# parser, higher binds tighter. the levels follow the recursive <expression>,
+# <arithOp>, <relation> and <term> rules, and like them every level is right
+# associative: a - b - c parses as a - (b - c)
+binary_operators = {
+    tkn.BOOL_AND : 1,
+    tkn.BOOL_OR  : 1,
+    tkn.OP_ADD   : 2,
+    tkn.OP_SUB   : 2,
+    tkn.OP_LT    : 3,
+    tkn.OP_GE    : 3,
+    tkn.OP_LE    : 3,
+    tkn.OP_GT    : 3,
+    tkn.OP_EQ    : 3,
+    tkn.OP_NE    : 3,
+    tkn.OP_MUL   : 4,
+    tkn.OP_DIV   : 4,
+}
+# lowest binding power of a binary operator inside the operand of a prefix
+# operator. NOT takes an <arithOp>, a negative sign takes a single factor
+prefix_operators = {
+    tkn.BOOL_NOT : 2,
+    tkn.OP_SUB   : 5,
+}
+
+EXPR_ENGINES = ("pratt", "recursive")
+STMT_ENGINES = ("recursive", "iterative")
+
 class Parser():
-    def __init__(self, fName):
-        self.scanner = Scanner(fName)
-        self.token = self.scanner.getToken()
-        self._next_token = self.scanner.getToken()
+    def __init__(self, fName=None, engine="char", compact=False, tokens=None,
+                 expr_engine="pratt", stmt_engine="recursive"):
+        """
+        parses the file fName, or the tokens given by a TokenBuffer or any
+        iterable of Tokens that ends with EOF, such as Scanner.tokens().
+        expressions are parsed with the operator precedence parser, or the
+        recursive descent rules when expr_engine is "recursive". statements
+        and declarations nest on the python stack, or on an explicit stack
+        when stmt_engine is "iterative"
+        """
+        if expr_engine not in EXPR_ENGINES:
+            raise ValueError("unknown expression engine: {}".format(expr_engine))
+        if stmt_engine not in STMT_ENGINES:
+            raise ValueError("unknown statement engine: {}".format(stmt_engine))
+        if expr_engine == "pratt":
+            self._parseNT_expression = self._parse_expression_pratt
+        if stmt_engine == "iterative":
+            self._parseNT_statement = self._parse_statement_iterative
+            self._parseNT_declaration = self._parse_declaration_iterative
+
+        self.scanner = None
+        if tokens is None:
+            if compact:
+                # scan the whole file into a compact token buffer up front
+                tokens = tokenize(fName, engine=engine)
+            else:
+                self.scanner = Scanner(fName, engine=engine)
+        self.tokens = tokens
+        self._lookahead = deque() # tokens read past _next_token by peek_token
+
+        if isinstance(tokens, TokenBuffer):
+            # walk the buffer with two cursors instead of a Token per lexeme
+            self._last_index = len(tokens) - 1
+            self.token = tokens.cursor(0)
+            self._next_token = tokens.cursor(min(1, self._last_index))
+            self.next_token = self._next_buffered_token
+            self.peek_token = self._peek_buffered_token
+        else:
+            if tokens is None:
+                self._read_token = self.scanner.getToken
+            else:
+                self._token_iter = iter(tokens)
+                self._eof_token = None
+                self._read_token = self._read_iter_token
+            self.token = self._read_token()
+            self._next_token = self._read_token()
         self._has_errors = False 
+        self._has_warnings = False
+
+    def has_scan_errors(self):
+        """ checks for errors reported while scanning the token source """
+        if self.scanner is not None:
+            return self.scanner._has_errors
+        return getattr(self.tokens, "has_errors", False)
 
     def reportError(self, message):
         print("Error L{}, C{}: {}".format(self.token.line, self.token.col, message))
@@ -19,6 +99,7 @@ class Parser():
 
     def reportWarning(self, message):
         print("Warning L{}, C{}: {}".format(self.token.line, self.token.col, message))
+        self._has_warnings = True
 
 
     def reportUnexpectedToken(self, expected):
@@ -26,7 +107,41 @@ class Parser():
 
     def next_token(self):
         self.token = self._next_token
-        self._next_token = self.scanner.getToken()
+        if self._lookahead:
+            self._next_token = self._lookahead.popleft()
+        else:
+            self._next_token = self._read_token()
+
+    def peek_token(self, k=1):
+        """ look k tokens ahead, peek_token(0) is the current token """
+        if k == 0:
+            return self.token
+        while len(self._lookahead) < k - 1:
+            self._lookahead.append(self._read_token())
+        return self._next_token if k == 1 else self._lookahead[k - 2]
+
+    def _read_iter_token(self):
+        """ read from a token iterable, repeating EOF once it is exhausted """
+        token = next(self._token_iter, None)
+        if token is None:
+            return self._eof_token
+        if token.type == tkn.EOF:
+            self._eof_token = token
+        return token
+
+    def _next_buffered_token(self):
+        """ next_token for a token buffer, the cursors stop at EOF """
+        self.token.index = self._next_token.index
+        if self._next_token.index < self._last_index:
+            self._next_token.index += 1
+
+    def _peek_buffered_token(self, k=1):
+        """ peek_token for a token buffer """
+        if k == 0:
+            return self.token
+        elif k == 1:
+            return self._next_token
+        return self.tokens.cursor(min(self.token.index + k, self._last_index))
     
     def token_is(self, tkn_type, consume=False):
         res = self.token.type == tkn_type
@@ -97,6 +212,31 @@ class Parser():
             return res
 
 
+    def parse_program(self):
+        """
+        parses the whole program into a Program node, returns None if the
+        program header is invalid. declarations and statements that failed
+        to parse are left out
+        """
+        line = self.token.line
+        name = self.parse_program_header()
+        if not name:
+            return None
+        program = Program(name, line)
+
+        res = self.parse_top_level_declaration()
+        while res not in (tkn.BEGIN, tkn.EOF):
+            if res != None:
+                program.declarations.append(res)
+            res = self.parse_top_level_declaration()
+
+        res = self.parse_top_level_statement()
+        while res != tkn.EOF:
+            if res != None:
+                program.statements.append(res)
+            res = self.parse_top_level_statement()
+        return program
+
     def parse_program_header(self):
         """
         <program_header> --> PROGRAM <identifier> IS
@@ -153,11 +293,43 @@ class Parser():
     def _parseNT_procedure_declaration(self):
         """
         <procedure_declaration> --> <procedure_header> <procedure_body>
-        <procedure_header> --> PROCEDURE <identifier> COLON <type_mark> LEFT_PAREN [<parameter_list>] RIGHT_PAREN
         """
+        func, err = self._parseNT_procedure_header()
+        if func == None:
+            return None, err
 
-        ## Procedure Header
+        ## Procedure Body
+
+        # declarations
+        while not self.token_is(tkn.BEGIN, consume=True):
+            if self.token_is(tkn.EOF):
+                self.reportError("unexpected EOF")
+                return func, True
+            elif self.token_is(tkn.END):
+                self.reportError("unexpected 'end' token")
+                return func, True
+            
+            res, err = self._parseNT_declaration()
+            func.body.append(res) # append result to function body
+
+        # statements
+        while not self.token_is(tkn.END, consume=True):
+            if self.token_is(tkn.EOF):
+                self.reportError("unexpected EOF")
+                return func, True
+
+            res, err = self._parseNT_statement()
+            func.body.append(res)
 
+        if not self.token_is(tkn.PROCEDURE, consume=True):
+            self.reportUnexpectedToken(expected='procedure')
+        
+        return func, False
+
+    def _parseNT_procedure_header(self):
+        """
+        <procedure_header> --> PROCEDURE <identifier> COLON <type_mark> LEFT_PAREN [<parameter_list>] RIGHT_PAREN
+        """
         if not self.token_is(tkn.PROCEDURE, consume=True):
             return None, False # not a procedure declaration
     
@@ -197,35 +369,7 @@ class Parser():
                 self.reportUnexpectedToken(expected=')')
                 return None, True
 
-        func = functionNode(procedure_name, ret_type, params, line=line)        
-
-        ## Procedure Body
-
-        # declarations
-        while not self.token_is(tkn.BEGIN, consume=True):
-            if self.token_is(tkn.EOF):
-                self.reportError("unexpected EOF")
-                return func, True
-            elif self.token_is(tkn.END):
-                self.reportError("unexpected 'end' token")
-                return func, True
-            
-            res, err = self._parseNT_declaration()
-            func.body.append(res) # append result to function body
-
-        # statements
-        while not self.token_is(tkn.END, consume=True):
-            if self.token_is(tkn.EOF):
-                self.reportError("unexpected EOF")
-                return func, True
-
-            res, err = self._parseNT_statement()
-            func.body.append(res)
-
-        if not self.token_is(tkn.PROCEDURE, consume=True):
-            self.reportUnexpectedToken(expected='procedure')
-        
-        return func, False
+        return functionNode(procedure_name, ret_type, params, line=line), False
 
     def _parseNT_variable_declaration(self):
         """
@@ -362,30 +506,11 @@ class Parser():
     
     def _parseNT_if(self):
         """
-        <if_statement> --> IF LEFT_PAREN <expression> RIGHT_PAREN THEN (<statement>)* [ ELSE (<statement>)* ] END IF
+        <if_statement> --> <if_header> (<statement>)* [ ELSE (<statement>)* ] END IF
         """
-        if not self.token_is(tkn.IF, consume=True):
-            return None, False
-        
-        line = self.token.line
-        if not self.token_is(tkn.LEFT_PAREN, consume=True):
-            self.reportUnexpectedToken(expected='(')
-            return None, True
-
-        condition, err = self._parseNT_expression()
-        if condition == None:
-            self.reportError("invalid expression")
-            return None, True
-
-        if not self.token_is(tkn.RIGHT_PAREN, consume=True):
-            self.reportUnexpectedToken(expected=')')
-            return None, True
-
-        if not self.token_is(tkn.THEN, consume=True):
-            self.reportUnexpectedToken(expected='then')
-            return None, True
-
-        if_node = IfNode(condition, line)
+        if_node, err = self._parseNT_if_header()
+        if if_node == None:
+            return None, err
 
         # parse then block
         while not self.token_is(tkn.ELSE, consume=True):
@@ -422,29 +547,41 @@ class Parser():
         else:
             return if_node, err
 
-    def _parseNT_loop(self):
+    def _parseNT_if_header(self):
         """
-        <loop_statement> --> FOR LEFT_PAREN <assignment_statement> SEMICOLON <expression> RIGHT_PAREN (<statement>)* END FOR
+        <if_header> --> IF LEFT_PAREN <expression> RIGHT_PAREN THEN
         """
-        if not self.token_is(tkn.FOR, consume=True):
+        if not self.token_is(tkn.IF, consume=True):
             return None, False
         
+        line = self.token.line
         if not self.token_is(tkn.LEFT_PAREN, consume=True):
             self.reportUnexpectedToken(expected='(')
             return None, True
 
-        line = self.token.line
-        start, err = self._parseNT_assignment()
-        self.recover_on_error(err)
-        
-        end, err1 = self._parseNT_expression()
+        condition, err = self._parseNT_expression()
+        if condition == None:
+            self.reportError("invalid expression")
+            return None, True
+
         if not self.token_is(tkn.RIGHT_PAREN, consume=True):
             self.reportUnexpectedToken(expected=')')
             return None, True
 
-        loop = LoopNode(start, end, line=line)
-        err = err or err1
-        
+        if not self.token_is(tkn.THEN, consume=True):
+            self.reportUnexpectedToken(expected='then')
+            return None, True
+
+        return IfNode(condition, line), err
+
+    def _parseNT_loop(self):
+        """
+        <loop_statement> --> <loop_header> (<statement>)* END FOR
+        """
+        loop, err = self._parseNT_loop_header()
+        if loop == None:
+            return None, err
+
         while not self.token_is(tkn.END, consume=True):
             if self.token_is(tkn.EOF):
                 self.reportError("unexpected EOF")
@@ -459,6 +596,28 @@ class Parser():
 
         return loop, err
 
+    def _parseNT_loop_header(self):
+        """
+        <loop_header> --> FOR LEFT_PAREN <assignment_statement> SEMICOLON <expression> RIGHT_PAREN
+        """
+        if not self.token_is(tkn.FOR, consume=True):
+            return None, False
+        
+        if not self.token_is(tkn.LEFT_PAREN, consume=True):
+            self.reportUnexpectedToken(expected='(')
+            return None, True
+
+        line = self.token.line
+        start, err = self._parseNT_assignment()
+        self.recover_on_error(err)
+        
+        end, err1 = self._parseNT_expression()
+        if not self.token_is(tkn.RIGHT_PAREN, consume=True):
+            self.reportUnexpectedToken(expected=')')
+            return None, True
+
+        return LoopNode(start, end, line=line), (err or err1)
+
     def _parseNT_return(self):
         """
         <return_statement> --> RETURN <expression>
@@ -489,6 +648,9 @@ class Parser():
         }
         if self.token.type in valid_literals.keys():
             value = self.token.value
+            if self.token.type in (tkn.TRUE, tkn.FALSE):
+                # reserved word tokens have no value
+                value = "true" if self.token.type == tkn.TRUE else "false"
             line = self.token.line
             data_type = valid_literals[self.token.type]
             self.next_token()
@@ -516,7 +678,7 @@ class Parser():
             # not an arithOp
             return None, has_bool_not # if BOOL_NOT is present then arithOp was expected, so flag err
         elif has_bool_not:
-            return UnaryOpExpr(tkn.BOOL_NOT, arithOp, line)
+            return UnaryOpExpr(tkn.BOOL_NOT, arithOp, line), False
         else:
             if self.token.type in [tkn.BOOL_AND, tkn.BOOL_OR]:
                 Op = self.token.type
@@ -630,37 +792,115 @@ class Parser():
             has_negative = True
             line = self.token.line
 
+        res, err = self._parse_operand()
+        if has_negative and not err:
+            if isinstance(res, VariableExpr):
+                res.has_negative = True
+            return UnaryOpExpr(tkn.OP_SUB, res, line), False
+        else:
+            return res, err
+
+    def _parse_operand(self):
+        """
+        <operand> -->   <procedure_call>
+                    |   <name>
+                    |   <number>
+                    |   STRING
+                    |   TRUE
+                    |   FALSE
+        """
         if self.token_is(tkn.ID):
             call, err = self._parseNT_procedure_call()
             if err:
                 return None, True
-            elif call == None:
-                # not a procedure call.
-                # parse variable expression
-                name = self.token.value
-                line = self.token.line
-                self.next_token()
-                index, err = self._parseNT_array_index()
-                if err:
-                    return None, True
-                else:
-                    res = VariableExpr(name, data_type=None, array_index=index, has_negative=has_negative, line=line)
-                    if has_negative:
-                        return UnaryOpExpr(tkn.OP_SUB, res, line), False
-                    else:
-                        return res, False
-            else:
-                if has_negative:
-                    return UnaryOpExpr(tkn.OP_SUB, call, line)
-                else:
-                    return call, False
+            elif call != None:
+                return call, False
+
+            # not a procedure call.
+            # parse variable expression
+            name = self.token.value
+            line = self.token.line
+            self.next_token()
+            index, err = self._parseNT_array_index()
+            if err:
+                return None, True
+            return VariableExpr(name, data_type=None, array_index=index, line=line), False
         else:
-            res, err = self._parse_literal()
-            if has_negative and not err:
-                return UnaryOpExpr(tkn.OP_SUB, res, line), False
+            return self._parse_literal()
+
+    def _parse_expression_pratt(self):
+        """
+        operator precedence parser for <expression>, using the binary_operators
+        and prefix_operators tables. operands and pending operators are kept on
+        explicit stacks instead of the python stack, so long operand chains and
+        deeply nested parentheses parse in constant stack depth. builds the same
+        tree as the recursive rules
+        """
+        operands = []
+        operators = [] # (binding power, Op, line, is_prefix), None for a '('
+        open_parens = 0
+
+        def reduce():
+            power, Op, line, is_prefix = operators.pop()
+            if is_prefix:
+                operands.append(UnaryOpExpr(Op, operands.pop(), line))
             else:
-                return res, err
-            
+                RHS = operands.pop()
+                operands.append(BinOpExpr(LHS=operands.pop(), RHS=RHS, Op=Op, line=line))
+
+        while True:
+            # prefix operators and open parentheses, then an operand
+            negative = False
+            while True:
+                t_type = self.token.type
+                power = prefix_operators.get(t_type)
+                if power != None:
+                    self.next_token()
+                    operators.append((power, t_type, self.token.line, True))
+                    negative = t_type == tkn.OP_SUB
+                elif t_type == tkn.LEFT_PAREN:
+                    self.next_token()
+                    operators.append(None)
+                    open_parens += 1
+                    negative = False
+                else:
+                    break
+
+            operand, err = self._parse_operand()
+            if err:
+                return None, True
+            elif operand == None:
+                if not operators:
+                    return None, False # not an expression
+                self.reportError("expected an expression, found: {}".format(self.token))
+                return None, True
+            if negative and isinstance(operand, VariableExpr):
+                operand.has_negative = True
+            operands.append(operand)
+
+            # close parentheses, then a binary operator or the end of the expression
+            while self.token.type == tkn.RIGHT_PAREN and open_parens:
+                self.next_token()
+                while operators[-1] != None:
+                    reduce()
+                operators.pop()
+                open_parens -= 1
+
+            power = binary_operators.get(self.token.type)
+            if power == None:
+                break
+            # right associative, so only operators that bind tighter are reduced
+            while operators and operators[-1] != None and operators[-1][0] > power:
+                reduce()
+            operators.append((power, self.token.type, self.token.line, False))
+            self.next_token()
+
+        if open_parens:
+            self.reportUnexpectedToken(expected=')')
+            return None, True
+        while operators:
+            reduce()
+        return operands[0], False
 
     def _parseNT_procedure_call(self):
 
@@ -668,7 +908,7 @@ class Parser():
             return None, False
         name = self.token.value
         line = self.token.line
-        if not self._next_token.type == tkn.LEFT_PAREN:
+        if not self.peek_token(1).type == tkn.LEFT_PAREN:
             return None, False
         
         self.next_token()
@@ -693,11 +933,204 @@ class Parser():
                 return func, err
 
 
+    #==========================================================================
+    #  explicit stack statement and declaration rules
+    #==========================================================================
+    # the rules that nest (statements, if and loop blocks, declarations and
+    # procedure bodies) as generators. a rule yields the generator of a nested
+    # rule and is sent back its (res, err) result. _run_nested keeps the open
+    # rules on a list instead of the python stack, so nesting depth is only
+    # limited by memory. each rule matches its recursive version
+
+    def _run_nested(self, rule):
+        """ run a generator rule and the rules nested in it, returns its (res, err) """
+        stack = [rule]
+        result = None
+        while stack:
+            try:
+                nested = stack[-1].send(result)
+            except StopIteration as done:
+                stack.pop()
+                result = done.value
+            else:
+                stack.append(nested)
+                result = None
+        return result
+
+    def _parse_statement_iterative(self):
+        return self._run_nested(self._iter_statement())
+
+    def _parse_declaration_iterative(self):
+        return self._run_nested(self._iter_declaration())
+
+    def _iter_statement(self):
+        """ <statement>, see _parseNT_statement """
+        # only create generators for rules that can match the token
+        res, err = self._parseNT_assignment()
+        if res == None and not err and self.token.type == tkn.IF:
+            res, err = yield self._iter_if()
+        if res == None and not err and self.token.type == tkn.FOR:
+            res, err = yield self._iter_loop()
+        if res == None and not err:
+            res, err = self._parseNT_return()
+        if res == None and not err:
+            self.reportError("illegal syntax")
+            err = True
+        self.recover_on_error(err)
+        return res, err
+
+    def _iter_if(self):
+        """ <if_statement>, see _parseNT_if """
+        if_node, err = self._parseNT_if_header()
+        if if_node == None:
+            return None, err
+
+        # parse then block
+        while not self.token_is(tkn.ELSE, consume=True):
+            if self.token_is(tkn.EOF):
+                self.reportError("unexpected EOF")
+                return if_node, True
+            elif self.token_is(tkn.END, consume=True):
+                # No else block, check for if token and return
+                if not self.token_is(tkn.IF, consume=True):
+                    self.reportUnexpectedToken(expected='if')
+                    return if_node, True
+                else:
+                    return if_node, err
+            else:
+                res, err1 = yield self._iter_statement()
+                err = err or err1
+                if_node.thenBlock.append(res)
+
+        # parse else block
+        if_node.elseBlock = []
+        while not self.token_is(tkn.END, consume=True):
+            if self.token_is(tkn.EOF):
+                self.reportError("unexpected EOF")
+                return if_node, True
+
+            res, err1 = yield self._iter_statement()
+            err = err or err1
+            if_node.elseBlock.append(res)
+
+        if not self.token_is(tkn.IF, consume=True):
+            self.reportUnexpectedToken(expected='if')
+            return if_node, True
+        else:
+            return if_node, err
+
+    def _iter_loop(self):
+        """ <loop_statement>, see _parseNT_loop """
+        loop, err = self._parseNT_loop_header()
+        if loop == None:
+            return None, err
+
+        while not self.token_is(tkn.END, consume=True):
+            if self.token_is(tkn.EOF):
+                self.reportError("unexpected EOF")
+                return loop, True
+
+            res, err1 = yield self._iter_statement()
+            err = err or err1
+            loop.body.append(res)
+
+        if not self.token_is(tkn.FOR, consume=True):
+            self.reportUnexpectedToken(expected='for')
+
+        return loop, err
+
+    def _iter_declaration(self):
+        """ <declaration>, see _parseNT_declaration """
+        has_global = False
+        if self.token_is(tkn.GLOBAL, consume=True):
+            has_global = True
+
+        res, err = None, False
+        if self.token.type == tkn.PROCEDURE:
+            res, err = yield self._iter_procedure_declaration()
+        if res == None and not err:
+            res, err = self._parseNT_variable_declaration()
+        if res == None and not err:
+            self.reportError("illegal syntax")
+            err = True
+        self.recover_on_error(err)
+        if res != None:
+            res.is_global = has_global
+        return res, err
+
+    def _iter_procedure_declaration(self):
+        """ <procedure_declaration>, see _parseNT_procedure_declaration """
+        func, err = self._parseNT_procedure_header()
+        if func == None:
+            return None, err
+
+        # declarations
+        while not self.token_is(tkn.BEGIN, consume=True):
+            if self.token_is(tkn.EOF):
+                self.reportError("unexpected EOF")
+                return func, True
+            elif self.token_is(tkn.END):
+                self.reportError("unexpected 'end' token")
+                return func, True
+
+            res, err = yield self._iter_declaration()
+            func.body.append(res)
+
+        # statements
+        while not self.token_is(tkn.END, consume=True):
+            if self.token_is(tkn.EOF):
+                self.reportError("unexpected EOF")
+                return func, True
+
+            res, err = yield self._iter_statement()
+            func.body.append(res)
+
+        if not self.token_is(tkn.PROCEDURE, consume=True):
+            self.reportUnexpectedToken(expected='procedure')
+
+        return func, False
+
+
+#=============================================================================
+#  engine check
+#=============================================================================
+
+def compare_engines(fName):
+    """
+    parse a file with every expression and statement engine and check the
+    trees match. returns a list of mismatch descriptions, empty when the
+    trees match
+    """
+    programs = [Parser(fName, expr_engine=expr_engine, stmt_engine=stmt_engine).parse_program()
+                for expr_engine in EXPR_ENGINES for stmt_engine in STMT_ENGINES]
+    if any(program == None for program in programs):
+        return [] if all(program == None for program in programs) else ["invalid program header"]
+    items = [[program.name] + program.declarations + program.statements for program in programs]
+    mismatches = []
+    for nodes in zip(*items):
+        keys = [node_key(node) for node in nodes]
+        if any(key != keys[0] for key in keys):
+            mismatches.append(" != ".join(str(node) for node in nodes))
+    if any(len(nodes) != len(items[0]) for nodes in items):
+        mismatches.append("different number of top level items")
+    return mismatches
+
+def node_key(node):
+    """ comparable form of a parse tree, with the fields and lines of every node """
+    if isinstance(node, parseTreeNode):
+        fields = sorted(field for cls in type(node).__mro__ for field in getattr(cls, "__slots__", ()))
+        return (type(node).__name__,) + tuple(
+            (field, node_key(getattr(node, field, None))) for field in fields if field != "_errList")
+    elif isinstance(node, list):
+        return tuple(node_key(item) for item in node)
+    return node
+
 #=============================================================================
 #  debuging test code
 #=============================================================================
 
 if __name__ == '__main__':
+    import sys
 
     #fName = "../test/correct/logicals.src"
     #fName = "../test/correct/iterativeFib.src"
@@ -732,4 +1165,17 @@ if __name__ == '__main__':
         print(res)
         res = parser.parse_top_level_statement()
 
-    print("end of file")
\ No newline at end of file
+    print("end of file")
+
+    # differential check of the parser engines over the test programs
+    failed = False
+    for root, _, files in os.walk("../test"):
+        for name in sorted(files):
+            if not name.endswith(".src"):
+                continue
+            mismatches = compare_engines(os.path.join(root, name))
+            for mismatch in mismatches:
+                print("{}: {}".format(name, mismatch))
+            failed = failed or bool(mismatches)
+    print("engines disagree" if failed else "engines agree on all test programs")
+    sys.exit(1 if failed else 0)
\ No newline at end of file
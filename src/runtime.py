@@ -0,0 +1,198 @@
+## runs compiled programs in process, with MCJIT
+import ctypes
+import sys
+
+from llvmlite import binding
+
+from codegen import builtins, optimize, new_target_machine
+from runtime_lib import link_runtime, FLUSH
+
+#===================================================================================
+# the builtin get and put functions, as python callbacks bound to the builtin
+# symbols. output is collected and written in bulk, when the program ends or
+# is about to wait for input, and input is read a line per get call
+
+# ctypes type for each IR type of the builtin signatures. strings are passed
+# in as nul terminated char pointers, or None for the null pointer string
+# array elements start out as, which reads as the empty string. strings are
+# returned as plain addresses
+_param_ctypes = {
+    "i1": ctypes.c_bool,
+    "i32": ctypes.c_int32,
+    "float": ctypes.c_float,
+    "i8*": ctypes.c_char_p,
+}
+_return_ctypes = dict(_param_ctypes, void=None)
+_return_ctypes["i8*"] = ctypes.c_void_p
+
+class Runtime():
+    """ implementations of the builtins over a pair of text streams """
+
+    def __init__(self, stdin=None, stdout=None):
+        self.stdin = stdin if stdin is not None else sys.stdin
+        self.stdout = stdout if stdout is not None else sys.stdout
+        self.output = []
+        self.strings = [] # buffers returned by getstring, live until the run ends
+        self.has_errors = False
+        self.callbacks = {}
+        for name, ret, params in builtins:
+            signature = ctypes.CFUNCTYPE(_return_ctypes[str(ret)], *[_param_ctypes[str(p)] for p in params])
+            self.callbacks[name] = signature(getattr(self, name.replace("main.", "").lower()))
+
+    def reportError(self, message):
+        self.has_errors = True
+        self.flush()
+        print("runtime error: {}".format(message), file=sys.stderr)
+
+    def flush(self):
+        if self.output:
+            self.stdout.write("".join(self.output))
+            self.output = []
+        self.stdout.flush()
+
+    def bind(self):
+        """ point the builtin symbols at this runtime, for modules jitted after """
+        for name, callback in self.callbacks.items():
+            binding.add_symbol(name, ctypes.cast(callback, ctypes.c_void_p).value)
+
+    # put functions
+
+    def putbool(self, value):
+        self.output.append("true\n" if value else "false\n")
+        return True
+
+    def putinteger(self, value):
+        self.output.append("{}\n".format(value))
+        return True
+
+    def putfloat(self, value):
+        self.output.append("{:g}\n".format(value))
+        return True
+
+    def putstring(self, value):
+        self.output.append((value or b"").decode("latin-1") + "\n")
+        return True
+
+    # get functions
+
+    def read_line(self):
+        """ the next line of input, without its newline. None at the end of the input """
+        self.flush() # show any prompt before waiting
+        line = self.stdin.readline()
+        if not line:
+            self.reportError("unexpected end of input")
+            return None
+        return line.rstrip("\r\n")
+
+    def getbool(self):
+        line = self.read_line()
+        if line is None:
+            return False
+        value = line.strip().lower()
+        if value not in ("true", "false", "1", "0"):
+            self.reportError("expected a bool, got '{}'".format(line))
+        return value in ("true", "1")
+
+    def getinteger(self):
+        line = self.read_line()
+        try:
+            return int(line)
+        except (TypeError, ValueError):
+            if line is not None:
+                self.reportError("expected an integer, got '{}'".format(line))
+            return 0
+
+    def getfloat(self):
+        line = self.read_line()
+        try:
+            return float(line)
+        except (TypeError, ValueError):
+            if line is not None:
+                self.reportError("expected a float, got '{}'".format(line))
+            return 0.0
+
+    def getstring(self):
+        line = self.read_line() or ""
+        buffer = ctypes.create_string_buffer(line.encode("latin-1"))
+        self.strings.append(buffer)
+        return ctypes.addressof(buffer)
+
+    def stringequals(self, left, right):
+        return (left or b"") == (right or b"")
+
+#===================================================================================
+
+def jit_compile(ir_text, opt_level=0, linked=False):
+    """
+    jit compile LLVM assembly with MCJIT, at opt_level. builtins resolve to
+    the last bound Runtime, or with linked to the runtime library linked into
+    the module. returns the engine, which has to be kept alive while the code
+    runs, and the main function
+    """
+    llvm_module = binding.parse_assembly(ir_text)
+    llvm_module.verify()
+    machine = new_target_machine(opt_level)
+    llvm_module.data_layout = str(machine.target_data)
+    if linked:
+        link_runtime(llvm_module)
+    if opt_level > 0:
+        optimize(llvm_module, opt_level)
+    # the engine owns the module and the target machine from here
+    engine = binding.create_mcjit_compiler(llvm_module, machine)
+    engine.finalize_object()
+    return engine, ctypes.CFUNCTYPE(None)(engine.get_function_address("main"))
+
+def run_linked(ir_text, opt_level=0):
+    """
+    jit compile LLVM assembly with the runtime library linked in and run its
+    main. the program reads and writes the process's stdin and stdout
+    """
+    sys.stdout.flush() # before the program writes to the same file descriptor
+    engine, main = jit_compile(ir_text, opt_level, linked=True)
+    # static constructors aren't run in the jit, so the output is flushed here instead of at exit
+    flush = ctypes.CFUNCTYPE(None)(engine.get_function_address(FLUSH))
+    try:
+        main()
+    finally:
+        flush()
+
+def run_ir(ir_text, opt_level=0, stdin=None, stdout=None):
+    """ jit compile LLVM assembly and run its main with a Runtime. returns the Runtime """
+    runtime = Runtime(stdin, stdout)
+    runtime.bind()
+    engine, main = jit_compile(ir_text, opt_level)
+    try:
+        main()
+    finally:
+        runtime.flush()
+    return runtime
+
+if __name__ == '__main__':
+    import io
+    from contextlib import redirect_stdout
+    from codegen import ProgramBuilder
+
+    # the loops of the fibonacci programs carry their variables from one
+    # iteration to the next, check the values printed at each optimization level
+    fib = [0, 1]
+    while len(fib) < 30:
+        fib.append(fib[-1] + fib[-2])
+    expected = {
+        "iterativeFib": fib,
+        "recursiveFib": [n * (n + 1) // 2 for n in range(30)],
+        "test2": [144],
+        "math": [610],
+        "multipleProcs": [3],
+    }
+    failed = 0
+    for name, values in expected.items():
+        builder = ProgramBuilder("../test/correct/{}.src".format(name), None)
+        with redirect_stdout(io.StringIO()):
+            builder.compile()
+        for opt_level in (0, 2):
+            out = io.StringIO()
+            run_ir(builder.ir_text, opt_level, stdin=io.StringIO("30\n"), stdout=out)
+            result = [int(line) for line in out.getvalue().split()]
+            print("{:<16} -O{}: {}".format(name, opt_level, "ok" if result == values else "MISMATCH {}".format(result)))
+            failed += result != values
+    sys.exit(1 if failed else 0)
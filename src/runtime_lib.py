@@ -0,0 +1,348 @@
+## runtime library: the builtin get and put functions written in LLVM IR
+from llvmlite import ir, binding
+
+#===================================================================================
+# linked into a program's module before it is optimized, so the builtins can
+# be inlined into their callers. output goes to an internal buffer that is
+# written out when it fills up, before input is read, and at exit. input is
+# read in blocks and handed out a line per get call. only write, read and a
+# few libc string functions are needed from the system
+
+OUTPUT_SIZE = 4096
+INPUT_SIZE = 4096
+LINE_SIZE = 256 # longer input lines are cut off
+
+# entry points that stay visible after linking, the builtins are internalized
+FLUSH = "runtime.flush"
+INIT = "runtime.init"
+
+_void = ir.VoidType()
+_bool = ir.IntType(1)
+_char = ir.IntType(8)
+_int = ir.IntType(32)
+_long = ir.IntType(64)
+_float = ir.FloatType()
+_double = ir.DoubleType()
+_string = ir.PointerType(_char)
+
+def _global_array(module, name, size):
+    var = ir.GlobalVariable(module, ir.ArrayType(_char, size), name)
+    var.linkage = "internal"
+    var.initializer = ir.Constant(ir.ArrayType(_char, size), None)
+    return var
+
+def _global_int(module, name):
+    var = ir.GlobalVariable(module, _int, name)
+    var.linkage = "internal"
+    var.initializer = ir.Constant(_int, 0)
+    return var
+
+def _global_string(module, name, text):
+    data = bytearray(text.encode() + b"\0")
+    var = ir.GlobalVariable(module, ir.ArrayType(_char, len(data)), name)
+    var.linkage = "internal"
+    var.global_constant = True
+    var.initializer = ir.Constant(ir.ArrayType(_char, len(data)), data)
+    return var
+
+def _function(module, name, ret, params, linkage=None):
+    func = ir.Function(module, ir.FunctionType(ret, params), name=name)
+    if linkage:
+        func.linkage = linkage
+    return func
+
+
+class RuntimeLibrary():
+    """ builds the runtime module with llvmlite """
+
+    def __init__(self):
+        self.module = ir.Module(name="runtime")
+        self.module.triple = binding.get_default_triple()
+        module = self.module
+
+        # libc
+        self.write = _function(module, "write", _long, [_int, _string, _long])
+        self.read = _function(module, "read", _long, [_int, _string, _long])
+        self.strlen = _function(module, "strlen", _long, [_string])
+        self.strtol = _function(module, "strtol", _long, [_string, ir.PointerType(_string), _int])
+        self.strtod = _function(module, "strtod", _double, [_string, ir.PointerType(_string)])
+        self.snprintf = ir.Function(module, ir.FunctionType(_int, [_string, _long, _string], var_arg=True), "snprintf")
+        self.malloc = _function(module, "malloc", _string, [_long])
+        self.atexit = _function(module, "atexit", _int, [ir.PointerType(ir.FunctionType(_void, []))])
+        self.llvm_memcpy = module.declare_intrinsic("llvm.memcpy", [_string, _string, _long])
+
+        # buffers
+        self.out = _global_array(module, "runtime.out", OUTPUT_SIZE)
+        self.out_len = _global_int(module, "runtime.out_len")
+        self.input = _global_array(module, "runtime.in", INPUT_SIZE)
+        self.in_pos = _global_int(module, "runtime.in_pos")
+        self.in_end = _global_int(module, "runtime.in_end")
+        self.line = _global_array(module, "runtime.line", LINE_SIZE)
+        self.true_text = _global_string(module, "runtime.true", "true\n")
+        self.false_text = _global_string(module, "runtime.false", "false\n")
+        self.float_format = _global_string(module, "runtime.float_format", "%g\n")
+        self.empty_text = _global_string(module, "runtime.empty", "")
+
+        self.build_flush()
+        self.build_append()
+        self.build_read_line()
+        self.build_init()
+        self.build_puts()
+        self.build_gets()
+        self.build_string_equals()
+
+    def start(self, builder, var):
+        return builder.gep(var, [ir.Constant(_int, 0), ir.Constant(_int, 0)])
+
+    def string_arg(self, builder, value):
+        """ a string argument, with null read as the empty string. string array elements start out null """
+        is_null = builder.icmp_unsigned("==", value, ir.Constant(_string, None))
+        return builder.select(is_null, self.start(builder, self.empty_text), value)
+
+    def memcpy(self, builder, dest, src, length):
+        builder.call(self.llvm_memcpy, [dest, src, length, ir.Constant(_bool, 0)])
+
+    # output
+
+    def build_flush(self):
+        """ runtime.flush(): write out the buffered output """
+        self.flush = _function(self.module, FLUSH, _void, [])
+        builder = ir.IRBuilder(self.flush.append_basic_block("entry"))
+        length = builder.load(self.out_len)
+        with builder.if_then(builder.icmp_signed(">", length, ir.Constant(_int, 0))):
+            builder.call(self.write, [ir.Constant(_int, 1), self.start(builder, self.out), builder.sext(length, _long)])
+            builder.store(ir.Constant(_int, 0), self.out_len)
+        builder.ret_void()
+
+    def build_append(self):
+        """ runtime.append(data, length): add to the output buffer, flushing when it is full """
+        self.append = _function(self.module, "runtime.append", _void, [_string, _int], linkage="internal")
+        data, length = self.append.args
+        builder = ir.IRBuilder(self.append.append_basic_block("entry"))
+        used = builder.load(self.out_len)
+        fits = builder.icmp_signed("<=", builder.add(used, length), ir.Constant(_int, OUTPUT_SIZE))
+        with builder.if_then(builder.not_(fits)):
+            builder.call(self.flush, [])
+        too_long = builder.icmp_signed(">", length, ir.Constant(_int, OUTPUT_SIZE))
+        with builder.if_else(too_long) as (direct, buffered):
+            with direct:
+                builder.call(self.write, [ir.Constant(_int, 1), data, builder.sext(length, _long)])
+            with buffered:
+                used = builder.load(self.out_len)
+                dest = builder.gep(self.out, [ir.Constant(_int, 0), used])
+                self.memcpy(builder, dest, data, builder.sext(length, _long))
+                builder.store(builder.add(used, length), self.out_len)
+        builder.ret_void()
+
+    def build_init(self):
+        """ runtime.init(): registers the final flush, run as a static constructor """
+        init = _function(self.module, INIT, _void, [], linkage="internal")
+        builder = ir.IRBuilder(init.append_basic_block("entry"))
+        builder.call(self.atexit, [self.flush])
+        builder.ret_void()
+
+        entry_type = ir.LiteralStructType([_int, init.type, _string])
+        ctors = ir.GlobalVariable(self.module, ir.ArrayType(entry_type, 1), "llvm.global_ctors")
+        ctors.linkage = "appending"
+        ctors.initializer = ir.Constant(ir.ArrayType(entry_type, 1),
+                                        [ir.Constant(entry_type, [65535, init, ir.Constant(_string, None)])])
+
+    def build_puts(self):
+        """ the put functions, which return true """
+        module = self.module
+
+        func = _function(module, "putbool", _bool, [_bool])
+        builder = ir.IRBuilder(func.append_basic_block("entry"))
+        with builder.if_else(func.args[0]) as (is_true, is_false):
+            with is_true:
+                builder.call(self.append, [self.start(builder, self.true_text), ir.Constant(_int, 5)])
+            with is_false:
+                builder.call(self.append, [self.start(builder, self.false_text), ir.Constant(_int, 6)])
+        builder.ret(ir.Constant(_bool, 1))
+
+        # digits are written backwards from the end of a small buffer, then appended
+        func = _function(module, "putinteger", _bool, [_int])
+        builder = ir.IRBuilder(func.append_basic_block("entry"))
+        digits = builder.alloca(ir.ArrayType(_char, 16))
+        value = builder.sext(func.args[0], _long)
+        negative = builder.icmp_signed("<", value, ir.Constant(_long, 0))
+        magnitude = builder.select(negative, builder.neg(value), value)
+        builder.store(ir.Constant(_char, ord("\n")), builder.gep(digits, [ir.Constant(_int, 0), ir.Constant(_int, 15)]))
+        loop = func.append_basic_block("digits")
+        done = func.append_basic_block("sign")
+        entry = builder.block
+        builder.branch(loop)
+
+        builder.position_at_end(loop)
+        pos = builder.phi(_int)
+        rest = builder.phi(_long)
+        pos.add_incoming(ir.Constant(_int, 15), entry)
+        rest.add_incoming(magnitude, entry)
+        next_pos = builder.sub(pos, ir.Constant(_int, 1))
+        digit = builder.trunc(builder.urem(rest, ir.Constant(_long, 10)), _char)
+        builder.store(builder.add(digit, ir.Constant(_char, ord("0"))),
+                      builder.gep(digits, [ir.Constant(_int, 0), next_pos]))
+        next_rest = builder.udiv(rest, ir.Constant(_long, 10))
+        pos.add_incoming(next_pos, loop)
+        rest.add_incoming(next_rest, loop)
+        builder.cbranch(builder.icmp_unsigned("!=", next_rest, ir.Constant(_long, 0)), loop, done)
+
+        builder.position_at_end(done)
+        sign_pos = builder.sub(next_pos, ir.Constant(_int, 1))
+        with builder.if_then(negative):
+            builder.store(ir.Constant(_char, ord("-")), builder.gep(digits, [ir.Constant(_int, 0), sign_pos]))
+        first = builder.select(negative, sign_pos, next_pos)
+        builder.call(self.append, [builder.gep(digits, [ir.Constant(_int, 0), first]),
+                                   builder.sub(ir.Constant(_int, 16), first)])
+        builder.ret(ir.Constant(_bool, 1))
+
+        func = _function(module, "putfloat", _bool, [_float])
+        builder = ir.IRBuilder(func.append_basic_block("entry"))
+        text = builder.alloca(ir.ArrayType(_char, 32))
+        text_ptr = self.start(builder, text)
+        length = builder.call(self.snprintf, [text_ptr, ir.Constant(_long, 32), self.start(builder, self.float_format),
+                                              builder.fpext(func.args[0], _double)])
+        builder.call(self.append, [text_ptr, length])
+        builder.ret(ir.Constant(_bool, 1))
+
+        func = _function(module, "putstring", _bool, [_string])
+        builder = ir.IRBuilder(func.append_basic_block("entry"))
+        text = self.string_arg(builder, func.args[0])
+        length = builder.trunc(builder.call(self.strlen, [text]), _int)
+        builder.call(self.append, [text, length])
+        newline = builder.gep(self.true_text, [ir.Constant(_int, 0), ir.Constant(_int, 4)])
+        builder.call(self.append, [newline, ir.Constant(_int, 1)])
+        builder.ret(ir.Constant(_bool, 1))
+
+    # input
+
+    def build_read_line(self):
+        """
+        runtime.read_line(): the next input line, nul terminated and without
+        its newline, in runtime.line. the end of the input reads as empty lines
+        """
+        func = _function(self.module, "runtime.read_line", _string, [], linkage="internal")
+        self.read_line = func
+        builder = ir.IRBuilder(func.append_basic_block("entry"))
+        builder.call(self.flush, []) # show any prompt before waiting
+        length = builder.alloca(_int)
+        builder.store(ir.Constant(_int, 0), length)
+        next_char = func.append_basic_block("next_char")
+        refill = func.append_basic_block("refill")
+        take = func.append_basic_block("take")
+        keep = func.append_basic_block("keep")
+        end = func.append_basic_block("end")
+        builder.branch(next_char)
+
+        builder.position_at_end(next_char)
+        empty = builder.icmp_signed(">=", builder.load(self.in_pos), builder.load(self.in_end))
+        builder.cbranch(empty, refill, take)
+
+        builder.position_at_end(refill)
+        count = builder.call(self.read, [ir.Constant(_int, 0), self.start(builder, self.input),
+                                         ir.Constant(_long, INPUT_SIZE)])
+        builder.store(ir.Constant(_int, 0), self.in_pos)
+        builder.store(builder.trunc(count, _int), self.in_end)
+        builder.cbranch(builder.icmp_signed(">", count, ir.Constant(_long, 0)), take, end)
+
+        builder.position_at_end(take)
+        pos = builder.load(self.in_pos)
+        char = builder.load(builder.gep(self.input, [ir.Constant(_int, 0), pos]))
+        builder.store(builder.add(pos, ir.Constant(_int, 1)), self.in_pos)
+        builder.cbranch(builder.icmp_unsigned("==", char, ir.Constant(_char, ord("\n"))), end, keep)
+
+        builder.position_at_end(keep)
+        used = builder.load(length)
+        with builder.if_then(builder.icmp_signed("<", used, ir.Constant(_int, LINE_SIZE - 1))):
+            builder.store(char, builder.gep(self.line, [ir.Constant(_int, 0), used]))
+            builder.store(builder.add(used, ir.Constant(_int, 1)), length)
+        builder.branch(next_char)
+
+        builder.position_at_end(end)
+        builder.store(ir.Constant(_char, 0), builder.gep(self.line, [ir.Constant(_int, 0), builder.load(length)]))
+        builder.ret(self.start(builder, self.line))
+
+    def build_gets(self):
+        module = self.module
+        null_end = ir.Constant(ir.PointerType(_string), None)
+
+        func = _function(module, "getbool", _bool, [])
+        builder = ir.IRBuilder(func.append_basic_block("entry"))
+        first = builder.load(builder.call(self.read_line, []))
+        is_t = builder.icmp_unsigned("==", first, ir.Constant(_char, ord("t")))
+        is_one = builder.icmp_unsigned("==", first, ir.Constant(_char, ord("1")))
+        builder.ret(builder.or_(is_t, is_one))
+
+        func = _function(module, "getinteger", _int, [])
+        builder = ir.IRBuilder(func.append_basic_block("entry"))
+        value = builder.call(self.strtol, [builder.call(self.read_line, []), null_end, ir.Constant(_int, 10)])
+        builder.ret(builder.trunc(value, _int))
+
+        func = _function(module, "getfloat", _float, [])
+        builder = ir.IRBuilder(func.append_basic_block("entry"))
+        value = builder.call(self.strtod, [builder.call(self.read_line, []), null_end])
+        builder.ret(builder.fptrunc(value, _float))
+
+        # a copy of the line, strings are never freed
+        func = _function(module, "getstring", _string, [])
+        builder = ir.IRBuilder(func.append_basic_block("entry"))
+        line = builder.call(self.read_line, [])
+        size = builder.add(builder.call(self.strlen, [line]), ir.Constant(_long, 1))
+        copy = builder.call(self.malloc, [size])
+        self.memcpy(builder, copy, line, size)
+        builder.ret(copy)
+
+    def build_string_equals(self):
+        func = _function(self.module, "main.StringEquals", _bool, [_string, _string])
+        entry = func.append_basic_block("entry")
+        loop = func.append_basic_block("compare")
+        same = func.append_basic_block("same")
+        differ = func.append_basic_block("differ")
+        equal = func.append_basic_block("equal")
+        builder = ir.IRBuilder(entry)
+        left = self.string_arg(builder, func.args[0])
+        right = self.string_arg(builder, func.args[1])
+        builder.branch(loop)
+
+        builder.position_at_end(loop)
+        index = builder.phi(_long)
+        index.add_incoming(ir.Constant(_long, 0), entry)
+        left_char = builder.load(builder.gep(left, [index]))
+        right_char = builder.load(builder.gep(right, [index]))
+        builder.cbranch(builder.icmp_unsigned("==", left_char, right_char), same, differ)
+
+        builder.position_at_end(same)
+        index.add_incoming(builder.add(index, ir.Constant(_long, 1)), same)
+        builder.cbranch(builder.icmp_unsigned("==", left_char, ir.Constant(_char, 0)), equal, loop)
+
+        builder.position_at_end(differ)
+        builder.ret(ir.Constant(_bool, 0))
+        builder.position_at_end(equal)
+        builder.ret(ir.Constant(_bool, 1))
+
+#===================================================================================
+
+_runtime_ir = None
+
+def runtime_ir():
+    """ LLVM assembly of the runtime library, built once per process """
+    global _runtime_ir
+    if _runtime_ir is None:
+        _runtime_ir = str(RuntimeLibrary().module)
+    return _runtime_ir
+
+def link_runtime(llvm_module):
+    """
+    link the runtime library into a parsed module. the builtins become
+    internal to it, so the optimizer can inline them and drop unused ones
+    """
+    runtime = binding.parse_assembly(runtime_ir())
+    runtime.data_layout = llvm_module.data_layout
+    builtin_names = [f.name for f in runtime.functions
+                     if not f.is_declaration and f.linkage == binding.Linkage.external and f.name != FLUSH]
+    llvm_module.link_in(runtime)
+    for name in builtin_names:
+        llvm_module.get_function(name).linkage = "internal"
+
+if __name__ == '__main__':
+    print(runtime_ir())
@@ -1,24 +1,123 @@
 ## Scanner
+import os
+import re
 from os import path
-from token import Token
-from token import tkn_type as tkn
+from tokens import Token, TokenBuffer
+from tokens import tkn_type as tkn
 #===================================================================================
 # Terminal symbols
 
+two_char_operators = {
+    '>=' : tkn.OP_GE,
+    '<=' : tkn.OP_LE,
+    '==' : tkn.OP_EQ,
+    '!=' : tkn.OP_NE,
+    ':=' : tkn.OP_ASSIGN
+}
+
+single_char_tokens = {
+    '[' : tkn.LEFT_BRACKET,
+    ']' : tkn.RIGHT_BRACKET,
+    '(' : tkn.LEFT_PAREN,
+    ')' : tkn.RIGHT_PAREN,
+    '{' : tkn.LEFT_CURLY,
+    '}' : tkn.RIGHT_CURLY,
+    ';' : tkn.SEMICOLON,
+    ':' : tkn.COLON,
+    '.' : tkn.PERIOD,
+    ',' : tkn.COMMA,
+    '&' : tkn.BOOL_AND,
+    '|' : tkn.BOOL_OR,
+    '+' : tkn.OP_ADD,
+    '-' : tkn.OP_SUB,
+    '*' : tkn.OP_MUL,
+    '/' : tkn.OP_DIV,
+    '>' : tkn.OP_GT,
+    '<' : tkn.OP_LT,
+}
+
+reserved_words = {
+    'program'   : tkn.PROGRAM,
+    'procedure' : tkn.PROCEDURE,
+    'is'        : tkn.IS,
+    'begin'     : tkn.BEGIN,
+    'end'       : tkn.END,
+    'global'    : tkn.GLOBAL,
+    'type'      : tkn.TYPE,
+    'integer'   : tkn.INT_TYPE,
+    'float'     : tkn.FLOAT_TYPE,
+    'string'    : tkn.STRING_TYPE,
+    'bool'      : tkn.BOOL_TYPE,
+    'enum'      : tkn.ENUM_TYPE,
+    'not'       : tkn.BOOL_NOT,
+    'if'        : tkn.IF,
+    'then'      : tkn.THEN,
+    'else'      : tkn.ELSE,
+    'for'       : tkn.FOR,
+    'while'     : tkn.WHILE,
+    'return'    : tkn.RETURN,
+    'true'      : tkn.TRUE,
+    'false'     : tkn.FALSE,
+    'variable'  : tkn.VARIABLE
+}
+
+operator_tokens = dict(two_char_operators, **single_char_tokens)
+
+# master pattern for the regex engine. whitespace and line comments before the
+# token are skipped by the same match, then the alternatives mirror the
+# branches of the char engine. nested block comments can't be matched by a
+# regex, so only the opening '/*' is matched here
+token_pattern = re.compile(r'''
+    (?:\s|//[^\n]*\n?)*
+    (?:
+        (?P<eof>\Z)
+      | (?P<block_comment>/\*)
+      | (?P<string>"(?:[^"\\]|\\[\s\S])*")
+      | (?P<open_string>"[\s\S]*)
+      | (?P<number>\d+(?:\.\d*)?)
+      | (?P<word>[^\W\d_]\w*)
+      | (?P<operator>[<>=!:]=|[][(){};:.,&|+\-*/<>])
+      | (?P<unknown>[\s\S])
+    )
+''', re.VERBOSE)
+
+comment_delimiters = re.compile(r'/\*|\*/')
+
+# token types the regex engine uses per lexeme, resolved once up front since
+# attribute access on the enum class is comparatively slow
+ID_TYPE, INTEGER_TYPE, FLOAT_TYPE, STRING_TYPE = tkn.ID, tkn.INTEGER, tkn.FLOAT, tkn.STRING
+EOF_TYPE = tkn.EOF
+
+ENGINES = ("char", "regex")
 
 class Scanner:
     """ scans the file contents and returns tokens or errors"""
     # Setup and Teardown
-    def __init__(self, fName, tabsize=4):
-        self.fd = open(fName, "r")
+    def __init__(self, fName=None, tabsize=4, engine="char", text=None, quiet=False):
+        # the whole file is read into one buffer up front and scanned with an
+        # integer cursor, instead of making a read() call for every char.
+        # source text that is already in memory can be given directly
+        if text is None:
+            with open(fName, "r") as fd:
+                text = fd.read()
+        self.text = text
+        self.pos = 0 # index of the buffered next char
+        self.tokenStart = 0 # index of the first char of the last token
         self.line = 1
         self.col = 0
-        self._next_char = self.fd.read(1)
+        self._next_char = self.text[0:1]
         self.tabsize = tabsize
+        self._has_tabs = '\t' in self.text
         self._has_errors = False
+        self.error_count = 0
+        self.quiet = quiet # count errors without printing them or warnings
 
-    #def __del__(self):
-    #    self.fd.close()
+        # select the tokenizer engine
+        if engine == "regex":
+            self.getToken = self.getTokenRegex
+        elif engine != "char":
+            raise ValueError("unknown scanner engine '{}'".format(engine))
+        self.engine = engine
 
     # Character Stream Implementation
 
@@ -32,16 +131,27 @@ class Scanner:
         """
 
         this_char = self._next_char
-        
+
         if this_char == '\n':
             self.line += 1
             self.col = 0
         elif this_char == '\t':
             self.col += self.tabsize
+        elif this_char == '':
+            # EOF takes up one column the first time it is read, so reading
+            # it again doesn't move the reported location
+            if self.pos == len(self.text):
+                self.col += 1
+                self.pos += 1
+            return this_char
         else:
             self.col += 1
-        
-        self._next_char = self.fd.read(1)
+
+        self.pos += 1
+        try:
+            self._next_char = self.text[self.pos]
+        except IndexError:
+            self._next_char = ''
 
         return this_char
 
@@ -49,13 +159,50 @@ class Scanner:
     def peekNextChar(self):
         return self._next_char
 
-    # Error reporting 
+    def seek(self, pos, line, col):
+        """
+        move the cursor to pos, which must not be inside a token or comment.
+        line and col are the location of the char before pos
+        """
+        self.pos = pos
+        self.line = line
+        self.col = col
+        self._next_char = self.text[pos:pos + 1]
+
+    def tokenSpan(self):
+        """ start and end index in the text of the last token returned """
+        return self.tokenStart, min(self.pos, len(self.text))
+
+    def skipTo(self, end):
+        """
+        consume the buffer up to index end in one step, keeping the line and
+        column info the same as if each char had been read by getNextChar
+        """
+        text = self.text
+        pos = self.pos
+        line_start = text.rfind('\n', pos, end) + 1
+        if line_start:
+            self.line += text.count('\n', pos, line_start)
+            self.col = end - line_start
+        else:
+            line_start = pos
+            self.col += end - pos
+        if self._has_tabs:
+            self.col += (self.tabsize - 1) * text.count('\t', line_start, end)
+        self.pos = end
+        self._next_char = text[end:end + 1]
+
+    # Error reporting
 
     def reportError(self, message):
-        print("Error L{} C{}: {}".format(self.line, self.col, message))
+        if not self.quiet:
+            print("Error L{} C{}: {}".format(self.line, self.col, message))
+        self._has_errors = True
+        self.error_count += 1
 
     def reportWarning(self, message):
-        print("Warning L{} C{}: {}".format(self.line, self.col, message))
+        if not self.quiet:
+            print("Warning L{} C{}: {}".format(self.line, self.col, message))
 
     # Tokenizer
 
@@ -69,16 +216,12 @@ class Scanner:
         while c.isspace():
             c = self.getNextChar()
 
-        # check for EOF
-        if c == '':
-            return Token(tkn.EOF, location=(self.line, self.col))        
-
         # Comments (not recorded as tokens)
         while c == '/': # loop to handle consecutive comments
 
             ## Single Line Comments
             if self.peekNextChar() == "/":
-                while c != '\n':
+                while c != '\n' and c != '':
                     c = self.getNextChar()
             ## Multi Line Comments
             elif self.peekNextChar() == "*":
@@ -88,67 +231,56 @@ class Scanner:
                 ### must handle nested multiline comments
                 while openCount != closedCount:
                     c = self.getNextChar()
+                    if c == '':
+                        self.reportError("unterminated comment")
+                        break
                     if c == "/" and self.peekNextChar() == "*":
                         openCount += 1
                         self.getNextChar()
                     elif c == "*" and self.peekNextChar() == "/":
                         closedCount += 1
                         self.getNextChar()
+            ## not a comment, '/' is the division operator
+            else:
+                break
             c = self.getNextChar()
 
             ### Trim whitespace after comments
             while c.isspace():
                 c = self.getNextChar()
 
-        
+        # check for EOF
+        if c == '':
+            self.tokenStart = len(self.text)
+            return Token(tkn.EOF, location=(self.line, self.col))
+
         ## Now any further parsing will generate a token
         token_start = (self.line, self.col)
+        self.tokenStart = self.pos - 1
 
         # Strings
         if c == '"':
             value = c # gets first quote
-            while not (self.peekNextChar() == '"' and c !="\\"):
+            while self.peekNextChar() != '"':
+                if self.peekNextChar() == '':
+                    self.reportError("unterminated string")
+                    return Token(tkn.STRING, token_start, value)
                 c = self.getNextChar()
                 value += c
+                # a backslash always takes the char after it, so \" is a quote
+                # in the string and \\" closes it
+                if c == "\\" and self.peekNextChar() != '':
+                    value += self.getNextChar()
             value += self.getNextChar() # gets last quote
             return Token(tkn.STRING, token_start, value)
-        
+
         # Symbols
 
-        two_char_operators = {
-            
-            '>=' : tkn.OP_GE,
-            '<=' : tkn.OP_LE,
-            '==' : tkn.OP_EQ,
-            '!=' : tkn.OP_NE,
-            ':=' : tkn.OP_ASSIGN
-        }
         if c == '>' or c == '<' or c == '=' or c == '!' or c == ':':
             if c + self.peekNextChar() in two_char_operators.keys():
                 op = c + self.getNextChar()
                 return Token(two_char_operators[op], token_start)
 
-        single_char_tokens = {
-            '[' : tkn.LEFT_BRACKET,
-            ']' : tkn.RIGHT_BRACKET,
-            '(' : tkn.LEFT_PAREN,
-            ')' : tkn.RIGHT_PAREN,
-            '{' : tkn.LEFT_CURLY,
-            '}' : tkn.RIGHT_CURLY, 
-            ';' : tkn.SEMICOLON,
-            ':' : tkn.COLON,
-            '.' : tkn.PERIOD,
-            ',' : tkn.COMMA,
-            '&' : tkn.BOOL_AND,
-            '|' : tkn.BOOL_OR,
-            '+' : tkn.OP_ADD,
-            '-' : tkn.OP_SUB,
-            '*' : tkn.OP_MUL,
-            '/' : tkn.OP_DIV,
-            '>' : tkn.OP_GT,
-            '<' : tkn.OP_LT,
-        }
-
         if c in single_char_tokens.keys():
             return Token(single_char_tokens[c], token_start)
 
@@ -170,7 +302,7 @@ class Scanner:
             ## number is an Integer
             else:
                 return Token(tkn.INTEGER, token_start, value)
-        
+
         # identifiers/reserved words
 
         ## identifiers must start with [A-Z | a-z]
@@ -179,36 +311,10 @@ class Scanner:
             while self.peekNextChar().isalnum() or self.peekNextChar() == '_':
                 value += self.getNextChar()
 
-            ## Check for reserved words
-            reserved_words = {
-                'program'   : tkn.PROGRAM,
-                'procedure' : tkn.PROCEDURE,
-                'is'        : tkn.IS,
-                'begin'     : tkn.BEGIN,
-                'end'       : tkn.END,
-                'global'    : tkn.GLOBAL,
-                'type'      : tkn.TYPE,
-                'integer'   : tkn.INT_TYPE,
-                'float'     : tkn.FLOAT_TYPE,
-                'string'    : tkn.STRING_TYPE,
-                'bool'      : tkn.BOOL_TYPE,
-                'enum'      : tkn.ENUM_TYPE,
-                'not'       : tkn.BOOL_NOT,
-                'if'        : tkn.IF,
-                'then'      : tkn.THEN,
-                'else'      : tkn.ELSE,
-                'for'       : tkn.FOR,
-                'while'     : tkn.WHILE,
-                'return'    : tkn.RETURN,
-                'true'      : tkn.TRUE,
-                'false'     : tkn.FALSE,
-                'variable'  : tkn.VARIABLE
-            }
-
             ## token is a reserved word
             if value.lower() in reserved_words.keys():
                 return Token(reserved_words[value.lower()], token_start)
-            
+
             ## token is an Identifier
             else:
                 return Token(tkn.ID, token_start, value.lower())
@@ -217,6 +323,150 @@ class Scanner:
         self.reportError("Illegal character '{}'".format(c))
         return Token(tkn.UNKNOWN, token_start)
 
+    def tokens(self):
+        """ generate the remaining tokens, up to and including EOF """
+        getToken = self.getToken
+        token = getToken()
+        while token.type != EOF_TYPE:
+            yield token
+            token = getToken()
+        yield token
+
+    def getTokenRegex(self):
+        """
+        same contract as getToken, but matches whole lexemes against the
+        precompiled master pattern and slices their values out of the buffer
+        """
+        text = self.text
+        match = token_pattern.match(text, self.pos)
+        kind = match.lastgroup
+        while kind == 'block_comment':
+            self._skipBlockComment(match.end())
+            match = token_pattern.match(text, self.pos)
+            kind = match.lastgroup
+
+        # account for the skipped whitespace and comments. the first char of
+        # a token is never a newline or tab so it always takes up one column
+        pos = self.pos
+        start = match.start(kind)
+        line_start = text.rfind('\n', pos, start) + 1
+        if line_start:
+            self.line += text.count('\n', pos, line_start)
+            col = start - line_start + 1
+        else:
+            line_start = pos
+            col = self.col + start - pos + 1
+        if self._has_tabs and start != line_start:
+            col += (self.tabsize - 1) * text.count('\t', line_start, start)
+        token_start = (self.line, col)
+        self.tokenStart = start
+
+        end = match.end()
+        if kind == 'string' or kind == 'open_string':
+            self.col = col - 1
+            self.pos = start
+            self.skipTo(end)
+        else:
+            self.col = col + end - start - 1
+            self.pos = end
+            self._next_char = text[end:end + 1]
+
+        if kind == 'word':
+            value = match.group(kind).lower()
+            t_type = reserved_words.get(value)
+            if t_type is not None:
+                return Token(t_type, token_start)
+            return Token(ID_TYPE, token_start, value)
+
+        elif kind == 'operator':
+            return Token(operator_tokens[match.group(kind)], token_start)
+
+        elif kind == 'number':
+            value = match.group(kind)
+            if '.' in value:
+                return Token(FLOAT_TYPE, token_start, value)
+            return Token(INTEGER_TYPE, token_start, value)
+
+        elif kind == 'string':
+            return Token(STRING_TYPE, token_start, match.group(kind))
+
+        elif kind == 'eof':
+            self.getNextChar()
+            return Token(tkn.EOF, location=(self.line, self.col))
+
+        elif kind == 'open_string':
+            self.reportError("unterminated string")
+            return Token(STRING_TYPE, token_start, match.group(kind))
+
+        # Unknown Token... no patterns match
+        self.reportError("Illegal character '{}'".format(match.group(kind)))
+        return Token(tkn.UNKNOWN, token_start)
+
+    def _skipBlockComment(self, pos):
+        """ skip a (possibly nested) block comment whose '/*' ends at pos """
+        depth = 1
+        while depth:
+            delim = comment_delimiters.search(self.text, pos)
+            if delim is None:
+                self.skipTo(len(self.text))
+                self.getNextChar()
+                self.reportError("unterminated comment")
+                return
+            depth += 1 if delim.group() == '/*' else -1
+            pos = delim.end()
+        self.skipTo(pos)
+
+def tokenize(fName=None, tabsize=4, engine="char", buffer=None, text=None):
+    """
+    scan a whole file (or source text) into a TokenBuffer, including the span
+    of each token in the text. an existing buffer can be passed in to be
+    cleared and refilled rather than allocating a new one
+    """
+    scanner = Scanner(fName, tabsize=tabsize, engine=engine, text=text)
+    if buffer is None:
+        buffer = TokenBuffer()
+    else:
+        buffer.clear()
+    append = buffer.append
+    for token in scanner.tokens():
+        append(token.type, (token.line, token.col), token.value, scanner.tokenSpan())
+    buffer.has_errors = scanner._has_errors
+    return buffer
+
+#===================================================================================
+#  debugging
+
+def compare_engines(fName=None, text=None):
+    """
+    scan a file (or source text) with every engine and check they agree token
+    for token, errors included. returns a list of mismatch descriptions,
+    empty when the streams match
+    """
+    scanners = [Scanner(fName, engine=engine, text=text) for engine in ENGINES]
+    mismatches = []
+    while True:
+        tokens = [scanner.getToken() for scanner in scanners]
+        keys = [(t.type, t.value, t.line, t.col, scanner._has_errors) for t, scanner in zip(tokens, scanners)]
+        if any(key != keys[0] for key in keys):
+            mismatches.append(" != ".join(str(t) for t in tokens))
+        if all(t.type == tkn.EOF for t in tokens):
+            return mismatches
+        if any(t.type == tkn.EOF for t in tokens):
+            mismatches.append("token streams have different lengths")
+            return mismatches
+
+# pieces of source the fuzzed inputs are made of, weighted towards the
+# strings, escapes and comments where the engines are most likely to differ
+FUZZ_PIECES = ['"', '"', '\\', '\\', '/', '*', '/*', '*/', '//', '\n', '\t', ' ', ';',
+               'abc', 'x1', '12', '3.5', ':=', '<=', '!', '_', '#']
+
+def fuzz_sources(count, seed=0, max_pieces=12):
+    """ count random snippets of FUZZ_PIECES, the same ones for a seed """
+    import random
+    rng = random.Random(seed)
+    return ["".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(1, max_pieces)))
+            for _ in range(count)]
+
 def main():
     """ for debugging the scanner """
 
@@ -237,5 +487,27 @@ def main():
         token = scanner.getToken()
         print(token)
 
+    # differential check of the tokenizer engines over the test programs
+    failed = False
+    for root, _, files in os.walk("../test"):
+        for name in sorted(files):
+            if name.endswith(".tar"):
+                continue
+            mismatches = compare_engines(os.path.join(root, name))
+            for mismatch in mismatches:
+                print("{}: {}".format(name, mismatch))
+            failed = failed or bool(mismatches)
+    for text in fuzz_sources(5000):
+        with redirect_stdout(io.StringIO()): # the scan errors of the fuzzed inputs
+            mismatches = compare_engines(text=text)
+        for mismatch in mismatches:
+            print("{!r}: {}".format(text, mismatch))
+        failed = failed or bool(mismatches)
+    print("engines disagree" if failed else "engines agree on all test programs and fuzzed inputs")
+    return not failed
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    import io
+    import sys
+    from contextlib import redirect_stdout
+    sys.exit(0 if main() else 1)
\ No newline at end of file
@@ -0,0 +1,309 @@
+## resolves names and checks types over the parse tree, before codegen
+from tokens import tkn_type as tkn
+from parse_tree import exprNode, BinOpExpr, UnaryOpExpr, VariableExpr, LiteralExpr, CallExpr, \
+    returnExpr, AssignmentNode, declarationNode, IfNode, LoopNode, functionNode
+from symbol_table import SymbolTable, Symbol
+
+#===================================================================================
+# checks each top level node in program order, and reports the errors codegen
+# would, in the same order. a node without errors is annotated: expressions
+# with their data_type, and names with the Symbol they resolve to. codegen of
+# an annotated node stores the IR value of each declaration in its Symbol and
+# takes the values of names from there, without symbol table lookups or checks.
+# nothing here needs llvmlite
+
+NUMERIC_TYPES = (tkn.INT_TYPE, tkn.FLOAT_TYPE)
+ARITHMETIC_OPS = (tkn.OP_ADD, tkn.OP_SUB, tkn.OP_MUL, tkn.OP_DIV)
+LOGICAL_OPS = (tkn.BOOL_AND, tkn.BOOL_OR)
+RELATION_OPS = (tkn.OP_LT, tkn.OP_GE, tkn.OP_LE, tkn.OP_GT, tkn.OP_EQ, tkn.OP_NE)
+
+# builtin get and put functions: name, return type, parameter types. the put functions return true
+BUILTINS = [
+    ("putbool",           tkn.BOOL_TYPE,   [tkn.BOOL_TYPE]),
+    ("putstring",         tkn.BOOL_TYPE,   [tkn.STRING_TYPE]),
+    ("putinteger",        tkn.BOOL_TYPE,   [tkn.INT_TYPE]),
+    ("putfloat",          tkn.BOOL_TYPE,   [tkn.FLOAT_TYPE]),
+    ("getbool",           tkn.BOOL_TYPE,   []),
+    ("getinteger",        tkn.INT_TYPE,    []),
+    ("getfloat",          tkn.FLOAT_TYPE,  []),
+    ("main.StringEquals", tkn.BOOL_TYPE,   [tkn.STRING_TYPE, tkn.STRING_TYPE]),
+    ("getstring",         tkn.STRING_TYPE, []),
+]
+
+# the scope of the program body's locals, see Symbol.function
+MAIN = "main"
+
+def binary_result_type(Op, left, right):
+    """ type of a binary operation on operands of type left and right, None if it is undefined """
+    if left == right == tkn.INT_TYPE and (Op in ARITHMETIC_OPS or Op in LOGICAL_OPS or Op in RELATION_OPS):
+        return tkn.BOOL_TYPE if Op in RELATION_OPS else tkn.INT_TYPE
+    elif left in NUMERIC_TYPES and right in NUMERIC_TYPES and (Op in ARITHMETIC_OPS or Op in RELATION_OPS):
+        return tkn.BOOL_TYPE if Op in RELATION_OPS else tkn.FLOAT_TYPE
+    elif left == right == tkn.STRING_TYPE and Op == tkn.OP_EQ:
+        return tkn.BOOL_TYPE
+    elif left == right == tkn.BOOL_TYPE and Op in LOGICAL_OPS:
+        return tkn.BOOL_TYPE
+    return None
+
+def converts(from_type, to_type):
+    """ True if a value of from_type can be used as a to_type, see parse_tree.convert """
+    return from_type == to_type or (from_type, to_type) in (
+        (tkn.INT_TYPE, tkn.FLOAT_TYPE),
+        (tkn.FLOAT_TYPE, tkn.INT_TYPE),
+        (tkn.BOOL_TYPE, tkn.INT_TYPE),
+        (tkn.INT_TYPE, tkn.BOOL_TYPE))
+
+
+class Checker():
+    """
+    name resolution and type checking, with its own scopes. errors are
+    (line, error) tuples, like the errList of parse tree nodes
+    """
+
+    def __init__(self):
+        self.table = SymbolTable()
+        self.errors = []
+        self.function = MAIN # scope of the locals being declared
+        self.return_type = None # the program body returns nothing
+        self.terminated = False # the current block has returned
+        for name, ret, params in BUILTINS:
+            # builtin arguments have no names, llvmlite numbers them
+            self.table.add(Symbol(name, None, ret, id_type='function',
+                                  params=[(".{}".format(i + 1), p) for i, p in enumerate(params)]))
+
+    def bind_builtin(self, name, value):
+        """ the IR function of a builtin, for the calls codegen makes to it """
+        self.table.get(name).value = value
+
+    def check_node(self, node):
+        """ checks a top level declaration or statement, returns its errors. False when it failed """
+        self.errors = []
+        ok = self.statement(node)
+        node.errList = self.errors
+        return ok
+
+    def error(self, node, message):
+        self.errors.append((node.line, message))
+        return None
+
+    # statements, True if they check
+
+    def statement(self, node):
+        if isinstance(node, declarationNode):
+            return self.declaration(node)
+        elif isinstance(node, functionNode):
+            return self.procedure(node)
+        elif isinstance(node, AssignmentNode):
+            return self.assignment(node)
+        elif isinstance(node, IfNode):
+            return self.if_statement(node)
+        elif isinstance(node, LoopNode):
+            return self.loop(node)
+        elif isinstance(node, returnExpr):
+            return self.return_statement(node)
+        elif isinstance(node, exprNode):
+            return self.expr(node) != None
+        return False # left incomplete by a parse error, which was reported
+
+    def block(self, statements):
+        """ checks every statement of a block, in a new basic block """
+        self.terminated = False
+        ok = True
+        for statement in statements:
+            ok = self.statement(statement) and ok
+        return ok
+
+    def declaration(self, node):
+        id_type = "variable"
+        if node.array_size != None:
+            id_type = "array"
+            if not (isinstance(node.array_size, LiteralExpr) and node.array_size.data_type == tkn.INT_TYPE):
+                self.error(node, "array bound of {} must be an integer".format(node.name))
+                return False
+        symbol = Symbol(node.name, None, node.type, id_type, function=None if node.is_global else self.function)
+        if not self.table.add(symbol, is_global=node.is_global):
+            self.error(node, "duplicate declaration of variable '{}'".format(node.name))
+            return False
+        node.symbol = symbol
+        return True
+
+    def procedure(self, node):
+        symbol = Symbol(node.name, None, node.retType, id_type='function',
+                        params=[(param.name, param.type) for param in node.params])
+        if not self.table.add(symbol):
+            self.error(node, "duplicate declaration")
+            return False
+        node.symbol = symbol
+
+        outer = (self.function, self.return_type, self.terminated)
+        self.function, self.return_type = node, node.retType
+        self.table.pushLocal(node.name)
+        try:
+            for param in node.params:
+                param.symbol = Symbol(param.name, None, param.type, function=node)
+                if not self.table.add(param.symbol):
+                    self.error(node, "duplicate parameter declaration")
+                    return False
+            ok = self.block(node.body)
+            if ok and not self.terminated:
+                self.error(node, "expected return statement before end of function")
+                return False
+            return ok
+        finally:
+            self.table.popLocal()
+            self.function, self.return_type, self.terminated = outer
+
+    def assignment(self, node):
+        if node.dest == None or node.expr == None:
+            return False
+        dest_type = self.variable(node.dest)
+        if dest_type == None:
+            return False
+        expr_type = self.expr(node.expr)
+        if expr_type == None:
+            return False
+        if not converts(expr_type, dest_type):
+            self.error(node, "cannot assign {} to variable {} of type {}".format(expr_type, node.dest.name, dest_type))
+            return False
+        return True
+
+    def if_statement(self, node):
+        if node.condition == None:
+            return False
+        cond_type = self.expr(node.condition)
+        if cond_type == None:
+            return False
+        if not converts(cond_type, tkn.BOOL_TYPE):
+            self.error(node, "if condition must be a bool or an integer")
+            return False
+        # codegen makes the else block first
+        ok = self.block(node.elseBlock) if node.elseBlock != None else True
+        ok = self.block(node.thenBlock) and ok
+        self.terminated = False
+        return ok
+
+    def loop(self, node):
+        if node.start == None or node.end == None or not self.assignment(node.start):
+            return False
+        end_type = self.expr(node.end)
+        if end_type == None:
+            return False
+        if not converts(end_type, tkn.BOOL_TYPE):
+            self.error(node, "loop condition must be a bool or an integer")
+            return False
+        ok = self.block(node.body)
+        self.terminated = False
+        return ok
+
+    def return_statement(self, node):
+        if node.expr == None:
+            return False
+        expr_type = self.expr(node.expr)
+        if expr_type == None:
+            return False
+        if self.terminated:
+            self.error(node, "return after termination of code block")
+            return False
+        if not converts(expr_type, self.return_type):
+            self.error(node, "cannot return {} from a procedure of type {}".format(expr_type, self.return_type))
+            return False
+        self.terminated = True
+        return True
+
+    # expressions, their type or None after an error
+
+    def expr(self, node):
+        if isinstance(node, LiteralExpr):
+            return node.data_type
+        elif isinstance(node, VariableExpr):
+            return self.variable(node)
+        elif isinstance(node, BinOpExpr):
+            return self.binary(node)
+        elif isinstance(node, UnaryOpExpr):
+            return self.unary(node)
+        elif isinstance(node, CallExpr):
+            return self.call(node)
+        return None
+
+    def variable(self, node):
+        symbol = self.table.get(node.name)
+        if symbol == None or symbol.id_type == 'function':
+            return self.error(node, "variable {} is undefined".format(node.name))
+        # locals of an enclosing procedure or the program body live in another function's frame
+        if symbol.function != None and symbol.function is not self.function:
+            return self.error(node, "variable {} is not visible in this procedure".format(node.name))
+        if node.array_index != None:
+            if symbol.id_type != 'array':
+                return self.error(node, "variable {} is not an array".format(node.name))
+            index_type = self.expr(node.array_index)
+            if index_type == None:
+                return None
+            if index_type != tkn.INT_TYPE:
+                return self.error(node, "index of array {} must be an integer".format(node.name))
+        elif symbol.id_type == 'array':
+            return self.error(node, "array {} is used without an index".format(node.name))
+        node.symbol = symbol
+        node.data_type = symbol.type
+        return symbol.type
+
+    def binary(self, node):
+        if node.LHS == None or node.RHS == None:
+            return None
+        left = self.expr(node.LHS)
+        if left == None:
+            return None
+        right = self.expr(node.RHS)
+        if right == None:
+            return None
+        node.data_type = binary_result_type(node.Op, left, right)
+        if node.data_type == None:
+            return self.error(node, "operation {} is not defined for operands of type {} and {}".format(
+                node.Op, left, right))
+        return node.data_type
+
+    def unary(self, node):
+        if node.expr == None:
+            return None
+        expr_type = self.expr(node.expr)
+        if expr_type == None:
+            return None
+        if node.Op == tkn.OP_SUB and expr_type not in NUMERIC_TYPES:
+            return self.error(node, "non numeric types cannot be negative")
+        elif node.Op == tkn.BOOL_NOT and expr_type not in (tkn.INT_TYPE, tkn.BOOL_TYPE):
+            return self.error(node, "operation 'NOT' must have operand of type integer or bool")
+        node.data_type = expr_type
+        return expr_type
+
+    def call(self, node):
+        symbol = self.table.get(node.name)
+        if symbol == None or symbol.id_type != 'function':
+            return self.error(node, "function {} is undefined".format(node.name))
+        if len(node.params) != len(symbol.params):
+            return self.error(node, "passed {} arguments to function {}, expected {}".format(
+                len(node.params), node.name, len(symbol.params)))
+        for param, (arg_name, arg_type) in zip(node.params, symbol.params):
+            param_type = self.expr(param)
+            if param_type == None:
+                return None
+            if not converts(param_type, arg_type):
+                return self.error(node, "argument {} of {} should be of type {}, not {}".format(
+                    arg_name, node.name, arg_type, param_type))
+        node.symbol = symbol
+        node.data_type = symbol.type
+        return symbol.type
+
+if __name__ == '__main__':
+    import glob
+    from parser import Parser
+
+    # the errors found for each test program, without generating code
+    for fName in sorted(glob.glob("../test/*/*.src")):
+        program = Parser(fName).parse_program()
+        if program == None:
+            continue
+        checker = Checker()
+        errors = []
+        for node in program.declarations + program.statements:
+            checker.check_node(node)
+            errors += node.getErrors()
+        print("{}: {}".format(fName, "ok" if not errors else "\n    " + "\n    ".join(errors)))
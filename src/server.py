@@ -0,0 +1,228 @@
+""" compile server: keeps the interpreter, llvmlite and the compiler modules loaded
+between compiles, so a request only pays for compiling its own file
+
+requests and responses are JSON, one object per line:
+    {"id": 1, "input": "prog.src", "output": "prog.ll", "options": {"parser": "iterative"}}
+    {"id": 1, "ok": true, "diagnostics": "...", "seconds": 0.004}
+without "output" the IR comes back in the response, as "ir". options are the
+long options of main.py, with _ for -. {"command": "ping"} and
+{"command": "shutdown"} are answered with {"ok": true}
+
+run from the src folder:
+    python3 server.py serve --socket /tmp/compiler.sock   (or --stdio)
+    python3 server.py client --socket /tmp/compiler.sock <input> [output]
+"""
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+from argparse import ArgumentParser, Namespace
+from time import perf_counter
+
+from codegen import initialize_llvm
+from main import add_compiler_arguments, cache_summaries, compile_captured
+
+#===================================================================================
+
+class CompileService:
+    """ answers compile requests, with default options from the server command line """
+
+    def __init__(self, defaults):
+        self.defaults = defaults
+        self.running = True
+        initialize_llvm()
+
+    def options(self, request):
+        """ the defaults, overridden by the options of the request """
+        options = vars(self.defaults).copy()
+        for name, value in request.get("options", {}).items():
+            if name not in options:
+                raise ValueError("unknown option '{}'".format(name))
+            options[name] = value
+        return Namespace(**options)
+
+    def handle(self, request):
+        """ the response to one decoded request """
+        response = {"id": request.get("id")}
+        command = request.get("command", "compile")
+        if command == "ping":
+            response["ok"] = True
+        elif command == "shutdown":
+            self.running = False
+            response["ok"] = True
+        elif command == "compile":
+            try:
+                args = self.options(request)
+                input_fName = request["input"]
+            except (KeyError, ValueError) as e:
+                response.update(ok=False, error="bad request: {}".format(e))
+                return response
+            start = perf_counter()
+            builder, ok, diagnostics = compile_captured(input_fName, request.get("output"), args)
+            if args.cache_stats:
+                diagnostics += "".join(line + "\n" for line in cache_summaries(builder))
+            response.update(ok=ok, diagnostics=diagnostics, seconds=perf_counter() - start)
+            if request.get("output") is None and builder is not None:
+                response["ir"] = builder.ir_text
+        else:
+            response.update(ok=False, error="unknown command '{}'".format(command))
+        return response
+
+    def handle_line(self, line):
+        """ the encoded response to one encoded request """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request is a JSON object")
+        except ValueError as e:
+            response = {"id": None, "ok": False, "error": "bad request: {}".format(e)}
+        else:
+            response = self.handle(request)
+        return json.dumps(response) + "\n"
+
+    def serve_stream(self, rfile, wfile):
+        """ answer the requests read from rfile until it ends or the server is shut down """
+        for line in rfile:
+            if not line.strip():
+                continue
+            wfile.write(self.handle_line(line))
+            wfile.flush()
+            if not self.running:
+                break
+
+
+class _ConnectionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        service = self.server.service
+        rfile = (line.decode() for line in self.rfile)
+        wfile = _TextWriter(self.wfile)
+        service.serve_stream(rfile, wfile)
+
+
+class _TextWriter:
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        self.wfile.write(text.encode())
+
+    def flush(self):
+        self.wfile.flush()
+
+
+def server_listening(path):
+    """ True if a server accepts connections on the unix socket at path """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+def serve_socket(path, defaults):
+    """
+    serve connections on a unix socket at path, one at a time, until shut
+    down. False if the path is taken, by a running server or by a file that
+    isn't a socket. the socket file of a server that is gone is replaced
+    """
+    if os.path.lexists(path):
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            print("{} exists and is not a socket".format(path))
+            return False
+        if server_listening(path):
+            print("a compile server is already listening on {}".format(path))
+            return False
+        os.unlink(path)
+    with socketserver.UnixStreamServer(path, _ConnectionHandler) as server:
+        server.service = CompileService(defaults)
+        try:
+            while server.service.running:
+                server.handle_request()
+        finally:
+            os.unlink(path)
+    return True
+
+def serve_stdio(defaults):
+    """ serve requests from stdin, answering on stdout """
+    # the compiler's own prints are captured per request, keep stdout for responses
+    CompileService(defaults).serve_stream(sys.stdin, sys.stdout)
+
+#===================================================================================
+
+class CompileClient:
+    """ connection to a compile server on a unix socket """
+
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.rfile = self.sock.makefile("r")
+        self.next_id = 1
+
+    def request(self, request):
+        """ send one request and wait for its response """
+        request = dict(request, id=self.next_id)
+        self.next_id += 1
+        self.sock.sendall((json.dumps(request) + "\n").encode())
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("compile server closed the connection")
+        return json.loads(line)
+
+    def compile(self, input_fName, output_fName=None, **options):
+        return self.request({"input": os.path.abspath(input_fName),
+                             "output": output_fName and os.path.abspath(output_fName),
+                             "options": options})
+
+    def shutdown(self):
+        return self.request({"command": "shutdown"})
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    ap = ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run the compile server")
+    where = serve.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", help="listen on a unix socket at this path")
+    where.add_argument("--stdio", action="store_true", help="read requests from stdin")
+    add_compiler_arguments(serve)
+    client = sub.add_parser("client", help="compile a file on a running server")
+    client.add_argument("--socket", required=True)
+    client.add_argument("inputFile", nargs="?")
+    client.add_argument("outputFile", nargs="?")
+    client.add_argument("--shutdown", action="store_true", help="stop the server")
+    args = ap.parse_args()
+
+    if args.command == "serve":
+        if args.stdio:
+            serve_stdio(args)
+            return 0
+        return 0 if serve_socket(args.socket, args) else 1
+
+    with CompileClient(args.socket) as conn:
+        if args.shutdown:
+            conn.shutdown()
+            return 0
+        if args.inputFile is None:
+            ap.error("an input file is needed")
+        response = conn.compile(args.inputFile, args.outputFile)
+    if "error" in response:
+        print(response["error"])
+    else:
+        sys.stdout.write(response["diagnostics"])
+        if args.outputFile is None and response.get("ir"):
+            sys.stdout.write(response["ir"])
+    return 0 if response["ok"] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,35 +1,49 @@
-from token import tkn_type as tkn
-from llvmlite import ir
+from tokens import tkn_type as tkn
+
+# language types of the IR types of values, see SymbolTable.get_ir_type
+_data_types = {
+    "i32"   : tkn.INT_TYPE,
+    "float" : tkn.FLOAT_TYPE,
+    "i1"    : tkn.BOOL_TYPE,
+    "i8*"   : tkn.STRING_TYPE,
+}
 
 class Symbol():
-    def __init__(self, name, value, data_type, id_type='variable', unique_name=None):
+    def __init__(self, name, value, data_type, id_type='variable', unique_name=None, function=None, params=None):
         self.name = name
         self.value = value
         self.type = data_type
         self.id_type = id_type
         self.unique_name = unique_name
+        self.function = function # function whose frame holds a local, None for globals
+        self.params = params # (name, data type) of each parameter of a function
 
 class SymbolTable():
+    """
+    local scopes are kept as a stack of bindings per name, innermost last,
+    with a log of the names each open scope bound so popLocal can undo them.
+    get, add and pushLocal are O(1) however deep the scopes are nested, and
+    popLocal is O(1) per name it removes
+    """
     def __init__(self):
         self.globals = {}
-        self.locals = [{}]
+        self.bindings = {} # name: [(scope depth, symbol), ...], innermost last
+        self.scope_names = [[]] # names bound in each open scope
         self.namespaces = ['main']
         self.nextUnique = 0 # for generating unique global identifiers
+        self.string_constants = {} # bytes: global, see get_string_constant
 
     def update(self, symbol):
         """ returns (result, err) as a tuple, err is None on a success"""
         # check local scope
-
-        i = len(self.locals) -1
-        while i >= 0:
-            if symbol.name in self.locals[i].keys():
-                old = self.locals[i][symbol.name]
-                if old.type == symbol.type and old.id_type == symbol.id_type:
-                    self.locals[i][symbol.name] = symbol
-                    return True 
-                else:
-                    return False, "variable {} expected a(n) {} of type {}".format(old.name, old.id_type, old.type)
-            i -= 1
+        stack = self.bindings.get(symbol.name)
+        if stack:
+            depth, old = stack[-1]
+            if old.type == symbol.type and old.id_type == symbol.id_type:
+                stack[-1] = (depth, symbol)
+                return True
+            else:
+                return False, "variable {} expected a(n) {} of type {}".format(old.name, old.id_type, old.type)
 
         # check global scope
         if symbol.name in self.globals.keys():
@@ -50,9 +64,12 @@ class SymbolTable():
                 return False
             self.globals.update(entry)
         else:
-            if symbol.name in self.locals[-1].keys():
+            depth = len(self.scope_names) - 1
+            stack = self.bindings.setdefault(symbol.name, [])
+            if stack and stack[-1][0] == depth:
                 return False
-            self.locals[-1].update(entry)
+            stack.append((depth, symbol))
+            self.scope_names[-1].append(symbol.name)
         return True
 
     def getNameSpace(self):
@@ -63,31 +80,40 @@ class SymbolTable():
         """ adds a local scope and assigned it a name for 
             the purpose of llvm level function signature resolution
         """
-        self.locals.append({})
+        self.scope_names.append([])
         self.namespaces.append(namespace)
 
     def popLocal(self):
-        self.locals.pop()
+        for name in self.scope_names.pop():
+            stack = self.bindings[name]
+            stack.pop()
+            if not stack:
+                del self.bindings[name]
         self.namespaces.pop()
 
     def get(self, name):
-        i = len(self.locals) -1
-        while i >= 0:
-            if name in self.locals[i].keys():
-                return self.locals[i][name]
-            i -= 1
-        if name in  self.globals.keys():
-            return self.globals[name]
-        else:
-            return None
+        stack = self.bindings.get(name)
+        if stack:
+            return stack[-1][1]
+        return self.globals.get(name)
+
+    def top_level(self):
+        """ the global symbols and the functions of the outermost scope, which shadow globals """
+        symbols = list(self.globals.values())
+        for stack in self.bindings.values():
+            depth, symbol = stack[0]
+            if depth == 0 and symbol.id_type == 'function':
+                symbols.append(symbol)
+        return symbols
 
     def get_ir_type(self, tkn_type, is_array=False, length=None):
+        from llvmlite import ir # only codegen needs IR types, see semantic.Checker
         type_map = {
             tkn.INT_TYPE    : ir.IntType(32),
             tkn.FLOAT_TYPE  : ir.FloatType(), 
             tkn.BOOL_TYPE   : ir.IntType(1),
-            tkn.STRING_TYPE : ir.IntType(8) 
-            # a char is an 8 bit int, so strings longet than 1 char must have is_array=True and length set
+            tkn.STRING_TYPE : ir.PointerType(ir.IntType(8))
+            # strings are pointers to nul terminated chars
         }
 
         if is_array:
@@ -97,6 +123,27 @@ class SymbolTable():
         else:
             return type_map[tkn_type]
 
+    def get_data_type(self, ir_type):
+        """ the language type of an IR type, None for types without one """
+        return _data_types.get(str(ir_type))
+
+    def get_string_constant(self, module, data):
+        """
+        the global holding the char array data. each distinct value gets one
+        private unnamed_addr constant per module, repeated literals share it
+        """
+        from llvmlite import ir
+        var = self.string_constants.get(data)
+        if var == None:
+            array_type = ir.ArrayType(ir.IntType(8), len(data))
+            var = ir.GlobalVariable(module, array_type, self.get_unique_name())
+            var.linkage = "private"
+            var.unnamed_addr = True
+            var.global_constant = True
+            var.initializer = ir.Constant(array_type, bytearray(data))
+            self.string_constants[data] = var
+        return var
+
     def get_unique_name(self):
         """ generate a unique identifier for anonymous global values"""
         name = "main.{}".format(self.nextUnique)
@@ -0,0 +1,186 @@
+# Defines the enumeration of valid token types and the Token data structure
+
+from array import array
+from enum import unique, Enum, auto
+
+@unique
+class tkn_type(Enum):
+    # creates an enumeration of valid token types
+    # auto will assign a unique number starting at 1 and incrementing
+    # single char operators are assigned their ascii char to enable 
+    # easy token type assignment my the scanner
+
+    # Program control flow
+    PROGRAM = auto()
+    BEGIN = auto()
+    IS = auto()
+    END = auto()
+    GLOBAL = auto()
+    PROCEDURE = auto()
+    VARIABLE = auto()
+    TYPE = auto()
+    IF = auto()
+    THEN = auto()
+    ELSE = auto()
+    FOR = auto()
+    WHILE = auto()
+    RETURN = auto()
+
+    # Type Identifiers
+    INT_TYPE = auto()
+    STRING_TYPE = auto()
+    FLOAT_TYPE = auto()
+    BOOL_TYPE = auto()
+    ENUM_TYPE = auto()
+
+    # Operators
+    BOOL_AND =  auto()
+    BOOL_OR =  auto()
+    BOOL_NOT = auto()
+    OP_ADD = auto()
+    OP_SUB = auto()
+    OP_MUL = auto()
+    OP_DIV = auto()
+    OP_ASSIGN = auto()
+    ## Relation Operators
+    OP_EQ = auto()
+    OP_NE = auto()
+    OP_LT = auto()
+    OP_LE = auto()
+    OP_GT = auto()
+    OP_GE = auto()
+
+    # Literals
+    STRING = auto()
+    INTEGER = auto()
+    FLOAT = auto()
+    TRUE = auto()
+    FALSE = auto()
+
+    # Other stuff
+    ID = auto()
+    LEFT_BRACKET =  auto()
+    RIGHT_BRACKET =  auto()
+    LEFT_PAREN =  auto()
+    RIGHT_PAREN =  auto()
+    LEFT_CURLY =  auto()
+    RIGHT_CURLY =  auto()
+    SEMICOLON =  auto()
+    COLON = auto()
+    PERIOD =  auto()
+    COMMA =  auto()
+    UNKNOWN = auto()
+    EOF = auto()
+
+class Token:
+    __slots__ = ('type', 'value', 'line', 'col')
+
+    def __init__(self, t_type, location, val=None):
+        self.type = t_type
+        self.value = val
+        self.line = location[0]
+        self.col = location[1]
+
+    def __str__(self):
+        return "<token {} L{} C{} value={}>".format(self.type, self.line, self.col, self.value)
+
+# token types indexed by their enum value, for decoding the int type column
+token_types = [None] + list(tkn_type)
+
+class TokenBuffer:
+    """
+    struct-of-arrays token storage. the type, line and column of each token
+    are kept in parallel int arrays, and values are interned in a table that
+    the values array indexes into (0 is a token without a value). the start
+    and end index of each token in the source text are kept when known
+    """
+    __slots__ = ('types', 'lines', 'cols', 'values', 'starts', 'ends',
+                 'value_table', '_value_ids', 'has_errors')
+
+    def __init__(self):
+        self.types = array('i')
+        self.lines = array('i')
+        self.cols = array('i')
+        self.values = array('i')
+        self.starts = array('i')
+        self.ends = array('i')
+        self.clear()
+
+    def clear(self):
+        """ empty the buffer so it can be refilled """
+        del self.types[:]
+        del self.lines[:]
+        del self.cols[:]
+        del self.values[:]
+        del self.starts[:]
+        del self.ends[:]
+        self.value_table = [None]
+        self._value_ids = {None: 0}
+        self.has_errors = False # set when the tokens came from a scan with errors
+
+    def extend(self, tokens):
+        for token in tokens:
+            self.append(token.type, (token.line, token.col), token.value)
+
+    def append(self, t_type, location, val=None, span=(0, 0)):
+        self.types.append(t_type.value)
+        self.lines.append(location[0])
+        self.cols.append(location[1])
+        self.values.append(self.intern(val))
+        self.starts.append(span[0])
+        self.ends.append(span[1])
+
+    def intern(self, val):
+        """ index of val in the value table, adding it if it's new """
+        value_id = self._value_ids.get(val)
+        if value_id is None:
+            value_id = len(self.value_table)
+            self.value_table.append(val)
+            self._value_ids[val] = value_id
+        return value_id
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        """ unpack a single token, allocates a Token """
+        return Token(token_types[self.types[index]],
+                     (self.lines[index], self.cols[index]),
+                     self.value_table[self.values[index]])
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
+
+    def cursor(self, index=0):
+        return TokenCursor(self, index)
+
+class TokenCursor:
+    """
+    a view of the token at index in a TokenBuffer with the same attributes
+    as a Token. moving the cursor reads the next token without allocating
+    """
+    __slots__ = ('buffer', 'index')
+
+    def __init__(self, buffer, index=0):
+        self.buffer = buffer
+        self.index = index
+
+    @property
+    def type(self):
+        return token_types[self.buffer.types[self.index]]
+
+    @property
+    def value(self):
+        return self.buffer.value_table[self.buffer.values[self.index]]
+
+    @property
+    def line(self):
+        return self.buffer.lines[self.index]
+
+    @property
+    def col(self):
+        return self.buffer.cols[self.index]
+
+    def __str__(self):
+        return "<token {} L{} C{} value={}>".format(self.type, self.line, self.col, self.value)
\ No newline at end of file